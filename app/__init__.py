@@ -4,6 +4,9 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from tortoise import Tortoise
 
+from app.core.aigc.cache import response_cache
+from app.core.aigc.http_pool import upstream_pool
+from app.core.event_stream import event_streams
 from app.core.exceptions import SettingNotFound
 from app.core.init_app import (
     init_data,
@@ -11,6 +14,9 @@ from app.core.init_app import (
     register_exceptions,
     register_routers,
 )
+from app.services.generation_jobs import generation_job_service
+from app.services.resource_text import extraction_engine, resource_extraction_service
+from app.services.upload_sessions import upload_session_service
 
 try:
     from app.settings.config import settings
@@ -21,7 +27,18 @@ except ImportError:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_data()
+    await upstream_pool.startup()
+    await generation_job_service.startup()
+    await resource_extraction_service.startup()
+    await upload_session_service.startup()
     yield
+    await upload_session_service.shutdown()
+    await resource_extraction_service.shutdown()
+    extraction_engine.shutdown()
+    await generation_job_service.shutdown()
+    await event_streams.shutdown()
+    await upstream_pool.shutdown()
+    await response_cache.close()
     await Tortoise.close_connections()
 
 
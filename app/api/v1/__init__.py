@@ -9,6 +9,8 @@ from .roles import roles_router
 from .users import users_router
 from .aigc import chat as aigc_chat
 from .aigc import enhanced as aigc_enhanced
+from .aigc import jobs as aigc_jobs
+from .aigc import usage as aigc_usage
 from .ideological import router as ideological_router
 from .ideological.prompt_assistant import router as prompt_assistant_router
 from .courses import router as courses_router
@@ -22,6 +24,8 @@ v1_router.include_router(menus_router, prefix="/menu", dependencies=[DependPermi
 v1_router.include_router(apis_router, prefix="/api", dependencies=[DependPermission])
 v1_router.include_router(aigc_chat.router, prefix="/aigc")
 v1_router.include_router(aigc_enhanced.router, prefix="/aigc/enhanced", dependencies=[DependPermission])
+v1_router.include_router(aigc_jobs.router, prefix="/aigc/jobs", dependencies=[DependPermission])
+v1_router.include_router(aigc_usage.router, prefix="/aigc/usage", dependencies=[DependPermission])
 v1_router.include_router(ideological_router, prefix="/ideological")
 v1_router.include_router(prompt_assistant_router, prefix="/ideological/prompt-assistant", dependencies=[DependPermission])
 v1_router.include_router(courses_router, dependencies=[DependPermission])
@@ -1,12 +1,24 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from typing import List, Dict, Optional
-from app.core.aigc.aigc_client import AIGCClient
-from app.settings.config import settings
-from fastapi.responses import StreamingResponse
+from typing import Any, List, Dict, Optional
+from app.core.aigc.aigc_client import aigc_client
+from app.core.dependency import DependPermission
+from app.core.aigc.cache import response_cache
+from app.core.aigc.health import provider_health
+from app.core.aigc.http_pool import upstream_pool
+from app.core.aigc.scheduler import upstream_scheduler
+from app.core.aigc.singleflight import chat_flight, stream_flight
+from app.core.aigc.tokens import resolve_usage
+from app.services.usage_service import UsageService
+from app.core.aigc.providers import PROFILE_DEFAULT, provider_registry
+from app.core.event_stream import event_streams
+from app.services.resource_text import resource_extraction_service, resource_text_service
 
 router = APIRouter()
 
+CACHE_SCOPE = "aigc.chat"
+
 class Message(BaseModel):
 	role: str
 	content: str
@@ -14,16 +26,27 @@ class Message(BaseModel):
 class ChatRequest(BaseModel):
 	messages: List[Message]
 	enable_web_search: Optional[bool] = False
+	profile: Optional[str] = PROFILE_DEFAULT
+	no_cache: Optional[bool] = False  # 重新生成：跳过响应缓存
 
 class ChatResponse(BaseModel):
 	reply: str
 
 @router.post('/chat', response_model=ChatResponse)
 async def chat_endpoint(req: ChatRequest):
-	client = AIGCClient()
 	try:
-		data = await client.chat([m.dict() for m in req.messages], enable_web_search=req.enable_web_search)
+		messages = [m.dict() for m in req.messages]
+		meta = {}
+		data = await aigc_client.chat(
+			messages,
+			enable_web_search=req.enable_web_search,
+			profile=req.profile,
+			cache_scope=CACHE_SCOPE,
+			meta=meta,
+			no_cache=bool(req.no_cache),
+		)
 		reply = data["choices"][0]["message"]["content"]
+		await UsageService.record(CACHE_SCOPE, resolve_usage(meta, messages, reply), meta)
 		return ChatResponse(reply=reply)
 	except Exception as e:
 		raise HTTPException(status_code=502, detail=str(e))
@@ -34,55 +57,76 @@ class DiagResponse(BaseModel):
 	base_url: str
 	model: str
 	timeout_seconds: float
+	profiles: List[Dict[str, Any]] = []
+	pool: Dict[str, Any] = {}
+	cache: Dict[str, Any] = {}
+	inflight: Dict[str, Any] = {}
+	scheduler: Dict[str, Any] = {}
+	health: Dict[str, Any] = {}
+	sse: Dict[str, Any] = {}
+	resource_text: Dict[str, Any] = {}
 
 
-@router.get('/diag', response_model=DiagResponse)
+@router.get('/diag', response_model=DiagResponse, dependencies=[DependPermission])
 async def diag():
 	# Return diagnostic info about AIGC configuration without revealing the API key
-	provider = getattr(settings, 'AIGC_PROVIDER', None) or 'deepseek'
-	if provider in {"kimi", "moonshot"}:
-		api_key = getattr(settings, 'MOONSHOT_API_KEY', None)
-		base = getattr(settings, 'MOONSHOT_API_BASE', None) or ''
-	else:
-		api_key = getattr(settings, 'DEEPSEEK_API_KEY', None)
-		base = getattr(settings, 'DEEPSEEK_API_BASE', None) or ''
-	model = getattr(settings, 'AIGC_MODEL', None) or ''
-	raw_timeout = getattr(settings, 'AIGC_TIMEOUT', None) or '60000'
-	try:
-		t = int(raw_timeout)
-		timeout_seconds = t / 1000 if t >= 1000 else float(t)
-	except Exception:
-		try:
-			timeout_seconds = float(raw_timeout)
-		except Exception:
-			timeout_seconds = 60.0
-
+	# 包含连接池、缓存、调度与队列等内部状态，仅对有接口权限的用户开放
+	profile = provider_registry.profile(PROFILE_DEFAULT)
+	provider = provider_registry.provider(profile.provider)
 	return DiagResponse(
-		has_key=bool(api_key),
-		base_url=base,
-		model=model,
-		timeout_seconds=timeout_seconds,
+		has_key=provider.has_key,
+		base_url=provider.base_url,
+		model=profile.model,
+		timeout_seconds=profile.timeout,
+		profiles=provider_registry.describe(),
+		pool=upstream_pool.metrics(),
+		cache=response_cache.stats(),
+		inflight={"chat": chat_flight.stats(), "stream": stream_flight.stats()},
+		scheduler=upstream_scheduler.stats(),
+		health=provider_health.stats(provider_registry.providers),
+		sse=event_streams.stats(),
+		resource_text={**resource_text_service.stats(), "pipeline": resource_extraction_service.stats()},
 	)
 
 
 @router.post('/chat/stream')
-async def chat_stream_endpoint(req: ChatRequest):
+async def chat_stream_endpoint(req: ChatRequest, request: Request):
 	import logging
 	import json
 	logger = logging.getLogger(__name__)
+	# 断线重连：带 Last-Event-ID 时从回放缓冲续传，不重新请求上游
+	resumed = event_streams.resume(request.headers.get('last-event-id'))
+	if resumed is not None:
+		return resumed
 	logger.info(f"收到流式聊天请求，enable_web_search={req.enable_web_search}")
 	
-	client = AIGCClient()
-
 	async def event_generator():
+		messages = [m.dict() for m in req.messages]
+		meta = {}
+		parts = []
 		try:
-			async for chunk in client.chat_stream([m.dict() for m in req.messages], enable_web_search=req.enable_web_search):
+			async for chunk in aigc_client.chat_stream(
+				messages,
+				enable_web_search=req.enable_web_search,
+				profile=req.profile,
+				cache_scope=CACHE_SCOPE,
+				meta=meta,
+				no_cache=bool(req.no_cache),
+			):
 				# Always JSON SSE, consistent with prompt-assistant.
+				parts.append(chunk)
 				yield f"data: {json.dumps({'type': 'content', 'content': chunk}, ensure_ascii=False)}\n\n"
 			# finished
-			yield f"data: {json.dumps({'type': 'done'}, ensure_ascii=False)}\n\n"
+			usage = resolve_usage(meta, messages, ''.join(parts))
+			await UsageService.record(CACHE_SCOPE, usage, meta)
+			done = {'type': 'done', 'queue_wait_ms': meta.get('queue_wait_ms', 0), 'usage': usage.to_dict()}
+			yield f"data: {json.dumps(done, ensure_ascii=False)}\n\n"
+		except asyncio.CancelledError:
+			# 客户端断开：上游流已随取消关闭，只记已生成部分的用量
+			await UsageService.record(CACHE_SCOPE, resolve_usage(meta, messages, ''.join(parts)), meta, cancelled=True)
+			raise
 		except Exception as e:
 			msg = str(e) or e.__class__.__name__
 			yield f"data: {json.dumps({'type': 'error', 'error': msg}, ensure_ascii=False)}\n\n"
 
-	return StreamingResponse(event_generator(), media_type='text/event-stream')
+	return event_streams.stream_response(event_generator())
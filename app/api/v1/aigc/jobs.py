@@ -0,0 +1,72 @@
+import json
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.core.dependency import AuthControl
+from app.models.admin import User
+from app.models.aigc import GenerationJob
+from app.schemas.ideological import AIGCGenerationRequest
+from app.services.generation_jobs import generation_job_service
+
+router = APIRouter()
+
+
+async def _get_own_job(job_id: int, user: User) -> GenerationJob:
+    job = await GenerationJob.get_or_none(id=job_id, user_id=user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="生成任务不存在")
+    return job
+
+
+@router.post("", summary="提交后台生成任务")
+async def submit_job(
+    request: AIGCGenerationRequest,
+    current_user: User = Depends(AuthControl.is_authed)
+):
+    job = await generation_job_service.submit(request, current_user.id)
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("", summary="获取我的后台生成任务")
+async def list_jobs(
+    page: int = 1,
+    page_size: int = 20,
+    status: str = None,
+    current_user: User = Depends(AuthControl.is_authed)
+):
+    query = GenerationJob.filter(user_id=current_user.id)
+    if status:
+        query = query.filter(status=status)
+    total = await query.count()
+    jobs = await query.order_by("-created_at").offset((page - 1) * page_size).limit(page_size)
+    return {
+        "items": [generation_job_service.snapshot(job) for job in jobs],
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+    }
+
+
+@router.get("/{job_id}", summary="查询后台生成任务状态")
+async def get_job(job_id: int, current_user: User = Depends(AuthControl.is_authed)):
+    job = await _get_own_job(job_id, current_user)
+    return generation_job_service.snapshot(job)
+
+
+@router.get("/{job_id}/events", summary="订阅后台生成任务进度（SSE）")
+async def job_events(job_id: int, current_user: User = Depends(AuthControl.is_authed)):
+    job = await _get_own_job(job_id, current_user)
+
+    async def event_generator():
+        async for event in generation_job_service.events(job.id):
+            yield f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+@router.post("/{job_id}/cancel", summary="取消后台生成任务")
+async def cancel_job(job_id: int, current_user: User = Depends(AuthControl.is_authed)):
+    job = await _get_own_job(job_id, current_user)
+    job = await generation_job_service.cancel(job)
+    return generation_job_service.snapshot(job)
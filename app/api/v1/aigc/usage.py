@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.core.dependency import AuthControl
+from app.models.admin import User
+from app.services.usage_service import GROUP_FIELDS, UsageService
+
+router = APIRouter()
+
+
+def _parse_group_by(group_by: str):
+    names = [name.strip() for name in group_by.split(",") if name.strip()]
+    unknown = [name for name in names if name not in GROUP_FIELDS]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail=f"group_by 仅支持: {', '.join(GROUP_FIELDS)}")
+    return names
+
+
+@router.get("/summary", summary="AIGC Token 用量汇总")
+async def usage_summary(
+    group_by: str = Query("user", description="汇总维度，逗号分隔：user/day/endpoint/provider/model/template"),
+    start_date: Optional[date] = Query(None, description="开始日期，默认最近30天"),
+    end_date: Optional[date] = Query(None, description="结束日期"),
+    user_id: Optional[int] = Query(None, description="用户ID"),
+    endpoint: Optional[str] = Query(None, description="调用接口"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    start_date = start_date or date.today() - timedelta(days=30)
+    items = await UsageService.summary(
+        _parse_group_by(group_by), start=start_date, end=end_date, user_id=user_id, endpoint=endpoint, limit=limit
+    )
+    return {"items": items, "start_date": start_date, "end_date": end_date}
+
+
+@router.get("/prefix-cache", summary="各接口的上游前缀缓存命中率")
+async def prefix_cache_summary(
+    days: int = Query(7, ge=1, le=366, description="最近天数"),
+    endpoint: Optional[str] = Query(None, description="调用接口"),
+):
+    start_date = date.today() - timedelta(days=days - 1)
+    items = await UsageService.summary(["endpoint", "provider"], start=start_date, endpoint=endpoint, limit=1000)
+    items.sort(key=lambda item: item["prompt_tokens"], reverse=True)
+    return {"items": items, "start_date": start_date}
+
+
+@router.get("/me", summary="当前用户的 AIGC Token 用量")
+async def my_usage(
+    group_by: str = Query("day", description="汇总维度，逗号分隔：day/endpoint/provider/model/template"),
+    days: int = Query(30, ge=1, le=366, description="最近天数"),
+    current_user: User = Depends(AuthControl.is_authed),
+):
+    start_date = date.today() - timedelta(days=days - 1)
+    items = await UsageService.summary(_parse_group_by(group_by), start=start_date, user_id=current_user.id)
+    return {"items": items, "start_date": start_date}
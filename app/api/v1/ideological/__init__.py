@@ -2,6 +2,7 @@ from fastapi import APIRouter
 from .cases import router as cases_router
 from .templates import router as templates_router
 from .resources import router as resources_router
+from .uploads import router as uploads_router
 from .prompt_assistant import router as prompt_assistant_router
 from .theme_categories import router as theme_categories_router
 
@@ -11,6 +12,7 @@ router = APIRouter()
 router.include_router(cases_router, prefix="/cases", tags=["案例库管理"])
 router.include_router(templates_router, prefix="/templates", tags=["提示词模板管理"])
 router.include_router(resources_router, prefix="/resources", tags=["教学资源管理"])
+router.include_router(uploads_router, prefix="/uploads", tags=["教学资源上传"])
 router.include_router(prompt_assistant_router, prefix="/prompt-assistant", tags=["提示词助手"])
 router.include_router(theme_categories_router, prefix="/theme-categories", tags=["思政主题分类管理"])
 
@@ -1,6 +1,6 @@
 import time
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
 from app.schemas.ideological import (
     PromptAssistantRequest,
     PromptAssistantResponse,
@@ -11,11 +11,14 @@ from app.schemas.ideological import (
 from app.models.ideological import (
     PromptAssistantConversation as PromptAssistantConversationModel,
     PromptAssistantTemplate as PromptAssistantTemplateModel,
+    PromptAssistantSummary as PromptAssistantSummaryModel,
 )
 from app.models.admin import User
 from app.models.enums import PromptAssistantSession
 from app.core.dependency import AuthControl
+from app.core.event_stream import event_streams
 from app.services.prompt_assistant import PromptAssistantService
+from app.services.prompt_assistant.session_store import session_store
 
 router = APIRouter()
 prompt_assistant_service = PromptAssistantService()
@@ -49,11 +52,15 @@ async def chat_with_assistant(
 @router.post("/chat/stream", summary="与提示词助手对话（流式输出）")
 async def chat_with_assistant_stream(
     request: PromptAssistantRequest,
-    current_user: User = Depends(AuthControl.is_authed)
+    current_user: User = Depends(AuthControl.is_authed),
+    last_event_id: Optional[str] = Header(None),
 ):
-    """与提示词助手进行对话，使用流式输出"""
-    from fastapi.responses import StreamingResponse
+    """与提示词助手进行对话，使用流式输出；断线重连时携带 Last-Event-ID 可从断点续传"""
     import json
+
+    resumed = event_streams.resume(last_event_id, owner=str(current_user.id))
+    if resumed is not None:
+        return resumed
     
     async def generate():
         try:
@@ -66,14 +73,7 @@ async def chat_with_assistant_stream(
             error_data = {"type": "error", "error": str(e)}
             yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
     
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
-    )
+    return event_streams.stream_response(generate(), owner=str(current_user.id))
 
 
 @router.get("/session/{session_id}", summary="获取会话信息")
@@ -153,8 +153,10 @@ async def delete_session(
         user_id=current_user.id
     ).delete()
 
+    session_store.invalidate(session_id, current_user.id)
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="会话不存在")
+    await PromptAssistantSummaryModel.filter(session_id=session_id, user_id=current_user.id).delete()
 
     return {"message": "会话删除成功", "deleted_count": deleted_count}
 
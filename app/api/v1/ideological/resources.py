@@ -1,18 +1,14 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
 from tortoise.queryset import Q
 from tortoise.expressions import F
 import os
 import uuid
-import aiofiles
-import httpx
-from pathlib import Path
 import json
-import re
-import tempfile
-import zipfile
-from starlette.concurrency import run_in_threadpool
+from pathlib import Path
 from app.schemas.ideological import (
     TeachingResourceCreate,
     TeachingResourceUpdate,
@@ -26,27 +22,66 @@ from app.models.chapter import Chapter
 from app.models.admin import User
 from app.core.dependency import AuthControl
 from app.core.crud import CRUDBase
-from app.core.aigc.aigc_client import AIGCClient
-from app.settings.config import settings
+from app.core.event_stream import SSE_HEADERS
+from app.core.file_response import file_download_response
 from app.services.recommendation_service import RecommendationService
+from app.services.resource_storage import UPLOAD_DIR, StoredFile, blob_store
+from app.models.enums import TextExtractionStatus
+from app.services.resource_text import resource_extraction_service, resource_text_service, text_cache
 
 router = APIRouter()
 
+DOWNLOAD_URL_PREFIX = "/api/v1/ideological/resources/download/"
+
 # 配置文件上传目录（相对项目根）
-UPLOAD_DIR = Path("uploads/teaching_resources")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 class ResourceService(CRUDBase[TeachingResourceModel, TeachingResourceCreate, TeachingResourceUpdate]):
     def __init__(self):
         super().__init__(TeachingResourceModel)
 
-    async def create_resource(self, obj_in: TeachingResourceCreate, user_id: int, file_path: str = None) -> TeachingResourceModel:
+    async def create_resource(
+        self,
+        obj_in: TeachingResourceCreate,
+        user_id: int,
+        file_path: str = None,
+        content_hash: str = None,
+        file_uuid: str = None,
+    ) -> TeachingResourceModel:
         obj_data = obj_in.dict()
         obj_data["uploader_id"] = user_id
         if file_path:
             obj_data["file_path"] = file_path
+            obj_data["content_hash"] = content_hash
+            obj_data["file_uuid"] = file_uuid
+            obj_data["extraction_status"] = TextExtractionStatus.PENDING
         obj_data = await _hydrate_course_chapter(obj_data)
-        return await self.create(obj_data)
+        resource = await self.create(obj_data)
+        if file_path:
+            # 上传后立即在后台预提取文本，读取接口不再等待提取
+            await resource_extraction_service.enqueue(resource)
+        return resource
+
+    async def create_with_file(self, resource_data: dict, file_info: dict, user_id: int) -> TeachingResourceModel:
+        """表单上传与分块上传完成后共用的资源创建流程"""
+        # 如果有上传文件，添加文件相关信息
+        if file_info:
+            resource_data.update({
+                "file_url": file_info["file_url"],
+                "file_size": file_info["file_size"],
+                "file_format": file_info["file_format"],
+                "download_url": file_info["download_url"],
+                "preview_url": file_info["preview_url"]
+            })
+
+        resource_in = TeachingResourceCreate(**resource_data)
+        return await self.create_resource(
+            resource_in,
+            user_id,
+            file_info["file_path"] if file_info else None,
+            file_info["content_hash"] if file_info else None,
+            file_info["file_uuid"] if file_info else None
+        )
 
     async def get_resources_with_search(self, search_request: ResourceSearchRequest, user_id: int = None):
         query = TeachingResourceModel.all()
@@ -120,7 +155,8 @@ class ResourceService(CRUDBase[TeachingResourceModel, TeachingResourceCreate, Te
             is_public=True
         ).order_by("-usage_count", "-created_at").limit(limit)
 
-    async def upload_file(self, file: UploadFile, user_id: int) -> dict:
+    @staticmethod
+    def build_file_info(stored: StoredFile, file_extension: str, file_uuid: str = None) -> dict:
         # 验证文件类型
         allowed_extensions = {
             "document": [".pdf", ".doc", ".docx", ".txt", ".rtf"],
@@ -131,8 +167,6 @@ class ResourceService(CRUDBase[TeachingResourceModel, TeachingResourceCreate, Te
             "other": []
         }
 
-        file_extension = Path(file.filename).suffix.lower()
-
         # 确定文件类型
         resource_type = "other"
         for type_name, extensions in allowed_extensions.items():
@@ -140,33 +174,24 @@ class ResourceService(CRUDBase[TeachingResourceModel, TeachingResourceCreate, Te
                 resource_type = type_name
                 break
 
-        # 生成唯一文件名
-        file_uuid = uuid.uuid4()
-        file_name = f"{file_uuid}{file_extension}"
-        file_path = UPLOAD_DIR / file_name
-
-        # 保存文件
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-
-        # 获取文件大小
-        file_size = len(content)
-
         # 构建访问URL
         # 静态可访问的URL（需在 FastAPI 挂载 /uploads）
-        static_file_url = f"/uploads/teaching_resources/{file_name}"
-        download_url = f"/api/v1/ideological/resources/download/{file_uuid}"
+        static_file_url = stored.file_url
+        # 下载地址按资源区分，同一文件被多个资源引用时互不影响；分块上传传入由会话派生的 UUID
+        file_uuid = file_uuid or str(uuid.uuid4())
+        download_url = f"{DOWNLOAD_URL_PREFIX}{file_uuid}"
 
         # 预览URL：图片/PDF/DOCX 直接用静态地址，方便前端内嵌预览
         preview_url = static_file_url if resource_type in ["image", "document"] else None
 
         return {
-            "file_path": str(file_path),
+            "file_path": stored.file_path,
             "file_url": static_file_url,
             "download_url": download_url,
+            "file_uuid": file_uuid,
             "preview_url": preview_url,
-            "file_size": file_size,
+            "file_size": stored.size,
+            "content_hash": stored.content_hash,
             "file_format": file_extension.lstrip('.'),
             "resource_type": resource_type
         }
@@ -197,235 +222,6 @@ async def _hydrate_course_chapter(obj_data: dict) -> dict:
 
     return obj_data
 
-def _normalize_text(text: str) -> str:
-    if not text:
-        return ''
-    return '\n'.join(line.rstrip() for line in text.splitlines()).strip()
-
-def _normalize_kimi_content(raw_text: str) -> str:
-    text = raw_text or ''
-    image_pattern = r'!\[[^\]]*]\([^)]+\)(\{[^}]+\})?'
-    try:
-        data = json.loads(text)
-        if isinstance(data, dict):
-            content = (
-                data.get("content")
-                or data.get("text")
-                or (data.get("data", {}) or {}).get("content")
-                or (data.get("data", {}) or {}).get("text")
-            )
-            if isinstance(content, str):
-                text = content
-    except Exception:
-        pass
-
-    if re.search(image_pattern, text):
-        text = re.sub(image_pattern, '', text)
-
-    text = _normalize_text(text)
-    if not text and raw_text and re.search(image_pattern, raw_text):
-        return "（该文件主要为图片或扫描件，未抽取到可用文本）"
-    return text
-
-def _needs_image_fallback(text: str) -> bool:
-    if not text:
-        return True
-    if text.strip() == "（该文件主要为图片或扫描件，未抽取到可用文本）":
-        return True
-    return False
-
-async def _extract_docx_images_text(file_path: Path, client: AIGCClient) -> str:
-    if not file_path.exists():
-        return ''
-    if file_path.suffix.lower() != '.docx':
-        return ''
-
-    image_texts = []
-    with tempfile.TemporaryDirectory() as tmp_dir:
-        try:
-            with zipfile.ZipFile(str(file_path)) as zf:
-                image_names = [n for n in zf.namelist() if n.startswith("word/media/")]
-                for name in image_names:
-                    data = zf.read(name)
-                    if not data:
-                        continue
-                    image_path = Path(tmp_dir) / Path(name).name
-                    image_path.write_bytes(data)
-                    raw_text = await client.extract_file_text(str(image_path))
-                    normalized = _normalize_kimi_content(raw_text)
-                    if normalized and not _needs_image_fallback(normalized):
-                        image_texts.append(normalized)
-        except Exception:
-            return ''
-
-    return _normalize_text('\n'.join(image_texts))
-
-def _extract_text_sync(file_path: Path, file_format: str, resource_type: str) -> str:
-    suffix = (file_format or '').lower().lstrip('.')
-    if not suffix:
-        suffix = file_path.suffix.lower().lstrip('.')
-
-    if suffix in ['txt', 'rtf']:
-        for encoding in ['utf-8', 'utf-16', 'gbk', 'latin-1']:
-            try:
-                return file_path.read_text(encoding=encoding)
-            except Exception:
-                continue
-        return file_path.read_text(errors='ignore')
-
-    if suffix == 'pdf':
-        try:
-            import pdfplumber
-        except Exception as exc:
-            raise ValueError("缺少依赖 pdfplumber，请安装后重试") from exc
-        text_parts = []
-        with pdfplumber.open(str(file_path)) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text() or ''
-                if page_text:
-                    text_parts.append(page_text)
-        return '\n'.join(text_parts)
-
-    if suffix in ['docx', 'doc']:
-        if suffix == 'doc':
-            raise ValueError('暂不支持 .doc 格式，请转换为 .docx')
-        try:
-            import docx
-        except Exception as exc:
-            raise ValueError("缺少依赖 python-docx，请安装后重试") from exc
-        doc = docx.Document(str(file_path))
-        return '\n'.join(p.text for p in doc.paragraphs if p.text)
-
-    if suffix in ['pptx', 'ppt']:
-        if suffix == 'ppt':
-            raise ValueError('暂不支持 .ppt 格式，请转换为 .pptx')
-        try:
-            from pptx import Presentation
-        except Exception as exc:
-            raise ValueError("缺少依赖 python-pptx，请安装: pip install python-pptx") from exc
-        
-        text_parts = []
-        prs = Presentation(str(file_path))
-        for slide_num, slide in enumerate(prs.slides, 1):
-            slide_texts = []
-            # 提取幻灯片中的所有文本
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text:
-                    slide_texts.append(shape.text)
-            if slide_texts:
-                text_parts.append(f"--- 幻灯片 {slide_num} ---\n" + '\n'.join(slide_texts))
-        return '\n\n'.join(text_parts)
-
-    if resource_type == 'image' or suffix in ['png', 'jpg', 'jpeg', 'bmp', 'gif', 'tiff']:
-        try:
-            from PIL import Image
-        except Exception as exc:
-            raise ValueError("缺少依赖 pillow，请安装后重试") from exc
-        try:
-            import pytesseract
-        except Exception as exc:
-            raise ValueError("缺少依赖 pytesseract，请安装后重试") from exc
-        try:
-            image = Image.open(str(file_path))
-            return pytesseract.image_to_string(image)
-        except Exception as exc:
-            raise ValueError(f'图片识别失败: {exc}') from exc
-
-    raise ValueError('该资源类型不支持文本提取')
-
-async def extract_resource_text_content(resource: TeachingResourceModel, max_chars: int) -> dict:
-    # 如果资源有外部链接，使用联网功能提取
-    if resource.external_url:
-        provider = (getattr(settings, "AIGC_PROVIDER", None) or "deepseek").lower()
-        if provider in {"kimi", "moonshot"}:
-            try:
-                client = AIGCClient()
-                raw_text = await client.extract_url_content(resource.external_url, max_chars=max_chars)
-                normalized = _normalize_text(raw_text)
-                total_chars = len(normalized)
-                truncated = total_chars > max_chars
-                text = normalized[:max_chars] if truncated else normalized
-                
-                return {
-                    "resource_id": resource.id,
-                    "text": text,
-                    "total_chars": total_chars,
-                    "truncated": truncated,
-                    "source": "external_url"
-                }
-            except Exception as exc:
-                raise HTTPException(status_code=500, detail=f"外部链接内容提取失败: {exc}") from exc
-        else:
-            raise HTTPException(status_code=400, detail="外部链接内容提取仅支持 Kimi 提供商")
-    
-    # 如果没有文件路径，返回错误
-    if not resource.file_path:
-        raise HTTPException(status_code=400, detail="该资源没有可读取的文件或外部链接")
-
-    file_path = Path(resource.file_path)
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="资源文件不存在")
-
-    # 检查文件大小，如果太大给出警告
-    file_size = file_path.stat().st_size
-    if file_size > 50 * 1024 * 1024:  # 50MB
-        raise HTTPException(status_code=400, detail="文件过大（超过50MB），无法提取文本")
-
-    provider = (getattr(settings, "AIGC_PROVIDER", None) or "deepseek").lower()
-    if provider in {"kimi", "moonshot"}:
-        try:
-            client = AIGCClient()
-            raw_text = await client.extract_file_text(str(file_path))
-            raw_text = _normalize_kimi_content(raw_text)
-            if _needs_image_fallback(raw_text) and file_path.suffix.lower() == ".docx":
-                fallback_text = await _extract_docx_images_text(file_path, client)
-                if fallback_text:
-                    raw_text = fallback_text
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail="文件处理超时，请稍后重试或尝试较小的文件")
-        except httpx.HTTPStatusError as exc:
-            # 处理 HTTP 状态错误
-            status_code = exc.response.status_code
-            if status_code in [502, 503, 504]:
-                raise HTTPException(
-                    status_code=503, 
-                    detail=f"Kimi API 服务暂时不可用（{status_code}），请稍后重试。这是 Kimi 服务端的问题，已自动重试3次仍然失败。"
-                )
-            elif status_code == 429:
-                raise HTTPException(status_code=429, detail="Kimi API 请求频率超限，请稍后重试")
-            else:
-                raise HTTPException(status_code=500, detail=f"Kimi API 返回错误 {status_code}: {exc}")
-        except Exception as exc:
-            error_msg = str(exc)
-            if "timeout" in error_msg.lower():
-                raise HTTPException(status_code=504, detail="文件处理超时，请稍后重试")
-            raise HTTPException(status_code=500, detail=f"Kimi 文件解析失败: {exc}") from exc
-    else:
-        try:
-            raw_text = await run_in_threadpool(
-                _extract_text_sync,
-                file_path,
-                resource.file_format or '',
-                resource.resource_type,
-            )
-        except ValueError as exc:
-            raise HTTPException(status_code=400, detail=str(exc)) from exc
-        except Exception as exc:
-            raise HTTPException(status_code=500, detail=f"文本提取失败: {exc}") from exc
-
-    normalized = _normalize_text(raw_text)
-    total_chars = len(normalized)
-    truncated = total_chars > max_chars
-    text = normalized[:max_chars] if truncated else normalized
-
-    return {
-        "resource_id": resource.id,
-        "text": text,
-        "total_chars": total_chars,
-        "truncated": truncated,
-        "source": "file"
-    }
-
 resource_service = ResourceService()
 
 @router.get("/", summary="获取教学资源列表")
@@ -478,7 +274,64 @@ async def extract_resource_text(
     if not resource.is_public and resource.uploader_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权访问该资源")
 
-    return await extract_resource_text_content(resource, max_chars)
+    if resource.external_url or not resource.file_path:
+        return await resource_text_service.extract(resource, max_chars)
+
+    result = await resource_extraction_service.read(resource, max_chars)
+    if result is None:
+        # 完整提取仍在后台进行：本地解析时先返回前 max_chars 个字符的预览
+        content = {"resource_id": resource.id, "extraction_status": resource.extraction_status}
+        try:
+            preview = await resource_text_service.preview(resource, max_chars)
+        except HTTPException:
+            preview = None
+        if preview is not None:
+            content.update(preview, partial=True)
+        return JSONResponse(status_code=202, content=content)
+    return result
+
+
+@router.get("/{resource_id}/extract-text/stream", summary="流式提取教学资源文本（逐页输出）")
+async def stream_resource_text(
+    resource_id: int,
+    max_chars: int = Query(8000, ge=100, le=100000, description="累计达到该字符数后停止（100-100000）"),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="输出格式：ndjson 或 sse"),
+    current_user: User = Depends(AuthControl.is_authed)
+):
+    """
+    每解析完一页 / 一张幻灯片输出一条记录：{"type": "page", "page", "text", "chars_so_far", "page_count"}，
+    最后一条为 {"type": "done", ...}；出错时输出 {"type": "error", "error", "status_code"} 后结束。
+    已完成预提取的资源直接按页切分缓存文本。
+    """
+    resource = await TeachingResourceModel.get_or_none(id=resource_id)
+    if not resource:
+        raise HTTPException(status_code=404, detail="资源不存在")
+
+    # 检查权限
+    if not resource.is_public and resource.uploader_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权访问该资源")
+
+    if not resource.external_url and not resource.file_path:
+        raise HTTPException(status_code=400, detail="该资源没有可读取的文件或外部链接")
+
+    def encode(record: dict) -> str:
+        data = json.dumps(record, ensure_ascii=False)
+        return f"data: {data}\n\n" if format == "sse" else data + "\n"
+
+    async def record_generator():
+        try:
+            async for record in resource_text_service.iter_pages(resource, max_chars):
+                yield encode(record)
+        except HTTPException as exc:
+            yield encode({"type": "error", "error": exc.detail, "status_code": exc.status_code})
+        except Exception as exc:
+            yield encode({"type": "error", "error": f"文本提取失败: {exc}", "status_code": 500})
+
+    if format == "sse":
+        return StreamingResponse(record_generator(), media_type="text/event-stream", headers=SSE_HEADERS)
+    return StreamingResponse(
+        record_generator(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/recommended/list", summary="获取推荐教学资源")
@@ -500,61 +353,68 @@ async def get_recommended_resources(
     )
     return [TeachingResource.from_orm(item) for item in resources]
 
-@router.post("/", summary="创建教学资源")
+FORM_FIELDS = (
+    "title", "description", "resource_type", "external_url", "tags",
+    "software_engineering_chapter", "course_id", "chapter_id", "theme_category_id", "is_public",
+)
+
+
+@router.post(
+    "/",
+    summary="创建教学资源",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["title", "resource_type"],
+                        "properties": {
+                            **{name: {"type": "string"} for name in FORM_FIELDS},
+                            "course_id": {"type": "integer"},
+                            "chapter_id": {"type": "integer"},
+                            "theme_category_id": {"type": "integer"},
+                            "is_public": {"type": "boolean", "default": True},
+                            "tags": {"type": "string", "description": "逗号分隔"},
+                            "file": {"type": "string", "format": "binary"},
+                        },
+                    }
+                }
+            },
+        }
+    },
+)
 async def create_resource(
-    title: str = Form(...),
-    description: str = Form(None),
-    resource_type: str = Form(...),
-    external_url: str = Form(None),
-    tags: str = Form(None),
-    software_engineering_chapter: str = Form(None),
-    course_id: int = Form(None),
-    chapter_id: int = Form(None),
-    theme_category_id: int = Form(None),
-    is_public: bool = Form(True),
-    file: UploadFile = File(None),
+    request: Request,
     current_user: User = Depends(AuthControl.is_authed)
 ):
-    # 处理文件上传
-    file_info = None
-    if file and file.filename:
-        file_info = await resource_service.upload_file(file, current_user.id)
+    # 直接流式解析请求体：文件边接收边写入存储，超过上限立即中止，不会先整体缓存到临时文件
+    fields, stored, filename = await blob_store.save_form(request)
 
     # 处理标签
     tags_list = []
-    if tags:
-        tags_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
-
-    resource_data = {
-        "title": title,
-        "description": description,
-        "resource_type": resource_type,
-        "external_url": external_url,
-        "tags": tags_list,
-        "software_engineering_chapter": software_engineering_chapter,
-        "course_id": course_id,
-        "chapter_id": chapter_id,
-        "theme_category_id": theme_category_id,
-        "is_public": is_public
-    }
+    if fields.get("tags"):
+        tags_list = [tag.strip() for tag in fields["tags"].split(",") if tag.strip()]
 
-    # 如果有上传文件，添加文件相关信息
-    if file_info:
-        resource_data.update({
-            "file_url": file_info["file_url"],
-            "file_size": file_info["file_size"],
-            "file_format": file_info["file_format"],
-            "download_url": file_info["download_url"],
-            "preview_url": file_info["preview_url"]
-        })
-
-    resource_in = TeachingResourceCreate(**resource_data)
-    resource = await resource_service.create_resource(
-        resource_in,
-        current_user.id,
-        file_info["file_path"] if file_info else None
-    )
+    resource_data = {name: fields.get(name) or None for name in FORM_FIELDS}
+    resource_data["tags"] = tags_list
+    if resource_data["is_public"] is None:
+        resource_data["is_public"] = True
 
+    file_info = None
+    if stored is not None:
+        file_info = resource_service.build_file_info(stored, Path(filename).suffix.lower())
+    try:
+        # 先按表单字段校验，失败时返回 422 并撤销本次文件引用
+        TeachingResourceCreate(**resource_data)
+        resource = await resource_service.create_with_file(resource_data, file_info, current_user.id)
+    except BaseException as exc:
+        if stored is not None:
+            await blob_store.release(stored.content_hash, stored.file_path)
+        if isinstance(exc, ValidationError):
+            raise RequestValidationError(exc.errors()) from exc
+        raise
     return TeachingResource.from_orm(resource)
 
 
@@ -622,11 +482,11 @@ async def delete_resource(
     if resource.uploader_id != current_user.id and not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="无权删除该资源")
 
-    # 删除文件（如果存在）
-    if resource.file_path and os.path.exists(resource.file_path):
-        os.remove(resource.file_path)
-
+    resource_extraction_service.cancel(resource.id)
     await resource.delete()
+    # 释放文件引用（其他资源仍引用同一内容时保留文件）
+    await blob_store.release(resource.content_hash, resource.file_path)
+    await text_cache.release(resource.content_hash)
     return {"message": "资源删除成功"}
 
 @router.post("/batch", summary="批量操作资源")
@@ -657,10 +517,10 @@ async def batch_operation(
 
             # 执行批量操作
             if batch_request.operation == "delete":
-                # 删除文件
-                if resource.file_path and os.path.exists(resource.file_path):
-                    os.remove(resource.file_path)
+                resource_extraction_service.cancel(resource.id)
                 await resource.delete()
+                await blob_store.release(resource.content_hash, resource.file_path)
+                await text_cache.release(resource.content_hash)
             elif batch_request.operation == "public":
                 await resource.update_from_dict({"is_public": True})
                 await resource.save()
@@ -720,10 +580,12 @@ async def get_my_resources_statistics(
 @router.get("/download/{file_uuid}", summary="下载文件")
 async def download_file(
     file_uuid: str,
+    request: Request,
     current_user: User = Depends(AuthControl.is_authed)
 ):
-    # 根据文件UUID查找资源
-    resource = await TeachingResourceModel.get_or_none(file_url__contains=file_uuid)
+    # 根据文件UUID查找资源（file_uuid 列有唯一索引）
+    resource = await TeachingResourceModel.get_or_none(file_uuid=file_uuid)
+    # 加列之前上传的资源在启动时已按 download_url 回填 file_uuid（见 init_resource_file_uuids）
     if not resource:
         raise HTTPException(status_code=404, detail="文件不存在")
 
@@ -734,16 +596,12 @@ async def download_file(
     if not resource.file_path or not os.path.exists(resource.file_path):
         raise HTTPException(status_code=404, detail="文件不存在")
 
-    # 流式返回文件
-    def iterfile():
-        with open(resource.file_path, mode="rb") as file_like:
-            yield from file_like
-
-    return StreamingResponse(
-        iterfile(),
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename={resource.title}"}
-    )
+    # 支持 Range 断点续传与 ETag 缓存校验；内容寻址存储的文件以内容哈希作为强 ETag
+    filename = resource.title
+    if resource.file_format and not filename.lower().endswith(f".{resource.file_format.lower()}"):
+        filename = f"{filename}.{resource.file_format}"
+    etag = f'"{resource.content_hash}"' if resource.content_hash else None
+    return file_download_response(request, resource.file_path, filename, etag)
 
 @router.get("/types/list", summary="获取资源类型列表")
 async def get_resource_types(
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, Query, Request
+
+from app.core.dependency import AuthControl
+from app.models.admin import User
+from app.schemas.ideological import TeachingResource, UploadSessionCreate
+from app.services.resource_storage import StoredFile
+from app.services.upload_sessions import upload_session_service
+
+from .resources import resource_service
+
+router = APIRouter()
+
+
+@router.post("/", summary="创建分块上传会话")
+async def create_upload(
+    upload_in: UploadSessionCreate,
+    current_user: User = Depends(AuthControl.is_authed)
+):
+    """
+    大文件（课程录像、音频等）分块续传：
+    1. 创建会话，得到 upload_id；
+    2. PUT /{upload_id}?offset=N 上传分块（请求体为原始字节），可并发、可乱序；
+    3. 断线后 GET /{upload_id} 查询 missing 区间，只补传缺失部分；
+    4. POST /{upload_id}/complete 完成上传并创建教学资源；失败（如数据库暂时不可用）时可直接重试，已上传的文件不会丢失。
+    """
+    resource_data = upload_in.dict(exclude={"filename", "total_size"})
+    session = await upload_session_service.create(
+        current_user.id, upload_in.filename, upload_in.total_size, resource_data
+    )
+    return upload_session_service.snapshot(session)
+
+
+@router.put("/{upload_id}", summary="上传分块")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="分块在文件中的起始字节偏移"),
+    current_user: User = Depends(AuthControl.is_authed)
+):
+    session = await upload_session_service.get(upload_id, current_user.id)
+    session = await upload_session_service.write_chunk(session, offset, request.stream())
+    return upload_session_service.snapshot(session)
+
+
+@router.get("/{upload_id}", summary="查询上传进度与缺失区间")
+async def get_upload(
+    upload_id: str,
+    current_user: User = Depends(AuthControl.is_authed)
+):
+    session = await upload_session_service.get(upload_id, current_user.id)
+    return upload_session_service.snapshot(session)
+
+
+@router.post("/{upload_id}/complete", summary="完成上传并创建教学资源")
+async def complete_upload(
+    upload_id: str,
+    current_user: User = Depends(AuthControl.is_authed)
+):
+    session = await upload_session_service.get(upload_id, current_user.id)
+
+    async def create_resource(stored: StoredFile, extension: str, file_uuid: str):
+        # 与表单上传走同一个资源创建流程（含后台文本预提取）
+        file_info = resource_service.build_file_info(stored, extension, file_uuid)
+        return await resource_service.create_with_file(dict(session.resource_data), file_info, current_user.id)
+
+    resource = await upload_session_service.complete(session, create_resource)
+    return TeachingResource.from_orm(resource)
+
+
+@router.delete("/{upload_id}", summary="取消上传")
+async def abort_upload(
+    upload_id: str,
+    current_user: User = Depends(AuthControl.is_authed)
+):
+    session = await upload_session_service.get(upload_id, current_user.id)
+    await upload_session_service.abort(session)
+    return {"message": "上传已取消"}
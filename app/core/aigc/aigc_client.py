@@ -1,40 +1,94 @@
+import asyncio
+import functools
+import json
+import logging
 import os
-from typing import Any, Dict, List
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import httpx
+from app.core.aigc.cache import (
+    completion_from_text,
+    replay_chunks,
+    request_fingerprint,
+    response_cache,
+    response_content,
+)
+from app.core.aigc.health import is_retryable, provider_health
+from app.core.aigc.http_pool import upstream_pool
+from app.core.aigc.providers import (
+    PROFILE_LONG_CONTEXT,
+    ModelProfile,
+    ProviderConfig,
+    ProviderRegistry,
+    provider_registry,
+)
+from app.core.aigc.scheduler import Priority, upstream_scheduler
+from app.core.aigc.singleflight import chat_flight, stream_flight
+from app.core.aigc.sse import ToolCallAccumulator, iter_content
+from app.core.aigc.tokens import Usage, estimate_messages_tokens, parse_usage
 from app.settings.config import settings
 
+logger = logging.getLogger(__name__)
+
+WEB_SEARCH_TOOLS = [
+    {
+        "type": "builtin_function",
+        "function": {
+            "name": "$web_search"
+        }
+    }
+]
+MAX_TOOL_ROUNDS = 3  # 单次流式调用中最多执行的 tool_calls 轮数
+
 
 class AIGCClient:
-    def __init__(self):
-        self.provider = (getattr(settings, "AIGC_PROVIDER", None) or os.getenv("AIGC_PROVIDER", "deepseek")).lower()
-        self.model = getattr(settings, "AIGC_MODEL", None) or os.getenv("AIGC_MODEL", "deepseek-chat")
-
-        if self.provider in {"kimi", "moonshot"}:
-            self.api_key = getattr(settings, "MOONSHOT_API_KEY", None) or os.getenv("MOONSHOT_API_KEY", "")
-            self.base_url = (
-                getattr(settings, "MOONSHOT_API_BASE", None)
-                or os.getenv("MOONSHOT_API_BASE", "https://api.moonshot.cn/v1")
-            ).rstrip("/")
-        else:
-            self.api_key = getattr(settings, "DEEPSEEK_API_KEY", None) or os.getenv("DEEPSEEK_API_KEY", "")
-            self.base_url = (
-                getattr(settings, "DEEPSEEK_API_BASE", None)
-                or os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com")
-            ).rstrip("/")
+    """
+    统一的 AIGC 调用入口（DeepSeek / Kimi 等 OpenAI 兼容接口）。
+    每次调用按 profile 从注册表解析 provider、模型与超时，底层连接由 upstream_pool 共享。
+    """
 
-        if not self.api_key:
-            raise RuntimeError("AIGC API key is not configured in environment")
+    def __init__(self, registry: ProviderRegistry = provider_registry):
+        self.registry = registry
 
-        raw_timeout = getattr(settings, "AIGC_TIMEOUT", None) or os.getenv("AIGC_TIMEOUT", "60000")
-        try:
-            t = int(raw_timeout)
-            self.timeout = t / 1000 if t >= 1000 else float(t)
-        except Exception:
-            try:
-                self.timeout = float(raw_timeout)
-            except Exception:
-                self.timeout = 60.0
+    def routes(
+        self, model_profile: ModelProfile, provider: ProviderConfig, pinned: bool = False
+    ) -> List[Tuple[ModelProfile, ProviderConfig]]:
+        """
+        普通对话按健康评分在所有已配置的 provider 间排序，依次作为故障转移候选；
+        pinned（联网搜索等只有特定 provider 支持的能力）时只使用解析出的 provider。
+        """
+        if pinned or not settings.AIGC_FAILOVER_ENABLED:
+            return [(model_profile, provider)]
+        ranked = provider_health.rank(provider.name, self.registry.configured())
+        return [(self.registry.rebase(model_profile, name), self.registry.provider(name)) for name in ranked]
+
+    def resolve(self, profile: Optional[str] = None, feature: Optional[str] = None) -> Tuple[ModelProfile, ProviderConfig]:
+        model_profile = (
+            self.registry.profile_for_feature(profile, feature) if feature else self.registry.profile(profile)
+        )
+        provider = self.registry.provider(model_profile.provider)
+        if not provider.has_key:
+            raise RuntimeError(f"AIGC API key is not configured in environment ({provider.name})")
+        return model_profile, provider
+
+    @staticmethod
+    def _headers(provider: ProviderConfig, json_body: bool = True) -> Dict[str, str]:
+        headers = {"Authorization": f"Bearer {provider.api_key}"}
+        if json_body:
+            headers["Content-Type"] = "application/json"
+        return headers
+
+    @staticmethod
+    def _payload(model_profile: ModelProfile, messages: List[Dict[str, Any]], stream: bool, **options) -> Dict[str, Any]:
+        payload = {
+            "model": model_profile.model,
+            "messages": messages,
+            "stream": stream,
+        }
+        payload.update(model_profile.options)
+        payload.update({k: v for k, v in options.items() if v is not None})
+        return payload
 
     def _sanitize_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Remove truly empty messages and ensure assistant/tool-call messages have non-empty content."""
@@ -64,11 +118,9 @@ class AIGCClient:
             cleaned.append(msg)
         return cleaned
 
-    def _build_url(self, path: str) -> str:
-        base = self.base_url
-        if base.endswith("/v1"):
-            return f"{base}{path}"
-        return f"{base}/v1{path}"
+    @staticmethod
+    def _dedupe(scope: Optional[str]) -> bool:
+        return bool(settings.AIGC_SINGLEFLIGHT_ENABLED and scope)
 
     @staticmethod
     def _format_error(e: Exception) -> str:
@@ -78,306 +130,479 @@ class AIGCClient:
             return msg
         return f"{e.__class__.__name__}"
 
-    async def chat(self, messages: List[Dict[str, Any]], enable_web_search: bool = False):
-        url = self._build_url("/chat/completions")
-        messages = self._sanitize_messages(messages)
+    @staticmethod
+    def _append_tool_results(messages: List[Dict[str, Any]], assistant_msg: Dict[str, Any]) -> None:
+        """把带 tool_calls 的 assistant 消息及 $web_search 的 tool 结果追加到上下文"""
+        tool_calls = assistant_msg.get("tool_calls", [])
+        if "content" in assistant_msg and not assistant_msg["content"]:
+            # Kimi 不接受空 content，所以我们不添加 content 字段
+            assistant_msg = {"role": assistant_msg["role"], "tool_calls": tool_calls}
+        messages.append(assistant_msg)
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+        for tool_call in tool_calls:
+            if tool_call["function"]["name"] == "$web_search":
+                # 对于 $web_search，直接将参数原封不动返回
+                tool_result = json.loads(tool_call["function"]["arguments"])
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": tool_call["id"],
+                    "name": "$web_search",
+                    "content": json.dumps(tool_result)
+                })
 
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "stream": False,
-        }
-        
-        # 如果启用联网搜索且是 Kimi，添加 $web_search 内置函数
-        # 根据 Kimi 文档：使用 builtin_function 类型和 $web_search 函数名
-        if enable_web_search and self.provider in {"kimi", "moonshot"}:
-            payload["tools"] = [
-                {
-                    "type": "builtin_function",
-                    "function": {
-                        "name": "$web_search"
-                    }
-                }
-            ]
-
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            resp = await client.post(url, json=payload, headers=headers)
+    @staticmethod
+    def _estimate_tokens(payload: Dict[str, Any]) -> int:
+        """估算请求 Token 数，仅用于 TPM 限流"""
+        return estimate_messages_tokens(payload.get("messages") or []) + int(payload.get("max_tokens") or 0)
+
+    @staticmethod
+    def _add_usage(meta: Optional[Dict[str, Any]], usage: Optional[Usage]) -> None:
+        """同一次调用可能包含多次上游请求（如联网搜索的 tool_calls），usage 累加"""
+        if meta is None or usage is None:
+            return
+        current = meta.get("usage")
+        meta["usage"] = current.add(usage) if isinstance(current, Usage) else usage
+
+    def _should_retry_429(self, provider: ProviderConfig, resp: httpx.Response, attempt: int) -> bool:
+        if resp.status_code != 429:
+            return False
+        paused = upstream_scheduler.rate_limited(provider.name, resp.headers.get("Retry-After"))
+        logger.warning(f"{provider.name} 返回 429，暂停放行 {paused:.1f} 秒（第 {attempt + 1} 次）")
+        return attempt < settings.AIGC_RATE_LIMIT_RETRIES
+
+    async def _send(
+        self,
+        provider: ProviderConfig,
+        method: str,
+        path: str,
+        priority: Priority,
+        tokens: int = 0,
+        meta: Optional[Dict[str, Any]] = None,
+        before_attempt=None,
+        **kwargs,
+    ) -> httpx.Response:
+        """经准入控制发送非流式请求；429 时按 Retry-After 重新排队"""
+        client = upstream_pool.get_client(provider.name)
+        attempt = 0
+        while True:
+            async with upstream_scheduler.slot(provider.name, priority, tokens, meta):
+                provider_health.check(provider.name)
+                if before_attempt is not None:
+                    before_attempt()
+                started = time.monotonic()
+                try:
+                    resp = await client.request(method, provider.build_url(path), **kwargs)
+                except httpx.TransportError as e:
+                    provider_health.record_error(provider.name, e)
+                    raise
+                provider_health.record(provider.name, resp.status_code, time.monotonic() - started)
+            if self._should_retry_429(provider, resp, attempt):
+                attempt += 1
+                continue
             resp.raise_for_status()
-            data = resp.json()
-            
-            # 处理 tool_calls 的情况
-            if data.get("choices") and data["choices"][0].get("finish_reason") == "tool_calls":
-                # 将 assistant 消息添加到上下文，确保 content 不为空
-                assistant_msg = data["choices"][0]["message"]
-                if "content" in assistant_msg and not assistant_msg["content"]:
-                    # Kimi 不接受空 content，所以我们不添加 content 字段
-                    assistant_msg = {
-                        "role": assistant_msg["role"],
-                        "tool_calls": assistant_msg.get("tool_calls", [])
-                    }
-                messages.append(assistant_msg)
-                
-                # 处理每个 tool_call
-                for tool_call in data["choices"][0]["message"].get("tool_calls", []):
-                    if tool_call["function"]["name"] == "$web_search":
-                        import json
-                        # 对于 $web_search，直接将参数原封不动返回
-                        tool_result = json.loads(tool_call["function"]["arguments"])
-
-                        # 添加 tool 消息
-                        messages.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call["id"],
-                            "name": "$web_search",
-                            "content": json.dumps(tool_result)
-                        })
-
-                # 再次调用 API 获取最终结果
-                payload["messages"] = self._sanitize_messages(messages)
-                resp = await client.post(url, json=payload, headers=headers)
-                resp.raise_for_status()
-                data = resp.json()
+            return resp
 
-            return data
+    async def _post_chat(
+        self,
+        provider: ProviderConfig,
+        payload: Dict[str, Any],
+        timeout: float,
+        priority: Priority = Priority.INTERACTIVE,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        resp = await self._send(
+            provider,
+            "POST",
+            "/chat/completions",
+            priority,
+            tokens=self._estimate_tokens(payload),
+            meta=meta,
+            json=payload,
+            headers=self._headers(provider),
+            timeout=timeout,
+        )
+        data = resp.json()
+        self._add_usage(meta, parse_usage(data))
+        return data
 
-    async def chat_stream(self, messages: List[Dict[str, Any]], enable_web_search: bool = False):
+    async def _stream_chat(
+        self,
+        provider: ProviderConfig,
+        payload: Dict[str, Any],
+        timeout: float,
+        priority: Priority = Priority.INTERACTIVE,
+        meta: Optional[Dict[str, Any]] = None,
+        tool_calls: Optional[ToolCallAccumulator] = None,
+    ) -> AsyncIterator[str]:
         """
-        流式聊天。如果启用联网搜索，会先完成 tool_calls 流程，然后流式输出最终结果。
+        唯一的流式请求实现，所有 provider / profile 共用；整个流期间占用一个并发名额。
+        健康度按首个片段延迟记录。传入 tool_calls 时同时拼装流中的工具调用。
         """
-        import logging
-        import json as json_module
-        logger = logging.getLogger(__name__)
+        client = upstream_pool.get_client(provider.name)
+        tokens = self._estimate_tokens(payload)
+        attempt = 0
+        while True:
+            async with upstream_scheduler.slot(provider.name, priority, tokens, meta):
+                provider_health.check(provider.name)
+                started = time.monotonic()
+                recorded = False
+                try:
+                    async with client.stream(
+                        "POST",
+                        provider.build_url("/chat/completions"),
+                        json=payload,
+                        headers=self._headers(provider),
+                        timeout=timeout,
+                    ) as resp:
+                        if resp.status_code >= 400:
+                            provider_health.record(provider.name, resp.status_code, time.monotonic() - started)
+                            recorded = True
+                        if not self._should_retry_429(provider, resp, attempt):
+                            resp.raise_for_status()
+                            on_usage = functools.partial(self._add_usage, meta)
+                            async for content in iter_content(
+                                resp.aiter_bytes(), on_usage=on_usage, tool_calls=tool_calls
+                            ):
+                                if not recorded:
+                                    provider_health.record(provider.name, resp.status_code, time.monotonic() - started)
+                                    recorded = True
+                                yield content
+                            if not recorded:
+                                provider_health.record(provider.name, resp.status_code, time.monotonic() - started)
+                            return
+                except httpx.TransportError as e:
+                    provider_health.record_error(provider.name, e)
+                    raise
+            attempt += 1
+
+    async def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        enable_web_search: bool = False,
+        profile: Optional[str] = None,
+        cache_scope: Optional[str] = None,
+        meta: Optional[Dict[str, Any]] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        no_cache: bool = False,
+        **options,
+    ) -> Dict[str, Any]:
+        """
+        非流式调用。cache_scope 为已开启缓存的调用范围时，命中缓存直接返回；
+        指定了 cache_scope 的相同并发请求会合并为一次上游调用。
+        no_cache=True（重新生成）时不读缓存、不与他人合并，新结果仍写回缓存。
+        上游不可用时按健康评分故障转移到其他 provider（联网搜索固定在 Kimi），故障转移得到的结果不写缓存。
+        meta 为可选的输出字典，调用结束后写入 provider / model / cache_hit / shared / failover / queue_wait_ms，
+        以及本次实际计费的 usage（tokens.Usage，命中缓存或复用他人请求时没有）。
+        """
+        meta = meta if meta is not None else {}
+        model_profile, provider = self.resolve(profile, "web_search" if enable_web_search else None)
+        meta.update(
+            {
+                "provider": provider.name,
+                "model": model_profile.model,
+                "cache_hit": False,
+                "shared": False,
+                "failover": False,
+                "queue_wait_ms": 0,
+            }
+        )
         messages = self._sanitize_messages(messages)
-        
-        url = self._build_url("/chat/completions")
+        payload = self._payload(model_profile, messages, stream=False, **options)
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+        # 如果启用联网搜索（仅 Kimi 支持），添加 $web_search 内置函数
+        # 根据 Kimi 文档：使用 builtin_function 类型和 $web_search 函数名
+        if enable_web_search:
+            payload["tools"] = WEB_SEARCH_TOOLS
 
-        # 如果启用联网搜索，需要先处理 tool_calls
-        if enable_web_search and self.provider in {"kimi", "moonshot"}:
-            logger.info(f"联网搜索已启用，当前模型: {self.model}")
-            
-            # 第一步：发送非流式请求，检查是否需要 tool_calls
-            check_payload = {
-                "model": self.model,
-                "messages": messages,
-                "stream": False,
-                "tools": [
-                    {
-                        "type": "builtin_function",
-                        "function": {
-                            "name": "$web_search"
-                        }
-                    }
-                ]
-            }
-            
-            logger.info(f"发送请求到 Kimi API: {json_module.dumps(check_payload, ensure_ascii=False)[:500]}")
-            
+        cache_key = None
+        if response_cache.enabled_for(cache_scope):
+            cache_key = request_fingerprint(provider.name, payload)
+            cached = None if no_cache else await response_cache.get(cache_key, cache_scope)
+            if cached is not None:
+                meta["cache_hit"] = True
+                return cached
+
+        routes = self.routes(model_profile, provider, pinned=enable_web_search)
+
+        async def call() -> Dict[str, Any]:
+            data = await self._request_routed(routes, payload, messages, priority, meta)
+            # 缓存键按首选 provider 计算，故障转移得到的其他模型的回答不写入，避免以首选模型的名义回放
+            if cache_key and not meta["failover"] and response_content(data):
+                await response_cache.set(cache_key, data)
+            return data
+
+        if no_cache or not self._dedupe(cache_scope):
+            return await call()
+        data, meta["shared"] = await chat_flight.do(cache_key or request_fingerprint(provider.name, payload), call)
+        return data
+
+    async def _request_routed(
+        self,
+        routes: List[Tuple[ModelProfile, ProviderConfig]],
+        payload: Dict[str, Any],
+        messages: List[Dict[str, Any]],
+        priority: Priority,
+        meta: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        for index, (model_profile, provider) in enumerate(routes):
             try:
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    resp = await client.post(url, json=check_payload, headers=headers)
-                    resp.raise_for_status()
-                    data = resp.json()
-                    
-                    finish_reason = data.get('choices', [{}])[0].get('finish_reason')
-                    logger.info(f"第一次请求完成，finish_reason: {finish_reason}")
-                    logger.info(f"响应数据: {json_module.dumps(data, ensure_ascii=False)[:1000]}")
-                    
-                    # 如果需要 tool_calls，处理它
-                    if data.get("choices") and finish_reason == "tool_calls":
-                        import json
-                        logger.info("检测到 tool_calls，开始处理联网搜索")
-                        # 将 assistant 消息添加到上下文
-                        messages = list(messages)  # 复制一份，避免修改原始消息
-                        
-                        # 添加 assistant 消息，确保 content 不为空
-                        assistant_msg = data["choices"][0]["message"]
-                        logger.info(f"原始 assistant 消息: {assistant_msg}")
-                        
-                        # 如果 content 为空，设置为空字符串或删除该字段
-                        if "content" in assistant_msg and not assistant_msg["content"]:
-                            # Kimi 不接受空 content，所以我们不添加 content 字段
-                            assistant_msg = {
-                                "role": assistant_msg["role"],
-                                "tool_calls": assistant_msg.get("tool_calls", [])
-                            }
-                            logger.info(f"修正后的 assistant 消息: {assistant_msg}")
-                        messages.append(assistant_msg)
-                        
-                        # 处理每个 tool_call
-                        for tool_call in data["choices"][0]["message"].get("tool_calls", []):
-                            if tool_call["function"]["name"] == "$web_search":
-                                # 对于 $web_search，直接将参数原封不动返回
-                                tool_result = json.loads(tool_call["function"]["arguments"])
-                                logger.info(f"$web_search 参数: {tool_result}")
-                                
-                                # 添加 tool 消息
-                                messages.append({
-                                    "role": "tool",
-                                    "tool_call_id": tool_call["id"],
-                                    "name": "$web_search",
-                                    "content": json.dumps(tool_result)
-                                })
-                        
-                        logger.info(f"准备发送的完整消息列表（共{len(messages)}条）:")
-                        for i, msg in enumerate(messages):
-                            logger.info(f"  消息{i}: role={msg.get('role')}, has_content={('content' in msg)}, content_empty={msg.get('content') == '' if 'content' in msg else 'N/A'}")
-
-                        # 现在用更新后的 messages 进行流式请求
-                        stream_payload = {
-                            "model": self.model,
-                            "messages": messages,
-                            "stream": True,
-                            "tools": check_payload["tools"]
-                        }
-                    else:
-                        # 如果不需要 tool_calls，直接返回结果
-                        logger.info("未触发 tool_calls，直接返回结果")
-                        content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-                        yield content
-                        return
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Kimi API 返回错误: {e.response.status_code}")
-                logger.error(f"错误详情: {e.response.text}")
-                raise
+                data = await self._request_chat(
+                    provider, model_profile, dict(payload, model=model_profile.model), messages, priority, meta
+                )
             except Exception as e:
-                logger.exception(f"请求失败: {str(e)}")
-                raise
-        else:
-            # 不启用联网搜索，直接流式请求
-            stream_payload = {
-                "model": self.model,
-                "messages": messages,
-                "stream": True,
+                if index == len(routes) - 1 or not is_retryable(e):
+                    raise
+                logger.warning(f"{provider.name} 调用失败，切换到 {routes[index + 1][1].name}: {self._format_error(e)}")
+                meta["failover"] = True
+                continue
+            meta.update({"provider": provider.name, "model": model_profile.model})
+            return data
+
+    async def _request_chat(
+        self,
+        provider: ProviderConfig,
+        model_profile: ModelProfile,
+        payload: Dict[str, Any],
+        messages: List[Dict[str, Any]],
+        priority: Priority,
+        meta: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        messages = list(messages)
+        data = await self._post_chat(provider, payload, model_profile.timeout, priority, meta)
+
+        # 处理 tool_calls 的情况
+        if data.get("choices") and data["choices"][0].get("finish_reason") == "tool_calls":
+            self._append_tool_results(messages, data["choices"][0]["message"])
+            # 再次调用 API 获取最终结果
+            payload = dict(payload, messages=self._sanitize_messages(messages))
+            data = await self._post_chat(provider, payload, model_profile.timeout, priority, meta)
+
+        return data
+
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        enable_web_search: bool = False,
+        profile: Optional[str] = None,
+        cache_scope: Optional[str] = None,
+        meta: Optional[Dict[str, Any]] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        no_cache: bool = False,
+        **options,
+    ) -> AsyncIterator[str]:
+        """
+        流式聊天。启用联网搜索时全程使用流式请求：不需要搜索时与普通流一样立即输出，
+        需要搜索时在流中拼装 tool_calls，回填 tool 结果后继续流式输出后续回答。
+        命中响应缓存时以合成片段快速回放；完整结束且没有故障转移的流会写回缓存。
+        指定了 cache_scope 的相同并发流会多播同一个上游流；首个片段之前出错可故障转移到其他 provider。
+        no_cache=True 时跳过缓存回放与多播。
+        """
+        meta = meta if meta is not None else {}
+        model_profile, provider = self.resolve(profile, "web_search" if enable_web_search else None)
+        meta.update(
+            {
+                "provider": provider.name,
+                "model": model_profile.model,
+                "cache_hit": False,
+                "shared": False,
+                "failover": False,
+                "queue_wait_ms": 0,
             }
+        )
+        messages = self._sanitize_messages(messages)
 
-        # 执行流式请求
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            async with client.stream("POST", url, json=stream_payload, headers=headers) as resp:
-                resp.raise_for_status()
-                async for chunk in resp.aiter_bytes():
-                    if not chunk:
-                        continue
-                    try:
-                        text = chunk.decode("utf-8")
-                    except Exception:
-                        text = chunk.decode("latin-1", errors="ignore")
-
-                    for line in text.splitlines():
-                        line = line.strip()
-                        if not line:
-                            continue
-                        if line.startswith("data:"):
-                            data_part = line[len("data:") :].strip()
-                            if data_part == "[DONE]":
-                                return
-                            
-                            # 解析 JSON 并提取 content - NEVER output raw JSON
-                            try:
-                                import json
-                                chunk_data = json.loads(data_part)
-                                # 提取 delta.content
-                                if isinstance(chunk_data, dict) and "choices" in chunk_data:
-                                    for choice in chunk_data.get("choices", []):
-                                        delta = choice.get("delta", {})
-                                        content = delta.get("content")
-                                        # Only yield if content is a non-empty string
-                                        if content and isinstance(content, str):
-                                            yield content
-                                # If not standard format, skip it (don't output raw JSON)
-                            except json.JSONDecodeError as e:
-                                # Log parsing error but NEVER output the raw data
-                                print(f"⚠️ SSE JSON解析失败: {e}, 数据: {data_part[:100]}")
-                                # Skip this chunk completely
-                                continue
-                            except Exception as e:
-                                # Catch any other errors and skip
-                                print(f"⚠️ 处理SSE数据时出错: {e}")
-                                continue
-                        else:
-                            # 非 data: 开头的行，尝试解析
-                            try:
-                                import json
-                                chunk_data = json.loads(line)
-                                if isinstance(chunk_data, dict) and "choices" in chunk_data:
-                                    for choice in chunk_data.get("choices", []):
-                                        delta = choice.get("delta", {})
-                                        content = delta.get("content")
-                                        # Only yield if content is a non-empty string
-                                        if content and isinstance(content, str):
-                                            yield content
-                                # If not standard format, skip it (don't output raw JSON)
-                            except json.JSONDecodeError:
-                                # Not JSON, skip silently (don't output raw text)
-                                pass
-                            except Exception:
-                                # Catch any other errors and skip
-                                pass
-
-    async def upload_file(self, file_path: str, purpose: str = "file-extract", timeout: float = None) -> Dict[str, Any]:
-        url = self._build_url("/files")
-        headers = {"Authorization": f"Bearer {self.api_key}"}
+        cache_key = None
+        cache_payload = self._payload(model_profile, messages, stream=False, **options)
+        if enable_web_search:
+            cache_payload["tools"] = WEB_SEARCH_TOOLS
+        if response_cache.enabled_for(cache_scope):
+            cache_key = request_fingerprint(provider.name, cache_payload)
+            cached = None if no_cache else await response_cache.get(cache_key, cache_scope)
+            if cached is not None:
+                meta["cache_hit"] = True
+                for chunk in replay_chunks(response_content(cached)):
+                    yield chunk
+                return
+
+        routes = self.routes(model_profile, provider, pinned=enable_web_search)
+
+        async def source() -> AsyncIterator[str]:
+            parts: List[str] = []
+            for index, (route_profile, route_provider) in enumerate(routes):
+                meta.update({"provider": route_provider.name, "model": route_profile.model})
+                try:
+                    async for content in self._request_stream(
+                        route_provider, route_profile, messages, enable_web_search, options, priority, meta
+                    ):
+                        parts.append(content)
+                        yield content
+                    break
+                except Exception as e:
+                    # 只在首个片段之前故障转移，已输出的内容不能重放到另一个模型上
+                    if parts or index == len(routes) - 1 or not is_retryable(e):
+                        raise
+                    logger.warning(
+                        f"{route_provider.name} 流式调用失败，切换到 {routes[index + 1][1].name}: {self._format_error(e)}"
+                    )
+                    meta["failover"] = True
+            if cache_key and parts and not meta["failover"]:
+                await response_cache.set(cache_key, completion_from_text("".join(parts), meta["model"]))
+
+        if not no_cache and self._dedupe(cache_scope):
+            # 相同载荷的并发流共享一个上游流，迟到者先回放已收到的片段
+            stream, meta["shared"] = stream_flight.stream(
+                cache_key or request_fingerprint(provider.name, cache_payload), source
+            )
+        else:
+            stream = source()
+        async for content in stream:
+            yield content
+
+    async def _request_stream(
+        self,
+        provider: ProviderConfig,
+        model_profile: ModelProfile,
+        messages: List[Dict[str, Any]],
+        enable_web_search: bool,
+        options: Dict[str, Any],
+        priority: Priority,
+        meta: Dict[str, Any],
+    ) -> AsyncIterator[str]:
+        if enable_web_search:
+            logger.info(f"联网搜索已启用，当前模型: {model_profile.model}")
+        messages = list(messages)  # 复制一份，tool 结果只追加到本次请求的上下文
+        for _ in range(MAX_TOOL_ROUNDS + 1):
+            stream_payload = self._payload(model_profile, messages, stream=True, **options)
+            if enable_web_search:
+                stream_payload["tools"] = WEB_SEARCH_TOOLS
+            if provider.supports("stream_usage"):
+                # Kimi 在最后一个 choice 中自带 usage；DeepSeek 需要显式请求
+                stream_payload["stream_options"] = {"include_usage": True}
+
+            tool_calls = ToolCallAccumulator() if enable_web_search else None
+            parts: List[str] = []
+            async for content in self._stream_chat(
+                provider, stream_payload, model_profile.timeout, priority, meta, tool_calls=tool_calls
+            ):
+                parts.append(content)
+                yield content
+            if tool_calls is None or not tool_calls.requested:
+                return
+
+            logger.info(f"检测到 tool_calls（{len(tool_calls.tool_calls)} 个），回填结果后继续流式输出")
+            self._append_tool_results(messages, tool_calls.message("".join(parts)))
+            messages = self._sanitize_messages(messages)
+        logger.warning(f"tool_calls 超过 {MAX_TOOL_ROUNDS} 轮，停止联网搜索")
+
+    async def upload_file(
+        self,
+        file_path: Optional[str],
+        purpose: str = "file-extract",
+        timeout: float = None,
+        profile: Optional[str] = None,
+        priority: Priority = Priority.EXTRACTION,
+        content: Optional[bytes] = None,
+        filename: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """上传文件；传入 content 时直接上传内存中的字节（filename 为上传的文件名），不落临时文件"""
+        model_profile, provider = self.resolve(profile, "files")
         data = {"purpose": purpose}
-        use_timeout = timeout if timeout is not None else self.timeout
-        async with httpx.AsyncClient(timeout=use_timeout) as client:
-            with open(file_path, "rb") as handle:
-                files = {"file": (os.path.basename(file_path), handle)}
-                resp = await client.post(url, headers=headers, files=files, data=data)
-                resp.raise_for_status()
-                return resp.json()
-
-    async def get_file_content(self, file_id: str) -> str:
-        url = self._build_url(f"/files/{file_id}/content")
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            resp = await client.get(url, headers=headers)
-            resp.raise_for_status()
-            return resp.text
+        use_timeout = timeout if timeout is not None else model_profile.timeout
+        if content is not None:
+            resp = await self._send(
+                provider,
+                "POST",
+                "/files",
+                priority,
+                headers=self._headers(provider, json_body=False),
+                files={"file": (filename or "file", content)},
+                data=data,
+                timeout=use_timeout,
+            )
+            return resp.json()
+        with open(file_path, "rb") as handle:
+            files = {"file": (os.path.basename(file_path), handle)}
+            resp = await self._send(
+                provider,
+                "POST",
+                "/files",
+                priority,
+                before_attempt=lambda: handle.seek(0),
+                headers=self._headers(provider, json_body=False),
+                files=files,
+                data=data,
+                timeout=use_timeout,
+            )
+            return resp.json()
 
-    async def delete_file(self, file_id: str) -> None:
-        url = self._build_url(f"/files/{file_id}")
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            resp = await client.delete(url, headers=headers)
-            resp.raise_for_status()
+    async def get_file_content(
+        self,
+        file_id: str,
+        timeout: float = None,
+        profile: Optional[str] = None,
+        priority: Priority = Priority.EXTRACTION,
+    ) -> str:
+        model_profile, provider = self.resolve(profile, "files")
+        resp = await self._send(
+            provider,
+            "GET",
+            f"/files/{file_id}/content",
+            priority,
+            headers=self._headers(provider, json_body=False),
+            timeout=timeout if timeout is not None else model_profile.timeout,
+        )
+        return resp.text
+
+    async def delete_file(self, file_id: str, profile: Optional[str] = None, priority: Priority = Priority.EXTRACTION) -> None:
+        model_profile, provider = self.resolve(profile, "files")
+        await self._send(
+            provider,
+            "DELETE",
+            f"/files/{file_id}",
+            priority,
+            headers=self._headers(provider, json_body=False),
+            timeout=model_profile.timeout,
+        )
 
-    async def extract_file_text(self, file_path: str, max_retries: int = 3) -> str:
+    async def extract_file_text(
+        self,
+        file_path: Optional[str],
+        max_retries: int = 3,
+        profile: Optional[str] = PROFILE_LONG_CONTEXT,
+        priority: Priority = Priority.EXTRACTION,
+        content: Optional[bytes] = None,
+        filename: Optional[str] = None,
+    ) -> str:
         """提取文件文本内容，使用更长的超时时间，支持重试"""
+        model_profile, _ = self.resolve(profile, "files")
         # 文件处理需要更长的超时时间（5分钟）
-        file_timeout = max(self.timeout * 5, 300.0)
-        
+        file_timeout = max(model_profile.timeout * 5, 300.0)
+
         last_error = None
         for attempt in range(max_retries):
             file_id = None
             try:
                 # 上传文件时也使用更长的超时时间
-                file_obj = await self.upload_file(file_path, purpose="file-extract", timeout=file_timeout)
+                file_obj = await self.upload_file(
+                    file_path,
+                    purpose="file-extract",
+                    timeout=file_timeout,
+                    profile=profile,
+                    priority=priority,
+                    content=content,
+                    filename=filename,
+                )
                 file_id = file_obj.get("id")
                 if not file_id:
                     raise RuntimeError("file upload failed: missing file id")
-                
+
                 # 使用更长的超时时间获取文件内容
-                url = self._build_url(f"/files/{file_id}/content")
-                headers = {"Authorization": f"Bearer {self.api_key}"}
-                async with httpx.AsyncClient(timeout=file_timeout) as client:
-                    resp = await client.get(url, headers=headers)
-                    resp.raise_for_status()
-                    return resp.text
-                    
+                return await self.get_file_content(file_id, timeout=file_timeout, profile=profile, priority=priority)
+
             except httpx.HTTPStatusError as e:
                 last_error = e
                 # 如果是 502/503/504 这类服务端错误，可以重试
                 if e.response.status_code in [502, 503, 504] and attempt < max_retries - 1:
-                    import asyncio
                     # 等待一段时间后重试（指数退避）
                     wait_time = (attempt + 1) * 2
                     await asyncio.sleep(wait_time)
@@ -391,20 +616,23 @@ class AIGCClient:
                 # 清理文件
                 if file_id:
                     try:
-                        await self.delete_file(file_id)
+                        await self.delete_file(file_id, profile=profile, priority=priority)
                     except Exception:
                         pass
-        
+
         # 如果所有重试都失败了
         if last_error:
             raise last_error
         raise RuntimeError("file extraction failed after all retries")
 
-    async def extract_url_content(self, url: str, max_chars: int = 3000) -> str:
+    async def extract_url_content(
+        self,
+        url: str,
+        max_chars: int = 3000,
+        profile: Optional[str] = PROFILE_LONG_CONTEXT,
+        priority: Priority = Priority.EXTRACTION,
+    ) -> str:
         """使用 Kimi 的联网功能提取 URL 内容"""
-        if self.provider not in {"kimi", "moonshot"}:
-            raise RuntimeError("URL content extraction is only supported with Kimi provider")
-        
         messages = [
             {
                 "role": "system",
@@ -415,17 +643,25 @@ class AIGCClient:
                 "content": f"请访问这个网址并提取主要内容（限制在{max_chars}字符内）：{url}"
             }
         ]
-        
+
         try:
-            # 使用 enable_web_search=True 会自动处理 tool_calls 流程
-            response = await self.chat(messages, enable_web_search=True)
+            # 使用 enable_web_search=True 会自动处理 tool_calls 流程，并固定到支持联网搜索的 provider
+            response = await self.chat(
+                messages,
+                enable_web_search=True,
+                profile=profile,
+                cache_scope="resource.extract_url",
+                priority=priority,
+            )
             content = response.get("choices", [{}])[0].get("message", {}).get("content", "")
-            
+
             # 限制字符数
             if len(content) > max_chars:
                 content = content[:max_chars] + "..."
-            
+
             return content
         except Exception as e:
             raise RuntimeError(f"Failed to extract URL content: {e}") from e
 
+
+aigc_client = AIGCClient()
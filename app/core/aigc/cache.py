@@ -0,0 +1,195 @@
+"""
+非流式 LLM 调用的精确匹配响应缓存
+键为 (provider, model, messages, tools, 参数) 规范化 JSON 的 SHA-256；
+内存层为带 TTL 与内存预算的 LRU，可选 SQLite 磁盘层在重启后继续命中。
+缓存按调用范围（scope）显式开启，见 settings.AIGC_CACHE_SCOPES。
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import orjson
+
+from app.log import logger
+from app.settings.config import settings
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS aigc_response_cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+def request_fingerprint(provider: str, payload: Dict[str, Any]) -> str:
+    """对请求载荷做规范化哈希；stream 相关字段不参与，流式与非流式共享同一条缓存"""
+    canonical = {k: v for k, v in payload.items() if k not in {"stream", "stream_options"}}
+    canonical["provider"] = provider
+    return hashlib.sha256(orjson.dumps(canonical, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def response_content(data: Dict[str, Any]) -> str:
+    choices = data.get("choices") or [{}]
+    return (choices[0].get("message") or {}).get("content") or ""
+
+
+def completion_from_text(text: str, model: str) -> Dict[str, Any]:
+    """把流式拼接得到的完整文本包装成 chat.completion 结构，便于两种调用方式共用缓存"""
+    return {
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+    }
+
+
+def replay_chunks(text: str, chunk_chars: int = 32) -> Iterator[str]:
+    """把缓存的完整结果切分为合成的流式片段，供 use_stream=True 的调用方快速回放"""
+    for i in range(0, len(text), chunk_chars):
+        yield text[i : i + chunk_chars]
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int,
+        max_bytes: int,
+        sqlite_path: Optional[str] = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sqlite_path = sqlite_path
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._db = None
+        self._writes_since_purge = 0
+        self.counters: Dict[str, int] = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+        self.scope_counters: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_settings(cls) -> "ResponseCache":
+        return cls(
+            ttl=settings.AIGC_CACHE_TTL,
+            max_entries=settings.AIGC_CACHE_MAX_ENTRIES,
+            max_bytes=settings.AIGC_CACHE_MAX_BYTES,
+            sqlite_path=settings.AIGC_CACHE_SQLITE_PATH,
+        )
+
+    def enabled_for(self, scope: Optional[str]) -> bool:
+        return bool(settings.AIGC_CACHE_ENABLED and scope and scope in settings.AIGC_CACHE_SCOPES)
+
+    def _count(self, scope: Optional[str], name: str) -> None:
+        self.counters[name] += 1
+        if scope:
+            bucket = self.scope_counters.setdefault(scope, {"hits": 0, "misses": 0})
+            if name in bucket:
+                bucket[name] += 1
+
+    async def _get_db(self):
+        if not self.sqlite_path:
+            return None
+        if self._db is None:
+            import aiosqlite
+
+            self._db = await aiosqlite.connect(self.sqlite_path)
+            await self._db.execute(_SQLITE_SCHEMA)
+            await self._db.commit()
+        return self._db
+
+    def _remember(self, key: str, expires_at: float, blob: bytes) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[1])
+        if len(blob) > self.max_bytes:
+            return
+        self._entries[key] = (expires_at, blob)
+        self._bytes += len(blob)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.counters["evictions"] += 1
+
+    async def get(self, key: str, scope: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, blob = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self._count(scope, "hits")
+                self.counters["memory_hits"] += 1
+                return orjson.loads(blob)
+            self._entries.pop(key)
+            self._bytes -= len(blob)
+            self.counters["expired"] += 1
+
+        db = await self._get_db()
+        if db is not None:
+            try:
+                async with db.execute(
+                    "SELECT value, expires_at FROM aigc_response_cache WHERE key = ?", (key,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row and row[1] > now:
+                    self._remember(key, row[1], row[0])
+                    self._count(scope, "hits")
+                    self.counters["disk_hits"] += 1
+                    return orjson.loads(row[0])
+            except Exception as e:
+                logger.warning(f"AIGC 响应缓存读取 SQLite 失败: {e}")
+
+        self._count(scope, "misses")
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        expires_at = time.time() + self.ttl
+        blob = orjson.dumps(value)
+        self._remember(key, expires_at, blob)
+        self.counters["stores"] += 1
+
+        db = await self._get_db()
+        if db is None:
+            return
+        try:
+            await db.execute(
+                "INSERT OR REPLACE INTO aigc_response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, blob, expires_at),
+            )
+            self._writes_since_purge += 1
+            if self._writes_since_purge >= 100:
+                await db.execute("DELETE FROM aigc_response_cache WHERE expires_at <= ?", (time.time(),))
+                self._writes_since_purge = 0
+            await db.commit()
+        except Exception as e:
+            logger.warning(f"AIGC 响应缓存写入 SQLite 失败: {e}")
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_ratio": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "sqlite": bool(self.sqlite_path),
+            "scopes": self.scope_counters,
+        }
+
+
+response_cache = ResponseCache.from_settings()
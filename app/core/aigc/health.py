@@ -0,0 +1,155 @@
+"""
+上游 provider 健康度与熔断
+每次上游请求结束时记录延迟（流式为首个片段延迟）与成败，按 EWMA 计算延迟与错误率：
+- closed     正常放行
+- open       连续失败或错误率超过阈值后熔断，冷却期内直接拒绝
+- half_open  冷却结束后放行一个探测请求，成功则恢复，失败则重新熔断
+普通对话按健康评分在已配置的 provider 间选路；联网搜索、文件解析等能力固定在支持它的 provider 上。
+"""
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+from app.settings.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+EWMA_ALPHA = 0.2
+MIN_SAMPLES = 10  # 错误率熔断所需的最少样本数
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class ProviderUnavailable(RuntimeError):
+    pass
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """是否值得换一个 provider 重试：网络错误、超时、服务端错误、限流与熔断"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, (httpx.TransportError, ProviderUnavailable))
+
+
+class ProviderHealth:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.latency_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self.last_error: Optional[str] = None
+        self.counters: Dict[str, int] = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def _cooled_down(self, now: float) -> bool:
+        return now - self.opened_at >= settings.AIGC_BREAKER_COOLDOWN
+
+    def routable(self, now: Optional[float] = None) -> bool:
+        """选路用的只读判断，不占用半开探测名额"""
+        now = now or time.monotonic()
+        if self.state == OPEN:
+            return self._cooled_down(now)
+        if self.state == HALF_OPEN:
+            return now - self.probe_started >= settings.AIGC_BREAKER_COOLDOWN
+        return True
+
+    def allow(self) -> bool:
+        """发出请求前调用；半开状态下只放行一个探测请求（探测超过冷却时间未结束则允许再探测）"""
+        now = time.monotonic()
+        if self.state == CLOSED:
+            return True
+        if self.routable(now):
+            self.state = HALF_OPEN
+            self.probe_started = now
+            return True
+        self.counters["rejected"] += 1
+        return False
+
+    def record_success(self, latency: float) -> None:
+        ms = latency * 1000
+        self.latency_ms = ms if self.latency_ms is None else self.latency_ms + EWMA_ALPHA * (ms - self.latency_ms)
+        self.error_rate += EWMA_ALPHA * (0.0 - self.error_rate)
+        self.samples += 1
+        self.consecutive_failures = 0
+        self.counters["successes"] += 1
+        self.state = CLOSED
+
+    def record_failure(self, reason: str) -> None:
+        self.error_rate += EWMA_ALPHA * (1.0 - self.error_rate)
+        self.samples += 1
+        self.consecutive_failures += 1
+        self.counters["failures"] += 1
+        self.last_error = reason[:200]
+        if (
+            self.state == HALF_OPEN
+            or self.consecutive_failures >= settings.AIGC_BREAKER_FAILURES
+            or (self.samples >= MIN_SAMPLES and self.error_rate >= settings.AIGC_BREAKER_ERROR_RATE)
+        ):
+            if self.state != OPEN:
+                self.counters["opened"] += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def score(self) -> float:
+        """越小越好：EWMA 延迟按错误率放大，未知延迟按 1 秒计"""
+        latency = self.latency_ms if self.latency_ms is not None else 1000.0
+        return latency * (1.0 + 4.0 * self.error_rate)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "consecutive_failures": self.consecutive_failures,
+            "score": round(self.score(), 1),
+            "last_error": self.last_error,
+            **self.counters,
+        }
+
+
+class HealthRegistry:
+    def __init__(self):
+        self._providers: Dict[str, ProviderHealth] = {}
+
+    def get(self, name: str) -> ProviderHealth:
+        health = self._providers.get(name)
+        if health is None:
+            health = self._providers[name] = ProviderHealth(name)
+        return health
+
+    def check(self, name: str) -> None:
+        if not self.get(name).allow():
+            raise ProviderUnavailable(f"AIGC provider {name} 熔断中，请稍后重试")
+
+    def rank(self, preferred: str, candidates: Iterable[str]) -> List[str]:
+        """
+        对可用 provider 排序：配置的 provider 只要健康评分不比其他差 AIGC_ROUTING_BIAS 倍就优先使用。
+        全部熔断时仍返回配置的 provider，由 check() 给出明确错误。
+        """
+        now = time.monotonic()
+        names = [n for n in dict.fromkeys([preferred, *candidates]) if self.get(n).routable(now)]
+        if not names:
+            return [preferred]
+        bias = max(1.0, settings.AIGC_ROUTING_BIAS)
+        return sorted(names, key=lambda n: self.get(n).score() / (bias if n == preferred else 1.0))
+
+    def record(self, name: str, status_code: int, latency: float) -> None:
+        """按上游响应状态码记录：5xx 计为失败，429 不计入（配额问题由限流器处理），其余视为 provider 正常响应"""
+        if status_code >= 500:
+            self.get(name).record_failure(f"HTTP {status_code}")
+        elif status_code != 429:
+            self.get(name).record_success(latency)
+
+    def record_error(self, name: str, exc: BaseException) -> None:
+        self.get(name).record_failure(f"{exc.__class__.__name__}: {exc}")
+
+    def stats(self, names: Iterable[str] = ()) -> Dict[str, Any]:
+        return {name: self.get(name).stats() for name in dict.fromkeys([*names, *self._providers])}
+
+
+provider_health = HealthRegistry()
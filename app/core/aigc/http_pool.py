@@ -0,0 +1,166 @@
+"""
+AIGC 上游连接池
+每个 provider 进程内只维护一个 httpx.AsyncClient，复用 keep-alive 连接（可选 HTTP/2），
+避免每次生成都重新进行 TCP + TLS 握手。
+"""
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.log import logger
+from app.settings.config import settings
+
+
+def normalize_provider(provider: Optional[str]) -> str:
+    """统一 provider 名称：moonshot 与 kimi 视为同一个上游"""
+    name = (provider or "deepseek").lower()
+    if name in {"kimi", "moonshot"}:
+        return "kimi"
+    return name
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """包装响应体，在响应关闭时回调，用于统计仍占用连接的请求数"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
+
+
+class _MeteredTransport(httpx.AsyncHTTPTransport):
+    """
+    在 httpx 默认传输层上统计请求数、进行中的请求数与排队次数。
+    进行中的请求数由本类自行计数（请求开始 +1，响应关闭 -1），不依赖 httpx/httpcore 的内部属性；
+    连接数只在能读到时尽力提供，httpx 升级后读不到时返回 None，不影响请求路径。
+    """
+
+    def __init__(self, max_connections: int, **kwargs):
+        super().__init__(**kwargs)
+        self.max_connections = max_connections
+        self.requests_total = 0
+        self.waits_total = 0
+        self.in_flight = 0
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+
+    def _connection_counts(self) -> Dict[str, Optional[int]]:
+        try:
+            connections = list(getattr(getattr(self, "_pool", None), "connections", None) or [])
+            open_connections = [conn for conn in connections if not conn.is_closed()]
+            idle = sum(1 for conn in open_connections if conn.is_idle())
+            return {"connections": len(open_connections), "idle": idle}
+        except Exception:
+            return {"connections": None, "idle": None}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests_total += 1
+        if self.in_flight >= self.max_connections:
+            self.waits_total += 1
+        self.in_flight += 1
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self._release()
+            raise
+        response.stream = _TrackedStream(response.stream, self._release)
+        return response
+
+    def metrics(self) -> Dict[str, Any]:
+        counts: Dict[str, Any] = self._connection_counts()
+        counts.update(
+            {
+                "in_use": min(self.in_flight, self.max_connections),
+                "queued": max(0, self.in_flight - self.max_connections),
+                "max_connections": self.max_connections,
+                "requests_total": self.requests_total,
+                "waits_total": self.waits_total,
+            }
+        )
+        return counts
+
+
+class UpstreamPool:
+    """按 provider 管理共享的 httpx.AsyncClient，在应用 lifespan 中创建和关闭"""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, _MeteredTransport] = {}
+        self.http2 = False
+
+    def _build_client(self, provider: str) -> httpx.AsyncClient:
+        http2 = bool(settings.AIGC_HTTP2)
+        if http2 and not _http2_available():
+            logger.warning("AIGC_HTTP2 已开启但未安装 h2（pip install 'httpx[http2]'），回退到 HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+
+        limits = httpx.Limits(
+            max_connections=settings.AIGC_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AIGC_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.AIGC_POOL_KEEPALIVE_EXPIRY,
+        )
+        transport = _MeteredTransport(
+            max_connections=settings.AIGC_POOL_MAX_CONNECTIONS,
+            limits=limits,
+            http2=http2,
+        )
+        self._transports[provider] = transport
+        # 超时由各调用方按请求传入；这里仅给出连接建立的兜底超时
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(60.0, connect=settings.AIGC_POOL_CONNECT_TIMEOUT),
+        )
+
+    def get_client(self, provider: Optional[str]) -> httpx.AsyncClient:
+        """获取 provider 对应的共享客户端，未启动时惰性创建（便于脚本场景使用）"""
+        key = normalize_provider(provider)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = self._build_client(key)
+            self._clients[key] = client
+        return client
+
+    async def startup(self):
+        """预先创建已配置 provider 的连接池"""
+        if settings.DEEPSEEK_API_KEY:
+            self.get_client("deepseek")
+        if settings.MOONSHOT_API_KEY:
+            self.get_client("kimi")
+        logger.info(f"AIGC 上游连接池已就绪: {sorted(self._clients)} http2={self.http2}")
+
+    async def shutdown(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+        self._transports.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            provider: {"http2": self.http2, **transport.metrics()}
+            for provider, transport in self._transports.items()
+            if provider in self._clients
+        }
+
+
+upstream_pool = UpstreamPool()
@@ -0,0 +1,181 @@
+"""
+AIGC provider 与模型配置（profile）注册表
+统一读取 settings 中的密钥、地址与超时，同时支持多个具名模型配置：
+- default       通用生成（AIGC_PROVIDER / AIGC_MODEL）
+- fast          低延迟对话，例如提示词助手
+- long_context  长上下文，例如网页/文件内容提取
+- batch         低成本批量生成
+未在 AIGC_PROFILES 中配置的内置 profile 会回退到 default。
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.core.aigc.http_pool import normalize_provider
+from app.log import logger
+from app.settings.config import settings
+
+PROFILE_DEFAULT = "default"
+PROFILE_FAST = "fast"
+PROFILE_LONG_CONTEXT = "long_context"
+PROFILE_BATCH = "batch"
+BUILTIN_PROFILES = (PROFILE_DEFAULT, PROFILE_FAST, PROFILE_LONG_CONTEXT, PROFILE_BATCH)
+
+
+def parse_timeout(raw: Any, default: float = 60.0) -> float:
+    """AIGC_TIMEOUT 既可能是毫秒也可能是秒：>= 1000 视为毫秒"""
+    if raw is None or raw == "":
+        return default
+    try:
+        t = int(raw)
+        return t / 1000 if t >= 1000 else float(t)
+    except (TypeError, ValueError):
+        try:
+            return float(raw)
+        except (TypeError, ValueError):
+            return default
+
+
+@dataclass
+class ProviderConfig:
+    name: str
+    api_key: str
+    base_url: str
+    default_model: str
+    features: frozenset = field(default_factory=frozenset)
+
+    @property
+    def has_key(self) -> bool:
+        return bool(self.api_key)
+
+    def supports(self, feature: str) -> bool:
+        return feature in self.features
+
+    def build_url(self, path: str) -> str:
+        if self.base_url.endswith("/v1"):
+            return f"{self.base_url}{path}"
+        return f"{self.base_url}/v1{path}"
+
+
+@dataclass
+class ModelProfile:
+    name: str
+    provider: str
+    model: str
+    timeout: float
+    options: Dict[str, Any] = field(default_factory=dict)  # temperature / max_tokens 等透传参数
+
+
+class ProviderRegistry:
+    def __init__(self):
+        self.providers: Dict[str, ProviderConfig] = {}
+        self.profiles: Dict[str, ModelProfile] = {}
+        self.reload()
+
+    def reload(self):
+        """从 settings 重新加载 provider 与 profile 配置"""
+        self.providers = {
+            "deepseek": ProviderConfig(
+                name="deepseek",
+                api_key=settings.DEEPSEEK_API_KEY or "",
+                base_url=(settings.DEEPSEEK_API_BASE or "https://api.deepseek.com").rstrip("/"),
+                default_model=settings.DEEPSEEK_MODEL,
+                features=frozenset({"stream_usage"}),  # 支持 stream_options.include_usage
+            ),
+            "kimi": ProviderConfig(
+                name="kimi",
+                api_key=settings.MOONSHOT_API_KEY or "",
+                base_url=(settings.MOONSHOT_API_BASE or "https://api.moonshot.cn/v1").rstrip("/"),
+                default_model=settings.MOONSHOT_MODEL,
+                features=frozenset({"web_search", "files"}),
+            ),
+        }
+
+        timeout = parse_timeout(settings.AIGC_TIMEOUT)
+        default_provider = normalize_provider(settings.AIGC_PROVIDER)
+        if default_provider not in self.providers:
+            logger.warning(f"未知的 AIGC_PROVIDER={settings.AIGC_PROVIDER}，回退到 deepseek")
+            default_provider = "deepseek"
+        default = ModelProfile(
+            name=PROFILE_DEFAULT,
+            provider=default_provider,
+            model=settings.AIGC_MODEL or self.providers[default_provider].default_model,
+            timeout=timeout,
+        )
+        profiles = {PROFILE_DEFAULT: default}
+
+        for name, conf in (settings.AIGC_PROFILES or {}).items():
+            conf = dict(conf or {})
+            provider = normalize_provider(conf.pop("provider", default.provider))
+            if provider not in self.providers:
+                logger.warning(f"AIGC profile {name} 使用了未知 provider {provider}，已忽略")
+                continue
+            model = conf.pop("model", None) or self.providers[provider].default_model
+            profile_timeout = parse_timeout(conf.pop("timeout", None), default=timeout)
+            profiles[name] = ModelProfile(name=name, provider=provider, model=model, timeout=profile_timeout, options=conf)
+
+        for name in BUILTIN_PROFILES:
+            if name not in profiles:
+                profiles[name] = ModelProfile(
+                    name=name, provider=default.provider, model=default.model, timeout=default.timeout
+                )
+        self.profiles = profiles
+
+    def provider(self, name: Optional[str]) -> ProviderConfig:
+        return self.providers[normalize_provider(name)]
+
+    def profile(self, name: Optional[str] = None) -> ModelProfile:
+        profile = self.profiles.get(name or PROFILE_DEFAULT)
+        if profile is None:
+            logger.warning(f"未配置的 AIGC profile {name}，使用 default")
+            profile = self.profiles[PROFILE_DEFAULT]
+        return profile
+
+    def profile_for_feature(self, name: Optional[str], feature: str) -> ModelProfile:
+        """需要特定能力（联网搜索、文件解析）时，保证落在支持该能力的 provider 上"""
+        profile = self.profile(name)
+        if self.providers[profile.provider].supports(feature):
+            return profile
+        for provider in self.providers.values():
+            if provider.supports(feature) and provider.has_key:
+                return self.rebase(profile, provider.name)
+        raise RuntimeError(f"没有已配置的 AIGC provider 支持 {feature}")
+
+    def rebase(self, profile: ModelProfile, provider: str) -> ModelProfile:
+        """把 profile 换到另一个 provider 上（使用该 provider 的默认模型），用于能力固定与故障转移"""
+        provider = normalize_provider(provider)
+        if provider == profile.provider:
+            return profile
+        return ModelProfile(
+            name=f"{profile.name}@{provider}",
+            provider=provider,
+            model=self.providers[provider].default_model,
+            timeout=profile.timeout,
+            options=dict(profile.options),
+        )
+
+    def configured(self) -> List[str]:
+        """已配置密钥的 provider 名称"""
+        return [p.name for p in self.providers.values() if p.has_key]
+
+    def supports(self, feature: str, profile: Optional[str] = None) -> bool:
+        """profile 为空时判断是否有任一已配置密钥的 provider 支持该能力"""
+        if profile:
+            provider = self.providers[self.profile(profile).provider]
+            return provider.has_key and provider.supports(feature)
+        return any(p.has_key and p.supports(feature) for p in self.providers.values())
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """诊断信息，不包含密钥"""
+        return [
+            {
+                "name": profile.name,
+                "provider": profile.provider,
+                "model": profile.model,
+                "timeout_seconds": profile.timeout,
+                "has_key": self.providers[profile.provider].has_key,
+            }
+            for profile in self.profiles.values()
+        ]
+
+
+provider_registry = ProviderRegistry()
@@ -0,0 +1,216 @@
+"""
+上游 provider 准入控制
+每个 provider 一个限流器：最大并发 + 每分钟请求数（RPM）/ 每分钟 Token 数（TPM）令牌桶 + 优先级队列。
+优先级从高到低：交互式流式对话 > 提示词助手 > 文件/网页提取 > 批量生成。
+收到 429 时按 Retry-After 暂停该 provider 的放行，排队等待时间写入 meta 并计入指标。
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.aigc.http_pool import normalize_provider
+from app.settings.config import settings
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    ASSISTANT = 1
+    EXTRACTION = 2
+    BATCH = 3
+
+
+class QueueTimeout(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """按分钟配额连续回填的令牌桶，limit <= 0 表示不限制"""
+
+    def __init__(self, limit_per_minute: int):
+        self.limit = limit_per_minute
+        self.rate = limit_per_minute / 60.0
+        self.level = float(limit_per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.limit, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        if self.limit <= 0 or amount <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.limit)  # 超过桶容量的单次请求在桶满时放行
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float, now: float) -> None:
+        if self.limit <= 0 or amount <= 0:
+            return
+        self._refill(now)
+        self.level -= min(amount, self.limit)
+
+
+class ProviderLimiter:
+    def __init__(self, name: str, max_concurrency: int, rpm: int, tpm: int):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.active = 0
+        self.paused_until = 0.0
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.counters: Dict[str, int] = {"admitted": 0, "rate_limited": 0, "timeouts": 0}
+        self.waits: Dict[str, Dict[str, float]] = {
+            p.name.lower(): {"count": 0, "total_ms": 0.0, "max_ms": 0.0} for p in Priority
+        }
+
+    def _delay(self, tokens: int, now: float) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.delay(1, now),
+            self.tokens.delay(tokens, now),
+            0.0,
+        )
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue and self.active < self.max_concurrency:
+            _, _, tokens, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            now = time.monotonic()
+            delay = self._delay(tokens, now)
+            if delay > 0:
+                # 严格按优先级放行：队首未满足配额时整体等待
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self.active += 1
+            self.requests.consume(1, now)
+            self.tokens.consume(tokens, now)
+            future.set_result(None)
+
+    async def acquire(self, priority: Priority, tokens: int = 0, timeout: Optional[float] = None) -> float:
+        """排队直到获得执行名额，返回等待秒数"""
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (int(priority), next(self._seq), tokens, future))
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise QueueTimeout(f"{self.name} 上游排队超时（{timeout:.0f} 秒）")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        waited = time.monotonic() - start
+        self._record_wait(priority, waited)
+        return waited
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def pause(self, seconds: float) -> None:
+        self.counters["rate_limited"] += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _record_wait(self, priority: Priority, waited: float) -> None:
+        self.counters["admitted"] += 1
+        stat = self.waits[Priority(priority).name.lower()]
+        ms = waited * 1000
+        stat["count"] += 1
+        stat["total_ms"] += ms
+        stat["max_ms"] = max(stat["max_ms"], ms)
+
+    def stats(self) -> Dict[str, Any]:
+        queued: Dict[str, int] = {p.name.lower(): 0 for p in Priority}
+        for priority, _, _, future in self._queue:
+            if not future.done():
+                queued[Priority(priority).name.lower()] += 1
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rpm": self.requests.limit,
+            "tpm": self.tokens.limit,
+            "active": self.active,
+            "queued": queued,
+            "paused_seconds": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            **self.counters,
+            "queue_wait_ms": {
+                name: {
+                    "count": int(stat["count"]),
+                    "avg": round(stat["total_ms"] / stat["count"], 1) if stat["count"] else 0.0,
+                    "max": round(stat["max_ms"], 1),
+                }
+                for name, stat in self.waits.items()
+            },
+        }
+
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    try:
+        return max(0.0, float(value)) if value else default
+    except (TypeError, ValueError):
+        return default
+
+
+class UpstreamScheduler:
+    def __init__(self):
+        self._limiters: Dict[str, ProviderLimiter] = {}
+
+    def limiter(self, provider: str) -> ProviderLimiter:
+        name = normalize_provider(provider)
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            conf = dict(settings.AIGC_LIMITS.get(name) or {})
+            limiter = ProviderLimiter(
+                name,
+                max_concurrency=int(conf.get("max_concurrency", settings.AIGC_MAX_CONCURRENCY)),
+                rpm=int(conf.get("rpm", settings.AIGC_RPM)),
+                tpm=int(conf.get("tpm", settings.AIGC_TPM)),
+            )
+            self._limiters[name] = limiter
+        return limiter
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        provider: str,
+        priority: Priority = Priority.INTERACTIVE,
+        tokens: int = 0,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[None]:
+        """在 provider 的限流器中占用一个执行名额；meta 中累加 queue_wait_ms"""
+        limiter = self.limiter(provider)
+        waited = await limiter.acquire(priority, tokens, timeout=settings.AIGC_QUEUE_TIMEOUT or None)
+        if meta is not None:
+            meta["queue_wait_ms"] = meta.get("queue_wait_ms", 0) + int(waited * 1000)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    def rate_limited(self, provider: str, retry_after: Optional[str]) -> float:
+        """收到 429 后暂停放行，返回暂停秒数"""
+        seconds = parse_retry_after(retry_after, settings.AIGC_RATE_LIMIT_BACKOFF)
+        self.limiter(provider).pause(seconds)
+        return seconds
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
+
+
+upstream_scheduler = UpstreamScheduler()
@@ -0,0 +1,137 @@
+"""
+相同请求的在途合并（singleflight）与流式多播
+- SingleFlight：同一规范化载荷的并发非流式调用只发起一次上游请求，结果共享；
+- StreamGroup：同一载荷的并发流式调用挂到同一个上游流上，迟到者先回放已收到的片段再跟随实时输出。
+上游任务与发起者解耦：某个订阅者断开不会影响其他人，所有订阅者都离开后才取消上游。
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, Tuple[asyncio.Task, List[int]]] = {}
+        self.counters: Dict[str, int] = {"leaders": 0, "shared": 0, "cancelled": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """返回 (结果, 是否复用了他人发起的请求)"""
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            task = asyncio.create_task(fn())
+            call = (task, [0])
+            self._calls[key] = call
+            task.add_done_callback(lambda _t, k=key, c=call: self._forget(k, c))
+            self.counters["leaders"] += 1
+        else:
+            self.counters["shared"] += 1
+
+        task, waiters = call
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            waiters[0] -= 1
+            if waiters[0] == 0 and not task.done():
+                # 所有等待者都已取消，上游结果不再有人需要
+                task.cancel()
+                self._forget(key, call)
+                self.counters["cancelled"] += 1
+
+    def _forget(self, key: str, call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "inflight": len(self._calls)}
+
+
+class StreamMulticast:
+    """单个上游流的多播缓冲：保存已收到的全部片段，订阅者各自维护读取位置"""
+
+    def __init__(self, source: AsyncIterator[str], on_close: Callable[["StreamMulticast"], None]):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._source = source
+        self._on_close = on_close
+        self._updated = asyncio.Event()
+        self._task = asyncio.create_task(self._pump())
+
+    @property
+    def closed(self) -> bool:
+        return self.done or self._task.cancelled()
+
+    def _notify(self) -> None:
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def _pump(self) -> None:
+        try:
+            async for chunk in self._source:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("上游流已取消")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            self._on_close(self)
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self.chunks):
+                    chunk = self.chunks[index]
+                    index += 1
+                    yield chunk
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._updated.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self._on_close(self)
+                self._task.cancel()
+
+
+class StreamGroup:
+    def __init__(self):
+        self._streams: Dict[str, StreamMulticast] = {}
+        self.counters: Dict[str, int] = {"leaders": 0, "joined": 0, "replayed_chunks": 0}
+
+    def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> Tuple[AsyncIterator[str], bool]:
+        """返回 (订阅迭代器, 是否挂到了已有的上游流)"""
+        multicast = self._streams.get(key)
+        joined = multicast is not None and not multicast.closed
+        if not joined:
+            multicast = StreamMulticast(factory(), on_close=lambda m, k=key: self._forget(k, m))
+            self._streams[key] = multicast
+            self.counters["leaders"] += 1
+        else:
+            self.counters["joined"] += 1
+            self.counters["replayed_chunks"] += len(multicast.chunks)
+        return multicast.subscribe(), joined
+
+    def _forget(self, key: str, multicast: StreamMulticast) -> None:
+        if self._streams.get(key) is multicast:
+            del self._streams[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "inflight": len(self._streams),
+            "subscribers": sum(m.subscribers for m in self._streams.values()),
+        }
+
+
+chat_flight = SingleFlight()
+stream_flight = StreamGroup()
@@ -0,0 +1,220 @@
+"""
+OpenAI 兼容流式响应（SSE）增量解析器
+DeepSeek 与 Kimi 共用：按字节帧切分行，只对完整行做 JSON 解析，
+因此跨 TCP 分片的 data: 行和多字节中文字符都不会被截断或乱码。
+"""
+import logging
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, List, NamedTuple, Optional
+
+import orjson
+
+from app.core.aigc.tokens import Usage, parse_usage
+
+logger = logging.getLogger(__name__)
+
+DONE = "[DONE]"
+
+
+class SSEEvent(NamedTuple):
+    event: Optional[str]  # event: 字段，None 表示默认 message 事件
+    data: Any  # JSON 载荷解析后的对象；非 JSON 时为字符串
+    done: bool = False  # 是否为 [DONE] 结束标记
+
+
+class SSEDecoder:
+    """
+    增量 SSE 解码器。
+
+    - 缓冲区为 bytearray，按 b"\\n" 定位行边界，行内容以 memoryview 切片交给 orjson，不产生逐行字符串拷贝；
+    - 换行符 0x0A 不会出现在 UTF-8 多字节序列中，按字节成帧后再解码天然安全；
+    - OpenAI 兼容接口每个事件只有一行 data:，因此每个 data: 行立即派发，空行仅用于重置 event: 名称。
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._event: Optional[str] = None
+        self.bytes_fed = 0
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        events: List[SSEEvent] = []
+        if not chunk:
+            return events
+        self.bytes_fed += len(chunk)
+        buf = self._buffer
+        buf += chunk
+        start = 0
+        view = memoryview(buf)
+        try:
+            while True:
+                newline = buf.find(b"\n", start)
+                if newline < 0:
+                    break
+                end = newline
+                if end > start and buf[end - 1] == 0x0D:
+                    end -= 1
+                self._process_line(view[start:end], events)
+                start = newline + 1
+        finally:
+            view.release()
+        if start:
+            # 每个分片只压缩一次缓冲区，整体为线性复杂度
+            del buf[:start]
+        return events
+
+    def flush(self) -> List[SSEEvent]:
+        """流结束时处理最后一行（上游未以换行结尾的情况）"""
+        events: List[SSEEvent] = []
+        if self._buffer:
+            tail = bytes(self._buffer).rstrip(b"\r")
+            self._buffer.clear()
+            self._process_line(memoryview(tail), events)
+        return events
+
+    def _process_line(self, line: memoryview, events: List[SSEEvent]) -> None:
+        if not line:
+            self._event = None
+            return
+        first = line[0]
+        if first == 0x3A:  # ":" 注释 / 心跳
+            return
+        if first == 0x7B:  # "{" 非 SSE 格式的裸 JSON 行（部分网关直接返回错误体）
+            payload = self._loads(line)
+            if payload is not None:
+                events.append(SSEEvent(self._event, payload))
+            return
+
+        # 字段名最长为 "retry"，只需在行首几个字节中查找冒号
+        colon = bytes(line[:8]).find(b":")
+        if colon < 0:
+            return
+        field = bytes(line[:colon])
+        value = line[colon + 1 :]
+        if value and value[0] == 0x20:
+            value = value[1:]
+
+        if field == b"data":
+            if not value:
+                return
+            if value == b"[DONE]":
+                events.append(SSEEvent(self._event, DONE, True))
+                return
+            payload = self._loads(value)
+            if payload is None:
+                payload = value.tobytes().decode("utf-8", errors="replace")
+            events.append(SSEEvent(self._event, payload))
+        elif field == b"event":
+            self._event = value.tobytes().decode("utf-8", errors="replace").strip() or None
+
+    @staticmethod
+    def _loads(value: memoryview) -> Any:
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError as e:
+            logger.warning(f"SSE JSON解析失败: {e}, 数据: {value[:100].tobytes()!r}")
+            return None
+
+
+def iter_delta_contents(payload: Any) -> List[str]:
+    """从一个 chat.completion.chunk 中取出所有非空的 delta.content"""
+    contents: List[str] = []
+    if not isinstance(payload, dict):
+        return contents
+    for choice in payload.get("choices") or []:
+        delta = choice.get("delta") or {}
+        content = delta.get("content")
+        if content and isinstance(content, str):
+            contents.append(content)
+    return contents
+
+
+class ToolCallAccumulator:
+    """
+    流式 tool_calls 拼装器。
+    delta.tool_calls 按 index 分片下发：首个分片带 id / type / function.name，
+    之后只追加 function.arguments 片段；finish_reason == "tool_calls" 表示本轮需要执行工具。
+    """
+
+    def __init__(self):
+        self._calls: Dict[int, Dict[str, Any]] = {}
+        self.finish_reason: Optional[str] = None
+
+    def feed(self, payload: Any) -> None:
+        if not isinstance(payload, dict):
+            return
+        for choice in payload.get("choices") or []:
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+            for delta in (choice.get("delta") or {}).get("tool_calls") or []:
+                call = self._calls.setdefault(
+                    delta.get("index", len(self._calls)),
+                    {"id": "", "type": "function", "function": {"name": "", "arguments": ""}},
+                )
+                if delta.get("id"):
+                    call["id"] = delta["id"]
+                if delta.get("type"):
+                    call["type"] = delta["type"]
+                function = delta.get("function") or {}
+                if function.get("name"):
+                    call["function"]["name"] = function["name"]
+                if function.get("arguments"):
+                    call["function"]["arguments"] += function["arguments"]
+
+    @property
+    def requested(self) -> bool:
+        return self.finish_reason == "tool_calls" and bool(self._calls)
+
+    @property
+    def tool_calls(self) -> List[Dict[str, Any]]:
+        return [self._calls[index] for index in sorted(self._calls)]
+
+    def message(self, content: str = "") -> Dict[str, Any]:
+        """本轮的 assistant 消息，供追加到上下文后发起后续请求"""
+        return {"role": "assistant", "content": content, "tool_calls": self.tool_calls}
+
+
+def _raise_for_error_event(event: SSEEvent) -> None:
+    payload = event.data
+    if event.event == "error":
+        detail = payload.get("error", payload) if isinstance(payload, dict) else payload
+        raise RuntimeError(f"上游流式响应错误: {detail}")
+    if isinstance(payload, dict) and payload.get("error") and not payload.get("choices"):
+        error = payload["error"]
+        message = error.get("message") if isinstance(error, dict) else error
+        raise RuntimeError(f"上游流式响应错误: {message}")
+
+
+async def iter_events(byte_stream: AsyncIterable[bytes]) -> AsyncIterator[SSEEvent]:
+    """把字节流解码为 SSE 事件序列，遇到 [DONE] 后结束"""
+    decoder = SSEDecoder()
+    async for chunk in byte_stream:
+        for event in decoder.feed(chunk):
+            yield event
+            if event.done:
+                return
+    for event in decoder.flush():
+        yield event
+        if event.done:
+            return
+
+
+async def iter_content(
+    byte_stream: AsyncIterable[bytes],
+    on_usage: Optional[Callable[[Usage], None]] = None,
+    tool_calls: Optional[ToolCallAccumulator] = None,
+) -> AsyncIterator[str]:
+    """
+    只输出 delta.content 文本，绝不把原始 JSON 透传给调用方；
+    usage 片段交给 on_usage，tool_calls 分片交给 tool_calls 拼装器
+    """
+    async for event in iter_events(byte_stream):
+        if event.done:
+            return
+        _raise_for_error_event(event)
+        if tool_calls is not None:
+            tool_calls.feed(event.data)
+        if on_usage is not None:
+            usage = parse_usage(event.data)
+            if usage is not None:
+                on_usage(usage)
+        for content in iter_delta_contents(event.data):
+            yield content
@@ -0,0 +1,104 @@
+"""
+Token 计量
+优先使用 provider 返回的 usage（非流式响应体 / 流式最后一个 usage 片段）：
+- DeepSeek: usage.prompt_cache_hit_tokens、usage.prompt_tokens_details.cached_tokens
+- Kimi: usage 位于 choices[0].usage，缓存命中为 cached_tokens
+拿不到时用本地估算：按 DeepSeek 文档的经验值，1 个中文字符约 0.6 token，1 个英文字符约 0.3 token。
+"""
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Optional
+
+CJK_TOKENS_PER_CHAR = 0.6
+OTHER_TOKENS_PER_CHAR = 0.3
+MESSAGE_OVERHEAD_TOKENS = 4  # 每条消息的角色与分隔符
+
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x4E00 <= code <= 0x9FFF  # 中日韩统一表意文字
+        or 0x3400 <= code <= 0x4DBF  # 扩展 A
+        or 0x3000 <= code <= 0x303F  # 中文标点
+        or 0xFF00 <= code <= 0xFFEF  # 全角字符
+        or 0x20000 <= code <= 0x2FFFF  # 扩展 B 及以后
+    )
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    other = sum(1 for ch in text if not ch.isspace()) - cjk
+    return max(1, round(cjk * CJK_TOKENS_PER_CHAR + other * OTHER_TOKENS_PER_CHAR))
+
+
+def estimate_messages_tokens(messages: Iterable[Dict[str, Any]]) -> int:
+    total = 0
+    for message in messages or []:
+        total += MESSAGE_OVERHEAD_TOKENS + estimate_tokens(str(message.get("content") or ""))
+    return total
+
+
+@dataclass
+class Usage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    estimated: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: "Usage") -> "Usage":
+        return Usage(
+            prompt_tokens=self.prompt_tokens + other.prompt_tokens,
+            completion_tokens=self.completion_tokens + other.completion_tokens,
+            cached_tokens=self.cached_tokens + other.cached_tokens,
+            estimated=self.estimated or other.estimated,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "total_tokens": self.total_tokens}
+
+    @classmethod
+    def estimate(cls, messages: Iterable[Dict[str, Any]], completion: str) -> "Usage":
+        return cls(
+            prompt_tokens=estimate_messages_tokens(messages),
+            completion_tokens=estimate_tokens(completion),
+            estimated=True,
+        )
+
+
+def parse_usage(payload: Any) -> Optional[Usage]:
+    """从 chat.completion 响应或流式片段中解析 usage；没有 usage 时返回 None"""
+    if not isinstance(payload, dict):
+        return None
+    usage = payload.get("usage")
+    if not usage:
+        for choice in payload.get("choices") or []:
+            if isinstance(choice, dict) and choice.get("usage"):
+                usage = choice["usage"]
+                break
+    if not isinstance(usage, dict):
+        return None
+
+    details = usage.get("prompt_tokens_details") or {}
+    cached = usage.get("prompt_cache_hit_tokens")
+    if cached is None:
+        cached = details.get("cached_tokens")
+    if cached is None:
+        cached = usage.get("cached_tokens")
+    return Usage(
+        prompt_tokens=int(usage.get("prompt_tokens") or 0),
+        completion_tokens=int(usage.get("completion_tokens") or 0),
+        cached_tokens=int(cached or 0),
+    )
+
+
+def resolve_usage(meta: Dict[str, Any], messages: Iterable[Dict[str, Any]], completion: str) -> Usage:
+    """调用方使用：优先取上游 usage，否则本地估算"""
+    usage = meta.get("usage")
+    if isinstance(usage, Usage):
+        return usage
+    return Usage.estimate(messages, completion)
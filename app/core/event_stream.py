@@ -0,0 +1,163 @@
+"""
+可续传的 SSE 事件流
+生成端（producer）在独立任务中运行，与 HTTP 连接解耦；每个事件带 "id: <stream_id>:<seq>"，
+并保存在有界回放缓冲中。客户端断线重连时携带 Last-Event-ID，即可从断点继续，不会重新请求上游。
+流结束后缓冲保留 SSE_REPLAY_TTL 秒。
+所有客户端都断开且 SSE_DISCONNECT_GRACE 秒内没有重连时取消生成任务，上游请求随之中断，不再为无人接收的 token 付费；
+生成端在收到 CancelledError 时自行记录已生成的部分。
+"""
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+
+from app.log import logger
+from app.settings.config import settings
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"}
+
+
+class EventStream:
+    def __init__(self, stream_id: str, owner: Optional[str], max_events: int):
+        self.id = stream_id
+        self.owner = owner
+        # 至少保留最新一条事件：follow() 依赖 events[0] 判断回放是否已被截断
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=max(1, max_events))
+        self.seq = 0
+        self.done = False
+        self.expires_at: Optional[float] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.on_idle: Optional[Callable[["EventStream"], None]] = None
+        self._updated = asyncio.Event()
+
+    def _notify(self) -> None:
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    def append(self, frame: str) -> None:
+        self.seq += 1
+        self.events.append((self.seq, frame))
+        self._notify()
+
+    def close(self) -> None:
+        self.done = True
+        self.expires_at = time.monotonic() + settings.SSE_REPLAY_TTL
+        self._notify()
+
+    async def follow(self, after: int = 0) -> AsyncIterator[str]:
+        """从 after 之后的事件开始输出；已被缓冲淘汰的事件直接跳过"""
+        self.subscribers += 1
+        try:
+            while True:
+                while after < self.seq:
+                    first = self.events[0][0]
+                    if after + 1 < first:
+                        logger.warning(f"SSE 流 {self.id} 回放缺失 {after + 1}..{first - 1}，缓冲已淘汰")
+                        after = first - 1
+                    after += 1
+                    yield f"id: {self.id}:{after}\n{self.events[after - first][1]}"
+                if self.done:
+                    return
+                await self._updated.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self.on_idle is not None:
+                self.on_idle(self)
+
+
+class EventStreamRegistry:
+    def __init__(self):
+        self._streams: Dict[str, EventStream] = {}
+        self.cancelled = 0
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        for stream_id in [sid for sid, s in self._streams.items() if s.expires_at and s.expires_at <= now]:
+            del self._streams[stream_id]
+
+    async def _pump(self, stream: EventStream, producer: AsyncIterator[str]) -> None:
+        try:
+            async for frame in producer:
+                stream.append(frame)
+        except asyncio.CancelledError:
+            await producer.aclose()
+            raise
+        except Exception as e:
+            logger.error(f"SSE 流 {stream.id} 生成失败: {e}")
+        finally:
+            stream.close()
+
+    def _on_idle(self, stream: EventStream) -> None:
+        grace = settings.SSE_DISCONNECT_GRACE
+        if grace <= 0:
+            self._cancel_if_abandoned(stream)
+        else:
+            asyncio.get_running_loop().call_later(grace, self._cancel_if_abandoned, stream)
+
+    def _cancel_if_abandoned(self, stream: EventStream) -> None:
+        if stream.subscribers or stream.done or stream.task is None or stream.task.done():
+            return
+        logger.info(f"SSE 流 {stream.id} 的客户端已断开，取消生成（已输出 {stream.seq} 个事件）")
+        self.cancelled += 1
+        stream.task.cancel()
+
+    def start(self, producer: AsyncIterator[str], owner: Optional[str] = None) -> EventStream:
+        """启动新的事件流；producer 产出完整的 SSE 帧（以空行结尾），id 行由这里添加"""
+        self._purge()
+        stream = EventStream(uuid.uuid4().hex, owner, settings.SSE_REPLAY_MAX_EVENTS)
+        stream.on_idle = self._on_idle
+        self._streams[stream.id] = stream
+        stream.task = asyncio.create_task(self._pump(stream, producer))
+        return stream
+
+    def find(self, last_event_id: Optional[str], owner: Optional[str] = None) -> Tuple[Optional[EventStream], int]:
+        """解析 Last-Event-ID（<stream_id>:<seq>），返回 (可续传的流, 已收到的序号)"""
+        self._purge()
+        if not last_event_id or ":" not in last_event_id:
+            return None, 0
+        stream_id, _, seq = last_event_id.strip().rpartition(":")
+        stream = self._streams.get(stream_id)
+        if stream is None or stream.owner != owner or not seq.isdigit():
+            return None, 0
+        return stream, int(seq)
+
+    @staticmethod
+    def response(stream: EventStream, after: int = 0) -> StreamingResponse:
+        return StreamingResponse(
+            stream.follow(after),
+            media_type="text/event-stream",
+            headers={**SSE_HEADERS, "X-Stream-Id": stream.id},
+        )
+
+    def resume(self, last_event_id: Optional[str], owner: Optional[str] = None) -> Optional[StreamingResponse]:
+        stream, after = self.find(last_event_id, owner)
+        if stream is None:
+            return None
+        logger.info(f"SSE 流 {stream.id} 从事件 {after} 续传")
+        return self.response(stream, after)
+
+    def stream_response(self, producer: AsyncIterator[str], owner: Optional[str] = None) -> StreamingResponse:
+        return self.response(self.start(producer, owner))
+
+    async def shutdown(self) -> None:
+        tasks = [s.task for s in self._streams.values() if s.task is not None and not s.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._streams.clear()
+
+    def stats(self) -> Dict[str, int]:
+        self._purge()
+        return {
+            "streams": len(self._streams),
+            "active": sum(1 for s in self._streams.values() if not s.done),
+            "subscribers": sum(s.subscribers for s in self._streams.values()),
+            "cancelled": self.cancelled,
+        }
+
+
+event_streams = EventStreamRegistry()
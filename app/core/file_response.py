@@ -0,0 +1,131 @@
+"""
+支持断点续传与缓存校验的文件下载响应
+- ETag：调用方传入（教学资源使用内容哈希作为强 ETag），If-None-Match 命中时返回 304，不读取文件；
+- Range：支持单个字节区间（bytes=a-b / a- / -n），返回 206 与 Content-Range，视频拖动进度条时只传所需部分；
+  多区间请求按规范退化为完整响应，区间越界返回 416；If-Range 与 ETag 不一致时返回完整文件；
+- 完整响应交给 starlette FileResponse（自带 Content-Length / Last-Modified）；
+- 配置 RESOURCE_DOWNLOAD_ACCEL_PREFIX 后只返回 X-Accel-Redirect 头，由 nginx 以 sendfile 零拷贝发送文件并处理 Range。
+starlette 0.37 的 FileResponse 还不支持 Range，这里用子类按区间分块读取。
+"""
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from app.settings.config import settings
+
+
+class FileRangeResponse(FileResponse):
+    """只发送文件 [start, end] 区间的 206 响应"""
+
+    def __init__(self, path: str, start: int, end: int, stat_result: os.stat_result, **kwargs):
+        super().__init__(path, status_code=206, stat_result=stat_result, **kwargs)
+        self.start = start
+        self.end = end
+        self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        remaining = 0 if scope["method"].upper() == "HEAD" else self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break  # 文件在发送途中被截断
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 使用弱比较：忽略 W/ 前缀"""
+    if header.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == target for tag in header.split(","))
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单个字节区间，返回闭区间 (start, end)。
+    格式不识别或多区间时返回 None（按完整文件响应）；区间不可满足时抛 ValueError。
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = (part.strip() for part in spec.partition("-"))
+    if not sep or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # bytes=-n：最后 n 个字节
+        if int(last) == 0 or size == 0:
+            raise ValueError("range not satisfiable")
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, (min(int(last), size - 1) if last else size - 1)
+
+
+def _content_disposition(filename: str) -> str:
+    # 中文标题不能直接放进 latin-1 的响应头，按 RFC 5987 编码
+    return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+def file_download_response(
+    request: Request,
+    file_path: str,
+    filename: str,
+    etag: Optional[str] = None,
+) -> Response:
+    stat_result = os.stat(file_path)
+    size = stat_result.st_size
+    if etag is None:
+        # 没有内容哈希的历史文件使用基于大小与修改时间的弱 ETag
+        etag = f'W/"{size:x}-{int(stat_result.st_mtime):x}"'
+    media_type = mimetypes.guess_type(filename)[0] or mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    headers: Dict[str, str] = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # 资源可能是私有的：只允许浏览器缓存，且每次使用前用 ETag 重新校验
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": _content_disposition(filename),
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={k: headers[k] for k in ("ETag", "Cache-Control")})
+
+    accel_prefix = settings.RESOURCE_DOWNLOAD_ACCEL_PREFIX
+    relative = os.path.relpath(os.path.abspath(file_path), os.path.join(settings.BASE_DIR, "uploads"))
+    if accel_prefix and not relative.startswith(os.pardir):
+        headers["X-Accel-Redirect"] = quote(accel_prefix.rstrip("/") + "/" + Path(relative).as_posix())
+        return Response(media_type=media_type, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range 要求强比较：弱 ETag 或不一致时忽略 Range，返回完整的新内容
+    if range_header and (not if_range or (if_range.strip() == etag and not etag.startswith("W/"))):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}", "ETag": etag})
+        if byte_range is not None:
+            start, end = byte_range
+            return FileRangeResponse(
+                file_path, start, end, stat_result, media_type=media_type, headers=headers
+            )
+
+    return FileResponse(file_path, stat_result=stat_result, media_type=media_type, headers=headers)
@@ -7,6 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from tortoise.expressions import Q
 
 from app.api import api_router
+from app.api.v1.ideological.resources import DOWNLOAD_URL_PREFIX
 from app.controllers.api import api_controller
 from app.controllers.user import UserCreate, user_controller
 from app.core.exceptions import (
@@ -23,6 +24,7 @@ from app.core.exceptions import (
 )
 from app.log import logger
 from app.models.admin import Api, Menu, Role
+from app.models.ideological import TeachingResource
 from app.schemas.menus import MenuType
 from app.settings.config import settings
 
@@ -180,6 +182,24 @@ async def init_db():
     await command.upgrade(run_in_transaction=True)
 
 
+async def init_resource_file_uuids():
+    """
+    为加 file_uuid 列之前上传的资源回填下载 UUID（取自 download_url），下载接口只按 file_uuid 索引查找。
+    回填完成后这里只是一次 file_uuid IS NULL 的索引查询。
+    """
+    legacy = await TeachingResource.filter(
+        file_uuid__isnull=True, download_url__startswith=DOWNLOAD_URL_PREFIX
+    ).values_list("id", "download_url")
+    filled = 0
+    for resource_id, download_url in legacy:
+        file_uuid = download_url[len(DOWNLOAD_URL_PREFIX):]
+        if file_uuid and len(file_uuid) <= 36 and not await TeachingResource.exists(file_uuid=file_uuid):
+            await TeachingResource.filter(id=resource_id).update(file_uuid=file_uuid)
+            filled += 1
+    if filled:
+        logger.info(f"为 {filled} 个历史资源回填了下载 UUID")
+
+
 async def init_roles():
     roles = await Role.exists()
     if not roles:
@@ -212,6 +232,7 @@ async def init_roles():
 
 async def init_data():
     await init_db()
+    await init_resource_file_uuids()
     await init_superuser()
     await init_menus()
     await init_apis()
@@ -0,0 +1,106 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from app.log import logger
+
+
+class AsyncWorkerPool:
+    """
+    进程内 asyncio 工作池
+    固定数量的 worker 从队列中取任务执行，与 HTTP 请求生命周期解耦；
+    支持按 key 取消排队中或执行中的任务。在 lifespan 中 start() / stop()。
+    """
+
+    def __init__(self, name: str, concurrency: int, handler: Callable[[Any], Awaitable[None]]):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.handler = handler
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[Hashable, asyncio.Task] = {}
+        self._queued: Dict[Hashable, Any] = {}
+        self.counters: Dict[str, int] = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0}
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        if self.started:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"{self.name}-worker-{i}") for i in range(self.concurrency)
+        ]
+        for key, item in self._queued.items():
+            self._queue.put_nowait((key, item))
+
+    async def stop(self) -> None:
+        """停止 worker 并取消执行中的任务（任务状态由 handler 自行处理，通常留给下次启动恢复）"""
+        for task in [*self._workers, *self._running.values()]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._running.values(), return_exceptions=True)
+        self._workers = []
+        self._running.clear()
+        self._queue = None
+
+    def submit(self, key: Hashable, item: Any) -> None:
+        if key in self._queued or key in self._running:
+            return
+        self._queued[key] = item
+        self.counters["submitted"] += 1
+        if self._queue is not None:
+            self._queue.put_nowait((key, item))
+
+    def cancel(self, key: Hashable) -> bool:
+        """取消排队中或执行中的任务，返回是否找到该任务"""
+        if self._queued.pop(key, None) is not None:
+            self.counters["cancelled"] += 1
+            return True
+        task = self._running.get(key)
+        if task is not None:
+            task.cancel()
+            return True
+        return False
+
+    async def join(self) -> None:
+        """等待队列中已提交的任务全部执行完（离线脚本使用）"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def is_running(self, key: Hashable) -> bool:
+        return key in self._running
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            key, item = await self._queue.get()
+            try:
+                if self._queued.pop(key, None) is None:
+                    continue  # 排队期间已取消
+                task = asyncio.create_task(self.handler(item))
+                self._running[key] = task
+                try:
+                    # 用 wait 而不是直接 await：任务被单独取消时 worker 本身继续运行
+                    await asyncio.wait({task})
+                except asyncio.CancelledError:
+                    task.cancel()
+                    raise
+                finally:
+                    self._running.pop(key, None)
+                if task.cancelled():
+                    self.counters["cancelled"] += 1
+                elif task.exception() is not None:
+                    self.counters["failed"] += 1
+                    logger.opt(exception=task.exception()).error(f"{self.name} 任务 {key} 执行失败")
+                else:
+                    self.counters["completed"] += 1
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "queued": len(self._queued),
+            "running": len(self._running),
+            **self.counters,
+        }
@@ -1,5 +1,6 @@
 # 新增model需要在这里导入
 from .admin import *
+from .aigc import *
 from .ideological import *
 from .course import Course
 from .chapter import Chapter
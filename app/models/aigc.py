@@ -0,0 +1,42 @@
+from tortoise import fields
+
+from .base import BaseModel, TimestampMixin
+from .enums import GenerationJobStatus
+
+
+class AIGCUsageDaily(BaseModel, TimestampMixin):
+    """AIGC Token 用量日账（按用户 / 日期 / 接口 / provider / 模型 / 模板汇总）"""
+    user_id = fields.BigIntField(default=0, description="用户ID(0表示匿名)", index=True)
+    day = fields.DateField(description="日期", index=True)
+    endpoint = fields.CharField(max_length=50, description="调用接口", index=True)
+    provider = fields.CharField(max_length=20, description="AIGC provider", index=True)
+    model = fields.CharField(max_length=100, description="模型")
+    prompt_template_id = fields.BigIntField(default=0, description="提示词模板ID(0表示未使用模板)", index=True)
+    request_count = fields.IntField(default=0, description="请求次数")
+    cache_hit_count = fields.IntField(default=0, description="命中响应缓存或复用在途请求的次数（不计费）")
+    estimated_count = fields.IntField(default=0, description="用量为本地估算的次数")
+    prompt_tokens = fields.BigIntField(default=0, description="输入Token数")
+    completion_tokens = fields.BigIntField(default=0, description="输出Token数")
+    cached_tokens = fields.BigIntField(default=0, description="命中上游上下文缓存的输入Token数")
+    cancelled_count = fields.IntField(default=0, description="客户端断开后提前取消的次数")
+    saved_tokens = fields.BigIntField(default=0, description="提前取消估算节省的输出Token数")
+
+    class Meta:
+        table = "aigc_usage_daily"
+        unique_together = (("user_id", "day", "endpoint", "provider", "model", "prompt_template_id"),)
+
+
+class GenerationJob(BaseModel, TimestampMixin):
+    """后台生成任务：与 HTTP 连接解耦，断开后继续生成并落库"""
+    user_id = fields.BigIntField(description="用户ID", index=True)
+    request = fields.JSONField(description="生成请求(AIGCGenerationRequest)")
+    status = fields.CharEnumField(GenerationJobStatus, default=GenerationJobStatus.PENDING, description="任务状态", index=True)
+    content = fields.TextField(null=True, description="生成内容（取消/失败时为已生成部分）")
+    error = fields.TextField(null=True, description="错误信息")
+    generation_id = fields.BigIntField(null=True, description="生成历史ID")
+    attempts = fields.IntField(default=0, description="执行次数（含重启恢复）")
+    started_at = fields.DatetimeField(null=True, description="开始时间")
+    finished_at = fields.DatetimeField(null=True, description="结束时间")
+
+    class Meta:
+        table = "generation_job"
@@ -67,3 +67,30 @@ class PromptAssistantSession(StrEnum):
     REFINEMENT = "refinement"  # 优化阶段
     FINALIZATION = "finalization"  # 最终确认阶段
     COMPLETED = "completed"  # 已完成
+
+
+class GenerationStatus(StrEnum):
+    COMPLETED = "completed"  # 正常完成
+    CANCELLED = "cancelled"  # 客户端断开后取消，内容为已生成部分
+    FAILED = "failed"  # 上游出错中断，内容为已生成部分
+
+
+class TextExtractionStatus(StrEnum):
+    PENDING = "pending"  # 等待提取
+    RUNNING = "running"  # 提取中
+    DONE = "done"  # 已提取，文本在 resource_text_cache 中
+    FAILED = "failed"  # 提取失败
+
+
+class UploadSessionStatus(StrEnum):
+    UPLOADING = "uploading"  # 接收分块中
+    STORED = "stored"  # 文件已收齐并登记到存储，等待创建资源（创建失败时可重试 complete）
+    COMPLETED = "completed"  # 已完成并创建资源
+
+
+class GenerationJobStatus(StrEnum):
+    PENDING = "pending"  # 排队中
+    RUNNING = "running"  # 生成中
+    SUCCEEDED = "succeeded"  # 已完成
+    FAILED = "failed"  # 失败
+    CANCELLED = "cancelled"  # 已取消
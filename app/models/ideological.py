@@ -1,6 +1,15 @@
 from tortoise import fields
 from .base import BaseModel, TimestampMixin
-from .enums import CaseStatus, CaseType, ResourceType, TemplateType, PromptAssistantSession
+from .enums import (
+    CaseStatus,
+    CaseType,
+    GenerationStatus,
+    PromptAssistantSession,
+    ResourceType,
+    TemplateType,
+    TextExtractionStatus,
+    UploadSessionStatus,
+)
 
 
 class IdeologicalCase(BaseModel, TimestampMixin):
@@ -65,6 +74,7 @@ class TeachingResource(BaseModel, TimestampMixin):
     file_size = fields.IntField(null=True, description="文件大小(字节)")
     file_format = fields.CharField(max_length=20, null=True, description="文件格式")
     download_url = fields.CharField(max_length=500, null=True, description="下载链接")
+    file_uuid = fields.CharField(max_length=36, null=True, unique=True, description="下载链接中的文件UUID")
     preview_url = fields.CharField(max_length=500, null=True, description="预览链接")
     external_url = fields.CharField(max_length=500, null=True, description="外部链接")
     tags = fields.JSONField(default=list, description="标签列表")
@@ -75,6 +85,14 @@ class TeachingResource(BaseModel, TimestampMixin):
     usage_count = fields.IntField(default=0, description="使用次数", index=True)
     is_public = fields.BooleanField(default=True, description="是否公开", index=True)
     file_path = fields.CharField(max_length=500, null=True, description="文件路径")
+    content_hash = fields.CharField(max_length=64, null=True, description="文件内容SHA-256", index=True)
+    extraction_status = fields.CharEnumField(
+        TextExtractionStatus, null=True, description="文本预提取状态（无文件的资源为空）", index=True
+    )
+    extraction_error = fields.TextField(null=True, description="文本提取失败原因")
+    page_count = fields.IntField(null=True, description="页数/幻灯片数")
+    extracted_chars = fields.IntField(null=True, description="提取的文本字符数")
+    extracted_at = fields.DatetimeField(null=True, description="文本提取完成时间")
 
     # 关系字段
     uploader = fields.ForeignKeyField('models.User', related_name='uploaded_resources', null=True, on_delete=fields.SET_NULL)
@@ -83,6 +101,53 @@ class TeachingResource(BaseModel, TimestampMixin):
         table = "teaching_resource"
 
 
+class ResourceTextCache(BaseModel, TimestampMixin):
+    """资源文本提取结果，按文件内容寻址：相同文件只提取一次，多个资源共享"""
+    content_hash = fields.CharField(max_length=64, description="文件内容SHA-256", index=True)
+    extractor = fields.CharField(max_length=20, description="提取器(local/kimi)")
+    extractor_version = fields.CharField(max_length=20, description="提取器版本")
+    text = fields.TextField(description="规范化后的完整文本")
+    total_chars = fields.IntField(description="文本字符数")
+    page_count = fields.IntField(null=True, description="页数/幻灯片数")
+    page_offsets = fields.JSONField(null=True, description="每页在文本中的起始位置")
+    hit_count = fields.IntField(default=0, description="缓存命中次数")
+
+    class Meta:
+        table = "resource_text_cache"
+        unique_together = (("content_hash", "extractor", "extractor_version"),)
+
+
+class StoredBlob(BaseModel, TimestampMixin):
+    """按内容寻址存储的上传文件，内容相同的资源共享同一个文件，引用计数归零时删除"""
+    content_hash = fields.CharField(max_length=64, unique=True, description="文件内容SHA-256")
+    file_path = fields.CharField(max_length=500, description="文件路径")
+    size = fields.BigIntField(description="文件大小(字节)")
+    ref_count = fields.IntField(default=0, description="引用该文件的资源数")
+
+    class Meta:
+        table = "stored_blob"
+
+
+class UploadSession(BaseModel, TimestampMixin):
+    """分块续传的上传会话：分块按偏移直接写入暂存文件，收齐后登记为教学资源"""
+    upload_id = fields.CharField(max_length=64, unique=True, description="上传会话ID")
+    filename = fields.CharField(max_length=255, description="原始文件名")
+    total_size = fields.BigIntField(description="文件总大小(字节)")
+    received = fields.JSONField(default=list, description="已接收的字节区间 [[start, end), ...]")
+    received_bytes = fields.BigIntField(default=0, description="已接收字节数")
+    staging_path = fields.CharField(max_length=500, description="暂存文件路径")
+    resource_data = fields.JSONField(default=dict, description="完成后创建资源使用的字段")
+    status = fields.CharEnumField(UploadSessionStatus, default=UploadSessionStatus.UPLOADING, description="会话状态")
+    content_hash = fields.CharField(max_length=64, null=True, description="收齐后登记的文件内容SHA-256")
+    file_path = fields.CharField(max_length=500, null=True, description="收齐后登记的存储文件路径")
+    resource_id = fields.IntField(null=True, description="完成后创建的资源ID")
+    expires_at = fields.DatetimeField(description="过期时间，超时未完成的会话被清理", index=True)
+    user = fields.ForeignKeyField('models.User', related_name='upload_sessions', null=True, on_delete=fields.CASCADE)
+
+    class Meta:
+        table = "upload_session"
+
+
 class GenerationHistory(BaseModel, TimestampMixin):
     """生成历史记录"""
     user_input = fields.TextField(description="用户输入")
@@ -93,7 +158,11 @@ class GenerationHistory(BaseModel, TimestampMixin):
     course = fields.ForeignKeyField('models.Course', related_name='generation_histories', null=True, on_delete=fields.SET_NULL)
     chapter = fields.ForeignKeyField('models.Chapter', related_name='generation_histories', null=True, on_delete=fields.SET_NULL)
     token_count = fields.IntField(null=True, description="Token消耗数量")
+    prompt_tokens = fields.IntField(null=True, description="输入Token数")
+    completion_tokens = fields.IntField(null=True, description="输出Token数")
+    cached_tokens = fields.IntField(null=True, description="命中上游上下文缓存的输入Token数")
     generation_time = fields.IntField(null=True, description="生成耗时(毫秒)")
+    status = fields.CharEnumField(GenerationStatus, default=GenerationStatus.COMPLETED, description="生成状态", index=True)
     user_rating = fields.IntField(null=True, description="用户评分(1-5)", index=True)
     user_feedback = fields.TextField(null=True, description="用户反馈")
     is_saved_to_case = fields.BooleanField(default=False, description="是否已保存为案例", index=True)
@@ -145,7 +214,11 @@ class PromptAssistantConversation(BaseModel, TimestampMixin):
     is_final_prompt_generated = fields.BooleanField(default=False, description="是否已生成最终提示词")
     final_prompt = fields.TextField(null=True, description="最终生成的提示词")
     token_count = fields.IntField(null=True, description="Token消耗数量")
+    prompt_tokens = fields.IntField(null=True, description="输入Token数")
+    completion_tokens = fields.IntField(null=True, description="输出Token数")
+    cached_tokens = fields.IntField(null=True, description="命中上游上下文缓存的输入Token数")
     generation_time = fields.IntField(null=True, description="生成耗时(毫秒)")
+    status = fields.CharEnumField(GenerationStatus, default=GenerationStatus.COMPLETED, description="生成状态", index=True)
 
     # 关系字段
     user = fields.ForeignKeyField('models.User', related_name='prompt_assistant_conversations', null=True, on_delete=fields.CASCADE)
@@ -154,6 +227,21 @@ class PromptAssistantConversation(BaseModel, TimestampMixin):
         table = "prompt_assistant_conversation"
 
 
+class PromptAssistantSummary(BaseModel, TimestampMixin):
+    """提示词助手会话的滚动摘要（较早的对话轮次折叠后的内容）"""
+    session_id = fields.CharField(max_length=100, unique=True, description="会话ID")
+    summary = fields.TextField(description="摘要内容")
+    covered_until = fields.IntField(default=0, description="已折叠的最后一条对话记录ID")
+    covered_turns = fields.IntField(default=0, description="已折叠的对话轮数")
+    summary_tokens = fields.IntField(default=0, description="摘要的估算Token数")
+
+    # 关系字段
+    user = fields.ForeignKeyField('models.User', related_name='prompt_assistant_summaries', null=True, on_delete=fields.CASCADE)
+
+    class Meta:
+        table = "prompt_assistant_summary"
+
+
 class PromptAssistantTemplate(BaseModel, TimestampMixin):
     """提示词助手预置模板"""
     name = fields.CharField(max_length=100, description="模板名称", index=True)
@@ -1,5 +1,5 @@
 from typing import List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
 
 
@@ -162,6 +162,10 @@ class TeachingResourceInDB(TeachingResourceBase):
     usage_count: int
     uploader_id: int
     file_path: Optional[str] = None
+    content_hash: Optional[str] = None
+    extraction_status: Optional[str] = None
+    page_count: Optional[int] = None
+    extracted_chars: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -173,6 +177,20 @@ class TeachingResource(TeachingResourceInDB):
     pass
 
 
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., description="原始文件名")
+    total_size: int = Field(..., gt=0, description="文件总大小(字节)")
+    title: str = Field(..., description="资源标题")
+    description: Optional[str] = Field(None, description="资源描述")
+    resource_type: str = Field(..., description="资源类型")
+    tags: List[str] = Field(default=[], description="标签列表")
+    software_engineering_chapter: Optional[str] = Field(None, description="适用章节")
+    course_id: Optional[int] = Field(None, description="课程ID")
+    chapter_id: Optional[int] = Field(None, description="章节ID")
+    theme_category_id: Optional[int] = Field(None, description="思政主题分类ID")
+    is_public: bool = Field(default=True, description="是否公开")
+
+
 class GenerationHistoryBase(BaseModel):
     user_input: str = Field(..., description="用户输入")
     generated_content: str = Field(..., description="生成内容")
@@ -186,7 +204,11 @@ class GenerationHistoryBase(BaseModel):
 class GenerationHistoryCreate(GenerationHistoryBase):
     prompt_template_id: Optional[int] = Field(None, description="使用的提示词模板ID")
     token_count: Optional[int] = Field(None, description="Token消耗数量")
+    prompt_tokens: Optional[int] = Field(None, description="输入Token数")
+    completion_tokens: Optional[int] = Field(None, description="输出Token数")
+    cached_tokens: Optional[int] = Field(None, description="命中上游上下文缓存的输入Token数")
     generation_time: Optional[int] = Field(None, description="生成耗时(毫秒)")
+    status: str = Field(default="completed", description="生成状态(completed/cancelled/failed)")
     user_id: int = Field(..., description="用户ID")
 
 
@@ -207,7 +229,11 @@ class GenerationHistoryInDB(GenerationHistoryBase):
     id: int
     prompt_template_id: Optional[int] = None
     token_count: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
     generation_time: Optional[int] = None
+    status: Optional[str] = None
     user_rating: Optional[int] = None
     user_feedback: Optional[str] = None
     is_saved_to_case: bool
@@ -313,13 +339,43 @@ class AIGCGenerationRequest(BaseModel):
     chapter_id: Optional[int] = Field(None, description="章节ID")
     theme_category_id: Optional[int] = Field(None, description="思政主题分类ID")
     use_stream: bool = Field(default=True, description="是否使用流式生成")
+    profile: Optional[str] = Field(None, description="模型配置名称(default/fast/long_context/batch)，为空使用 default")
+    no_cache: bool = Field(default=False, description="重新生成：跳过响应缓存")
+
+
+class AIGCBatchGenerationRequest(BaseModel):
+    items: Optional[List[AIGCGenerationRequest]] = Field(None, description="逐条给出的生成请求")
+    template_id: Optional[int] = Field(None, description="模板ID（与 variable_sets 组合使用）")
+    variable_sets: Optional[List[dict]] = Field(None, description="模板变量矩阵，每组变量生成一条")
+    generation_type: str = Field(default="case", description="生成类型")
+    software_engineering_chapter: Optional[str] = Field(None, description="软件工程章节")
+    course_id: Optional[int] = Field(None, description="课程ID")
+    chapter_id: Optional[int] = Field(None, description="章节ID")
+    theme_category_id: Optional[int] = Field(None, description="思政主题分类ID")
+    profile: Optional[str] = Field(None, description="模型配置名称，为空使用 batch")
+    no_cache: bool = Field(default=False, description="跳过响应缓存")
+    concurrency: Optional[int] = Field(None, ge=1, description="并发数，不超过 AIGC_BATCH_CONCURRENCY")
+
+    @model_validator(mode="after")
+    def check_variable_sets(self):
+        # 没有模板时每条都只剩系统提示词，会白白消耗 Token
+        if self.variable_sets and not self.template_id:
+            raise ValueError("使用 variable_sets 时必须指定 template_id")
+        if self.variable_sets and not all(self.variable_sets):
+            raise ValueError("variable_sets 中的每组变量都不能为空")
+        return self
 
 
 class AIGCGenerationResponse(BaseModel):
     content: str = Field(..., description="生成内容")
     generation_id: Optional[int] = Field(None, description="生成记录ID")
     token_count: Optional[int] = Field(None, description="Token消耗")
+    prompt_tokens: Optional[int] = Field(None, description="输入Token数")
+    completion_tokens: Optional[int] = Field(None, description="输出Token数")
+    cached_tokens: Optional[int] = Field(None, description="命中上游上下文缓存的输入Token数")
     generation_time: Optional[int] = Field(None, description="生成耗时")
+    cache_hit: bool = Field(False, description="是否命中响应缓存")
+    queue_wait_ms: int = Field(0, description="上游排队等待耗时（毫秒）")
 
 
 class BatchOperationRequest(BaseModel):
@@ -444,6 +500,7 @@ class PromptAssistantResponse(BaseModel):
     final_prompt: Optional[str] = Field(None, description="最终生成的提示词")
     token_count: Optional[int] = Field(None, description="Token消耗数量")
     generation_time: Optional[int] = Field(None, description="生成耗时(毫秒)")
+    context: Optional[dict] = Field(None, description="上下文窗口统计（含相对完整回放节省的Token数）")
 
 
 class PromptAssistantSessionRequest(BaseModel):
@@ -0,0 +1,537 @@
+"""
+课程思政内容增强生成服务
+负责模板渲染、消息构建、调用 AIGC 层生成内容并记录生成历史与用量；单条、流式、批量与后台任务共用。
+"""
+import asyncio
+import functools
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from tortoise.expressions import F
+
+from app.core.aigc.aigc_client import aigc_client
+from app.core.aigc.providers import PROFILE_BATCH, PROFILE_DEFAULT
+from app.core.aigc.scheduler import Priority
+from app.core.aigc.tokens import Usage, resolve_usage
+from app.core.event_stream import event_streams
+from app.log import logger
+from app.models.enums import GenerationStatus
+from app.models.ideological import (
+    GenerationHistory as GenerationHistoryModel,
+    PromptTemplate as PromptTemplateModel,
+)
+from app.schemas.ideological import (
+    AIGCBatchGenerationRequest,
+    AIGCGenerationRequest,
+    AIGCGenerationResponse,
+    GenerationHistoryCreate,
+)
+from app.services.theme_service import ThemeService
+from app.services.usage_service import UsageService
+from app.settings.config import settings
+
+CACHE_SCOPE = "enhanced.generate"
+BATCH_FLUSH_SIZE = 20  # 批量生成历史每攒够 N 条 bulk_create 一次
+BATCH_COMMON_FIELDS = {
+    "generation_type",
+    "software_engineering_chapter",
+    "course_id",
+    "chapter_id",
+    "theme_category_id",
+    "profile",
+    "no_cache",
+}
+
+# 客户端断开后保存批量生成结果的后台任务，持有引用避免被垃圾回收
+_background_saves: Set[asyncio.Task] = set()
+
+
+class EnhancedAIGCService:
+    def __init__(self):
+        self.client = aigc_client
+
+    async def _load_template(self, template_id: int) -> PromptTemplateModel:
+        template = await PromptTemplateModel.get_or_none(id=template_id, is_active=True)
+        if not template:
+            raise HTTPException(status_code=404, detail="模板不存在或已禁用")
+        return template
+
+    @staticmethod
+    def _render_template(template_content: str, variables: dict) -> str:
+        prompt = template_content
+        for var, value in variables.items():
+            placeholder = f"{{{{{var}}}}}"
+            prompt = prompt.replace(placeholder, str(value))
+        return prompt
+
+    async def _prepare_messages(
+        self,
+        request: AIGCGenerationRequest,
+        template: Optional[PromptTemplateModel] = None,
+    ) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        渲染模板并构建消息数组，返回 (用户提示词, messages)。
+        传入 template 时直接使用（批量生成只查询一次模板），否则按 template_id 查询并累加使用次数。
+        """
+        # 如果使用了模板，先渲染模板
+        if request.template_id and request.template_variables:
+            if template is None:
+                template = await self._load_template(request.template_id)
+                # 增加模板使用次数
+                await PromptTemplateModel.filter(id=template.id).update(usage_count=F("usage_count") + 1)
+            prompt = self._render_template(template.template_content, request.template_variables)
+        else:
+            prompt = request.prompt
+
+        # 获取主题名称
+        theme_name = None
+        if request.theme_category_id:
+            theme_name = await ThemeService.get_theme_name_by_id(request.theme_category_id)
+
+        # 构建系统提示词，增强思政教育效果
+        system_prompt, request_context = self._build_system_prompt(
+            request.generation_type,
+            request.software_engineering_chapter,
+            theme_name
+        )
+
+        # 构建消息数组：不变的系统提示词在最前（命中 provider 前缀缓存），章节/主题等请求变量放在最后
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"{prompt}{request_context}"}
+        ]
+        return prompt, messages
+
+    @staticmethod
+    def _history_data(
+        request: AIGCGenerationRequest,
+        prompt: str,
+        content: str,
+        usage: Usage,
+        generation_time: int,
+        user_id: int,
+        status: GenerationStatus = GenerationStatus.COMPLETED,
+    ) -> GenerationHistoryCreate:
+        return GenerationHistoryCreate(
+            user_input=prompt,
+            generated_content=content,
+            prompt_template_id=request.template_id,
+            generation_type=request.generation_type,
+            software_engineering_chapter=request.software_engineering_chapter,
+            course_id=request.course_id,
+            chapter_id=request.chapter_id,
+            theme_category_id=request.theme_category_id,
+            token_count=usage.total_tokens,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_tokens=usage.cached_tokens,
+            generation_time=generation_time,
+            status=status,
+            user_id=user_id
+        )
+
+    async def _save_interrupted(
+        self,
+        request: AIGCGenerationRequest,
+        prompt: str,
+        messages: List[Dict[str, str]],
+        parts: List[str],
+        meta: Dict[str, Any],
+        start_time: float,
+        user_id: int,
+        status: GenerationStatus,
+    ) -> None:
+        """流式生成被取消或中途失败时，保存已生成的部分及其用量"""
+        content = "".join(parts)
+        usage = resolve_usage(meta, messages, content)
+        generation_time = int((time.time() - start_time) * 1000)
+        history_data = self._history_data(request, prompt, content, usage, generation_time, user_id, status)
+        await GenerationHistoryModel.create(**history_data.dict())
+        await UsageService.record(
+            CACHE_SCOPE,
+            usage,
+            meta,
+            user_id=user_id,
+            prompt_template_id=request.template_id,
+            cancelled=status == GenerationStatus.CANCELLED,
+        )
+
+    async def generate_with_template(
+        self,
+        request: AIGCGenerationRequest,
+        user_id: int
+    ) -> AIGCGenerationResponse:
+        start_time = time.time()
+
+        try:
+            prompt, messages = await self._prepare_messages(request)
+
+            # 调用AI生成内容（相同模板与变量的请求可命中响应缓存）
+            meta = {}
+            data = await self.client.chat(
+                messages,
+                profile=request.profile or PROFILE_DEFAULT,
+                cache_scope=CACHE_SCOPE,
+                meta=meta,
+                no_cache=request.no_cache,
+            )
+            content = data["choices"][0]["message"]["content"]
+
+            # 计算Token消耗和生成时间：优先使用上游返回的 usage，缺失时本地估算
+            generation_time = int((time.time() - start_time) * 1000)  # 转换为毫秒
+            usage = resolve_usage(meta, messages, content)
+
+            # 保存生成历史
+            history_data = self._history_data(request, prompt, content, usage, generation_time, user_id)
+            history = await GenerationHistoryModel.create(**history_data.dict())
+            await UsageService.record(CACHE_SCOPE, usage, meta, user_id=user_id, prompt_template_id=request.template_id)
+
+            return AIGCGenerationResponse(
+                content=content,
+                generation_id=history.id,
+                token_count=usage.total_tokens,
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                cached_tokens=usage.cached_tokens,
+                generation_time=generation_time,
+                cache_hit=meta.get("cache_hit", False),
+                queue_wait_ms=meta.get("queue_wait_ms", 0),
+            )
+
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"生成失败: {str(e)}")
+
+    async def generate_stream_with_template(
+        self,
+        request: AIGCGenerationRequest,
+        user_id: int
+    ):
+        """流式生成内容"""
+        start_time = time.time()
+
+        try:
+            prompt, messages = await self._prepare_messages(request)
+
+            # 用于收集完整内容
+            full_content = []
+            meta = {}
+
+            async def event_generator():
+                history = None
+                try:
+                    async for content in self.client.chat_stream(
+                        messages,
+                        profile=request.profile or PROFILE_DEFAULT,
+                        cache_scope=CACHE_SCOPE,
+                        meta=meta,
+                        no_cache=request.no_cache,
+                    ):
+                        # content 现在是纯文本内容
+                        if content:
+                            full_content.append(content)
+                            yield f"data: {json.dumps({'content': content}, ensure_ascii=False)}\n\n"
+
+                    # 生成完成后，保存历史记录
+                    complete_content = ''.join(full_content)
+                    generation_time = int((time.time() - start_time) * 1000)
+                    usage = resolve_usage(meta, messages, complete_content)
+
+                    history_data = self._history_data(
+                        request, prompt, complete_content, usage, generation_time, user_id
+                    )
+                    history = await GenerationHistoryModel.create(**history_data.dict())
+                    await UsageService.record(
+                        CACHE_SCOPE, usage, meta, user_id=user_id, prompt_template_id=request.template_id
+                    )
+                    # 发送完成信号
+                    complete_event = {
+                        'type': 'complete',
+                        'generation_id': history.id,
+                        'cache_hit': meta.get('cache_hit', False),
+                        'queue_wait_ms': meta.get('queue_wait_ms', 0),
+                        'usage': usage.to_dict(),
+                    }
+                    yield f"data: {json.dumps(complete_event, ensure_ascii=False)}\n\n"
+
+                except asyncio.CancelledError:
+                    # 客户端断开：上游流已随取消关闭，保存已生成的部分
+                    if history is None:
+                        await self._save_interrupted(
+                            request, prompt, messages, full_content, meta, start_time, user_id, GenerationStatus.CANCELLED
+                        )
+                    raise
+                except Exception as e:
+                    if history is None and full_content:
+                        await self._save_interrupted(
+                            request, prompt, messages, full_content, meta, start_time, user_id, GenerationStatus.FAILED
+                        )
+                    yield f"event: error\ndata: {str(e)}\n\n"
+
+            # 生成在独立任务中进行，断线后可凭 Last-Event-ID 续传
+            return event_streams.stream_response(event_generator(), owner=str(user_id))
+
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"流式生成失败: {str(e)}")
+
+    async def run_generation(
+        self,
+        request: AIGCGenerationRequest,
+        user_id: int,
+        on_content: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[GenerationHistoryModel, Usage, Dict[str, Any]]:
+        """
+        流式生成并写入生成历史，不依赖 HTTP 连接（供后台生成任务使用）。
+        on_content 在每个片段到达时回调，用于向订阅者推送进度。
+        """
+        start_time = time.time()
+        prompt, messages = await self._prepare_messages(request)
+        parts: List[str] = []
+        meta: Dict[str, Any] = {}
+        async for content in self.client.chat_stream(
+            messages,
+            profile=request.profile or PROFILE_DEFAULT,
+            cache_scope=CACHE_SCOPE,
+            meta=meta,
+            no_cache=request.no_cache,
+        ):
+            if content:
+                parts.append(content)
+                if on_content is not None:
+                    on_content(content)
+
+        complete_content = "".join(parts)
+        generation_time = int((time.time() - start_time) * 1000)
+        usage = resolve_usage(meta, messages, complete_content)
+        history_data = self._history_data(request, prompt, complete_content, usage, generation_time, user_id)
+        history = await GenerationHistoryModel.create(**history_data.dict())
+        await UsageService.record(CACHE_SCOPE, usage, meta, user_id=user_id, prompt_template_id=request.template_id)
+        return history, usage, meta
+
+    def _expand_batch(self, batch: AIGCBatchGenerationRequest) -> List[AIGCGenerationRequest]:
+        """把批量请求展开为单条生成请求：显式 items，或 模板 × 变量矩阵"""
+        if batch.items:
+            return list(batch.items)
+        common = batch.dict(include=BATCH_COMMON_FIELDS)
+        return [
+            AIGCGenerationRequest(
+                prompt="",
+                template_id=batch.template_id,
+                template_variables=variables,
+                use_stream=False,
+                **common,
+            )
+            for variables in batch.variable_sets or []
+        ]
+
+    async def generate_batch(self, batch: AIGCBatchGenerationRequest, user_id: int):
+        """
+        批量生成：以有限并发扇出到 AIGC 层（batch profile、最低优先级），
+        每完成一条立即输出一行 NDJSON，生成历史按批 bulk_create 落库，最后输出汇总行。
+        """
+        items = self._expand_batch(batch)
+        if not items:
+            raise HTTPException(status_code=400, detail="批量生成需要 items 或 template_id + variable_sets")
+        if len(items) > settings.AIGC_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=400, detail=f"单次批量生成最多 {settings.AIGC_BATCH_MAX_ITEMS} 条")
+        # 没有提示词的条目只会带着系统提示词发给模型，直接拒绝
+        empty = [
+            str(i) for i, item in enumerate(items)
+            if not item.prompt.strip() and not (item.template_id and item.template_variables)
+        ]
+        if empty:
+            raise HTTPException(status_code=422, detail=f"第 {', '.join(empty)} 条（从 0 开始）既没有 prompt 也没有模板变量")
+
+        # 模板只查询一次，使用次数按条数一次性累加
+        templates: Dict[int, PromptTemplateModel] = {}
+        for template_id in {item.template_id for item in items if item.template_id and item.template_variables}:
+            templates[template_id] = await self._load_template(template_id)
+            used = sum(1 for item in items if item.template_id == template_id and item.template_variables)
+            await PromptTemplateModel.filter(id=template_id).update(usage_count=F("usage_count") + used)
+
+        concurrency = min(batch.concurrency or settings.AIGC_BATCH_CONCURRENCY, settings.AIGC_BATCH_CONCURRENCY)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        started: Set[int] = set()
+
+        async def run_one(index: int, request: AIGCGenerationRequest) -> Dict[str, Any]:
+            async with semaphore:
+                started.add(index)
+                start_time = time.time()
+                try:
+                    prompt, messages = await self._prepare_messages(request, templates.get(request.template_id))
+                    meta = {}
+                    data = await self.client.chat(
+                        messages,
+                        profile=request.profile or batch.profile or PROFILE_BATCH,
+                        cache_scope=CACHE_SCOPE,
+                        meta=meta,
+                        priority=Priority.BATCH,
+                        no_cache=request.no_cache or batch.no_cache,
+                    )
+                    content = data["choices"][0]["message"]["content"]
+                except Exception as e:
+                    return {"type": "error", "index": index, "error": str(e) or e.__class__.__name__}
+                generation_time = int((time.time() - start_time) * 1000)
+                usage = resolve_usage(meta, messages, content)
+                await UsageService.record(
+                    CACHE_SCOPE, usage, meta, user_id=user_id, prompt_template_id=request.template_id
+                )
+                return {
+                    "type": "result",
+                    "index": index,
+                    "content": content,
+                    "template_variables": request.template_variables,
+                    "generation_time": generation_time,
+                    "cache_hit": meta.get("cache_hit", False),
+                    "queue_wait_ms": meta.get("queue_wait_ms", 0),
+                    "usage": usage.to_dict(),
+                    "_history": self._history_data(request, prompt, content, usage, generation_time, user_id),
+                }
+
+        async def flush(pending: List[GenerationHistoryCreate]) -> int:
+            if not pending:
+                return 0
+            await GenerationHistoryModel.bulk_create([GenerationHistoryModel(**h.dict()) for h in pending])
+            count = len(pending)
+            pending.clear()
+            return count
+
+        async def save_remaining(tasks: List[asyncio.Task], consumed: Set[int], pending: List[GenerationHistoryCreate]):
+            """
+            客户端断开后在独立任务中执行（请求任务已被取消，不能再可靠地 await）：
+            尚未开始的条目取消；已开始的条目等待完成（上游已计费），连同未落库的结果一起写入生成历史。
+            """
+            for index, task in enumerate(tasks):
+                if index not in started:
+                    task.cancel()
+            for index, task in enumerate(tasks):
+                if index in consumed:
+                    continue
+                try:
+                    result = await task
+                except asyncio.CancelledError:
+                    continue
+                history = result.get("_history")
+                if history is not None:
+                    pending.append(history)
+            try:
+                count = await flush(pending)
+            except Exception as e:
+                logger.warning(f"客户端断开后保存批量生成历史失败: {e}")
+                return
+            logger.info(f"客户端断开，批量生成已保存 {count} 条未落库的结果")
+
+        async def ndjson_generator():
+            start_time = time.time()
+            tasks = [asyncio.create_task(run_one(i, item)) for i, item in enumerate(items)]
+            pending: List[GenerationHistoryCreate] = []
+            consumed: Set[int] = set()
+            succeeded = failed = saved = completion_tokens = 0
+            finished = False
+            try:
+                for future in asyncio.as_completed(tasks):
+                    result = await future
+                    consumed.add(result["index"])
+                    history = result.pop("_history", None)
+                    if history is not None:
+                        succeeded += 1
+                        completion_tokens += result["usage"]["completion_tokens"]
+                        pending.append(history)
+                        if len(pending) >= BATCH_FLUSH_SIZE:
+                            saved += await flush(pending)
+                    else:
+                        failed += 1
+                    yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+                saved += await flush(pending)
+                finished = True
+            finally:
+                if not finished:
+                    # 客户端断开：已完成的结果都已计费，必须落库，交给独立任务处理
+                    task = asyncio.create_task(save_remaining(tasks, consumed, pending))
+                    _background_saves.add(task)
+                    task.add_done_callback(_background_saves.discard)
+
+            elapsed = max(time.time() - start_time, 1e-6)
+            summary = {
+                "type": "summary",
+                "total": len(items),
+                "succeeded": succeeded,
+                "failed": failed,
+                "saved": saved,
+                "concurrency": concurrency,
+                "elapsed_ms": int(elapsed * 1000),
+                "items_per_minute": round(succeeded * 60 / elapsed, 2),
+                "completion_tokens_per_second": round(completion_tokens / elapsed, 2),
+            }
+            yield json.dumps(summary, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(ndjson_generator(), media_type="application/x-ndjson")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def _build_system_prompt(
+        generation_type: str,
+        software_engineering_chapter: Optional[str],
+        ideological_theme: Optional[str]
+    ) -> Tuple[str, str]:
+        """
+        构建系统提示词，增强思政教育效果。返回 (系统提示词, 追加在用户消息末尾的请求上下文)。
+        系统提示词只取决于生成类型，逐字节稳定，便于 DeepSeek / Kimi 命中前缀缓存；
+        章节与思政主题放在用户消息末尾。结果按 (生成类型, 章节, 主题) 缓存。
+        """
+
+        base_prompt = """你是一位专业的软件工程课程思政教育专家，擅长将软件工程知识与思政教育理念有机结合。
+
+你的任务是：
+1. 生成高质量的课程思政教学内容
+2. 确保技术知识与思政元素的有机融合
+3. 提供具有教育意义和实用价值的内容
+4. 语言表达准确、生动，适合课堂教学使用
+
+请确保生成的内容：
+- 符合教育教学规律
+- 具有正确的价值导向
+- 体现工匠精神、创新精神、责任担当等思政元素
+- 与软件工程专业知识紧密结合
+- 具有启发性和引导性"""
+
+        if generation_type == "case":
+            base_prompt += """
+
+对于案例生成，请包含以下要素：
+1. 案例背景：描述真实的软件工程场景
+2. 思政元素：融入职业道德、工匠精神等
+3. 技术知识点：结合软件工程具体技术
+4. 讨论思考：提出引导学生思考的问题
+5. 教学建议：提供教学使用建议"""
+        elif generation_type == "discussion":
+            base_prompt += """
+
+对于讨论题生成，请：
+1. 结合软件工程实际场景
+2. 体现职业伦理和价值判断
+3. 设计具有思辨性的问题
+4. 提供多角度思考方向
+5. 引导学生深入探讨"""
+        elif generation_type == "thinking":
+            base_prompt += """
+
+对于思考题生成，请：
+1. 聚具体的技术或管理问题
+2. 融入职业精神和社会责任
+3. 培养批判性思维
+4. 引导创新意识
+5. 强调团队协作精神"""
+
+        request_context = ""
+        if software_engineering_chapter:
+            request_context += f"\n\n当前章节：{software_engineering_chapter}"
+
+        if ideological_theme:
+            request_context += f"\n\n思政主题：{ideological_theme}"
+
+        return base_prompt, request_context
+
+aigc_service = EnhancedAIGCService()
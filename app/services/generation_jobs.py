@@ -0,0 +1,206 @@
+"""
+后台生成任务服务
+提交后立即返回任务ID，由进程内工作池执行生成并写入生成历史，浏览器断开不影响结果落库。
+客户端可轮询任务状态，或通过 SSE 订阅：先回放已生成的片段，再跟随实时输出。
+服务重启时，上次未完成的任务会重新入队（超过最大次数则标记失败）。
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from tortoise.expressions import F
+
+from app.core.worker_pool import AsyncWorkerPool
+from app.log import logger
+from app.models.aigc import GenerationJob
+from app.models.enums import GenerationJobStatus
+from app.schemas.ideological import AIGCGenerationRequest
+from app.services.enhanced_aigc import aigc_service
+from app.settings.config import settings
+
+FINAL_STATUSES = {GenerationJobStatus.SUCCEEDED, GenerationJobStatus.FAILED, GenerationJobStatus.CANCELLED}
+POLL_INTERVAL = 1.0  # 任务不在本进程执行时轮询数据库的间隔（秒）
+
+
+class JobProgress:
+    """执行中任务的片段缓冲，订阅者各自维护读取位置"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self._updated = asyncio.Event()
+
+    def _notify(self) -> None:
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    def append(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def close(self) -> None:
+        self.done = True
+        self._notify()
+
+    @property
+    def content(self) -> str:
+        return "".join(self.chunks)
+
+    async def follow(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                chunk = self.chunks[index]
+                index += 1
+                yield chunk
+            if self.done:
+                return
+            await self._updated.wait()
+
+
+class GenerationJobService:
+    """后台生成任务服务类"""
+
+    def __init__(self):
+        self.pool = AsyncWorkerPool("generation-job", settings.AIGC_JOB_CONCURRENCY, self._run)
+        self._progress: Dict[int, JobProgress] = {}
+        self._stopping = False
+
+    async def startup(self) -> None:
+        self._stopping = False
+        await self.recover()
+        await self.pool.start()
+
+    async def shutdown(self) -> None:
+        # 停止时执行中的任务保持 running 状态，下次启动由 recover() 重新入队
+        self._stopping = True
+        await self.pool.stop()
+
+    async def recover(self) -> None:
+        interrupted = await GenerationJob.filter(
+            status__in=[GenerationJobStatus.PENDING, GenerationJobStatus.RUNNING]
+        ).order_by("id")
+        for job in interrupted:
+            if job.status == GenerationJobStatus.RUNNING and job.attempts >= settings.AIGC_JOB_MAX_ATTEMPTS:
+                await GenerationJob.filter(id=job.id).update(
+                    status=GenerationJobStatus.FAILED,
+                    error="服务重启导致任务多次中断",
+                    finished_at=datetime.now(),
+                )
+                continue
+            if job.status == GenerationJobStatus.RUNNING:
+                await GenerationJob.filter(id=job.id).update(status=GenerationJobStatus.PENDING)
+            self.pool.submit(job.id, job.id)
+        if interrupted:
+            logger.info(f"恢复了 {len(interrupted)} 个未完成的后台生成任务")
+
+    async def submit(self, request: AIGCGenerationRequest, user_id: int) -> GenerationJob:
+        job = await GenerationJob.create(user_id=user_id, request=request.dict())
+        self.pool.submit(job.id, job.id)
+        return job
+
+    async def cancel(self, job: GenerationJob) -> GenerationJob:
+        if job.status in FINAL_STATUSES:
+            return job
+        # 执行中的任务由 _run 捕获取消并写入已生成的部分内容
+        self.pool.cancel(job.id)
+        progress = self._progress.get(job.id)
+        await GenerationJob.filter(id=job.id).update(
+            status=GenerationJobStatus.CANCELLED,
+            content=progress.content if progress else job.content,
+            finished_at=datetime.now(),
+        )
+        await job.refresh_from_db()
+        return job
+
+    async def _run(self, job_id: int) -> None:
+        # 条件更新认领任务：重复入队或已被取消的任务不会再执行一次
+        claimed = await GenerationJob.filter(id=job_id, status=GenerationJobStatus.PENDING).update(
+            status=GenerationJobStatus.RUNNING, attempts=F("attempts") + 1, started_at=datetime.now()
+        )
+        if not claimed:
+            return
+        job = await GenerationJob.get(id=job_id)
+        progress = self._progress[job_id] = JobProgress()
+        try:
+            request = AIGCGenerationRequest(**job.request)
+            history, _, _ = await aigc_service.run_generation(request, job.user_id, on_content=progress.append)
+        except asyncio.CancelledError:
+            if not self._stopping:
+                await GenerationJob.filter(id=job_id).update(
+                    status=GenerationJobStatus.CANCELLED, content=progress.content, finished_at=datetime.now()
+                )
+            raise
+        except Exception as e:
+            await GenerationJob.filter(id=job_id).update(
+                status=GenerationJobStatus.FAILED,
+                content=progress.content or None,
+                error=str(e) or e.__class__.__name__,
+                finished_at=datetime.now(),
+            )
+            raise
+        else:
+            await GenerationJob.filter(id=job_id).update(
+                status=GenerationJobStatus.SUCCEEDED,
+                content=history.generated_content,
+                generation_id=history.id,
+                finished_at=datetime.now(),
+            )
+        finally:
+            progress.close()
+            self._progress.pop(job_id, None)
+
+    def snapshot(self, job: GenerationJob) -> Dict[str, Any]:
+        """任务状态；执行中时 content 为当前已生成的部分"""
+        progress = self._progress.get(job.id)
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "content": progress.content if progress else job.content,
+            "error": job.error,
+            "generation_id": job.generation_id,
+            "attempts": job.attempts,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+
+    async def events(self, job_id: int) -> AsyncIterator[Dict[str, Any]]:
+        """
+        任务事件流：status → content* → complete / error / cancelled。
+        任务在本进程执行时推送实时片段；否则轮询数据库直到任务结束，最终事件中带完整内容。
+        """
+        last_status: Optional[str] = None
+        streamed = False
+        while True:
+            job = await GenerationJob.get(id=job_id)
+            if job.status != last_status:
+                last_status = job.status
+                yield {"type": "status", "status": job.status}
+            progress = self._progress.get(job_id)
+            if progress is not None:
+                async for chunk in progress.follow():
+                    streamed = True
+                    yield {"type": "content", "content": chunk}
+                await job.refresh_from_db()
+            if job.status in FINAL_STATUSES:
+                break
+            if progress is None:
+                await asyncio.sleep(POLL_INTERVAL)
+
+        final: Dict[str, Any] = {"job_id": job.id}
+        if not streamed:
+            final["content"] = job.content
+        if job.status == GenerationJobStatus.SUCCEEDED:
+            final.update(type="complete", generation_id=job.generation_id)
+        elif job.status == GenerationJobStatus.CANCELLED:
+            final.update(type="cancelled", content=job.content)
+        else:
+            final.update(type="error", error=job.error)
+        yield final
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.pool.stats(), "streaming": len(self._progress)}
+
+
+generation_job_service = GenerationJobService()
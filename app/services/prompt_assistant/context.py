@@ -0,0 +1,167 @@
+"""
+提示词助手上下文窗口
+按 Token 预算组装对话上下文：系统提示词 + 滚动摘要 + 最近的对话原文 + 当前消息。
+最近 PROMPT_ASSISTANT_KEEP_TURNS 轮之前的轮次由后台任务折叠进摘要并持久化，之后每轮直接复用；
+摘要只在新增待折叠轮次达到 PROMPT_ASSISTANT_SUMMARY_MIN_TURNS 时增量更新，不会每轮重新生成。
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.aigc.aigc_client import aigc_client
+from app.core.aigc.providers import PROFILE_FAST
+from app.core.aigc.scheduler import Priority
+from app.core.aigc.tokens import MESSAGE_OVERHEAD_TOKENS, estimate_tokens, resolve_usage
+from app.log import logger
+from app.models.ideological import PromptAssistantSummary
+from app.services.usage_service import UsageService
+from app.settings.config import settings
+
+from .prompts import SUMMARY_PROMPT
+from .session_store import SessionTurn, session_store
+
+SUMMARY_HEADER = "以下是本次会话较早对话的摘要，请结合它理解后续对话："
+
+
+def context_budget(model: str) -> int:
+    """模型的上下文 Token 预算，AIGC_CONTEXT_BUDGETS 未配置的模型使用 AIGC_CONTEXT_BUDGET"""
+    return int(settings.AIGC_CONTEXT_BUDGETS.get(model) or settings.AIGC_CONTEXT_BUDGET)
+
+
+def message_tokens(content: Optional[str]) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(content)
+
+
+def turn_tokens(conv: SessionTurn) -> int:
+    return message_tokens(conv.user_message) + message_tokens(conv.assistant_message)
+
+
+@dataclass
+class ContextWindow:
+    messages: List[Dict[str, Any]]
+    full_tokens: int  # 原样回放全部历史时的估算输入 Token
+    context_tokens: int  # 实际发送的估算输入 Token
+    verbatim_turns: int
+    summarized_turns: int
+    dropped_turns: int  # 超出预算、尚未折叠进摘要而被省略的轮次
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.full_tokens - self.context_tokens)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "full_tokens": self.full_tokens,
+            "context_tokens": self.context_tokens,
+            "tokens_saved": self.tokens_saved,
+            "verbatim_turns": self.verbatim_turns,
+            "summarized_turns": self.summarized_turns,
+            "dropped_turns": self.dropped_turns,
+        }
+
+
+class ContextManager:
+    """上下文窗口管理：组装预算内的消息，并在后台维护每个会话的滚动摘要"""
+
+    def __init__(self, system_prompt: str, profile: str = PROFILE_FAST, usage_endpoint: str = "prompt_assistant.summary"):
+        self.system_prompt = system_prompt
+        self.system_tokens = message_tokens(system_prompt)
+        self.profile = profile
+        self.usage_endpoint = usage_endpoint
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    def build(
+        self,
+        session_id: str,
+        history: Sequence[SessionTurn],
+        message: str,
+        model: str,
+        summary: Optional[PromptAssistantSummary] = None,
+    ) -> ContextWindow:
+        current_tokens = message_tokens(message)
+        costs = [turn_tokens(conv) for conv in history]
+        full_tokens = self.system_tokens + sum(costs) + current_tokens
+
+        start = 0
+        messages: List[Dict[str, Any]] = [{"role": "system", "content": self.system_prompt}]
+        used = self.system_tokens + current_tokens
+        if summary is not None:
+            start = next((i for i, conv in enumerate(history) if conv.id > summary.covered_until), len(history))
+            summary_message = f"{SUMMARY_HEADER}\n{summary.summary}"
+            messages.append({"role": "system", "content": summary_message})
+            used += message_tokens(summary_message)
+
+        # 从最新的轮次往前取，直到预算用完；保持连续，不跳过中间的轮次
+        budget = context_budget(model)
+        first = len(history)
+        while first > start and used + costs[first - 1] <= budget:
+            first -= 1
+            used += costs[first]
+        for conv in history[first:]:
+            messages.append({"role": "user", "content": conv.user_message})
+            messages.append({"role": "assistant", "content": conv.assistant_message})
+        messages.append({"role": "user", "content": message})
+
+        window = ContextWindow(
+            messages=messages,
+            full_tokens=full_tokens,
+            context_tokens=used,
+            verbatim_turns=len(history) - first,
+            summarized_turns=summary.covered_turns if summary else 0,
+            dropped_turns=first - start,
+        )
+        if window.dropped_turns:
+            logger.warning(f"提示词助手会话 {session_id} 超出上下文预算 {budget}，省略 {window.dropped_turns} 轮尚未摘要的对话")
+        return window
+
+    def schedule_refresh(self, session_id: str, user_id: int) -> None:
+        """本轮对话保存后调用；同一会话同时只有一个摘要任务"""
+        task = self._refreshing.get(session_id)
+        if task is not None and not task.done():
+            return
+        task = asyncio.create_task(self._refresh(session_id, user_id))
+        self._refreshing[session_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(session_id, None))
+
+    async def _refresh(self, session_id: str, user_id: int) -> None:
+        try:
+            session_store.set_summary(session_id, user_id, await self.refresh(session_id, user_id))
+        except Exception as e:
+            # 摘要失败不影响对话，下一轮仍按预算回放原文，稍后再试
+            logger.warning(f"提示词助手会话 {session_id} 摘要生成失败: {e}")
+
+    async def refresh(self, session_id: str, user_id: int) -> Optional[PromptAssistantSummary]:
+        """把最近 N 轮之前、尚未折叠的轮次合并进滚动摘要"""
+        keep = max(0, settings.PROMPT_ASSISTANT_KEEP_TURNS)
+        state = await session_store.get(session_id, user_id)
+        summary = state.summary
+        covered_until = summary.covered_until if summary else 0
+        history = [turn for turn in state.turns if turn.id > covered_until]
+        fold = history[: len(history) - keep] if keep else history
+        if len(fold) < max(1, settings.PROMPT_ASSISTANT_SUMMARY_MIN_TURNS):
+            return summary
+
+        dialogue = "\n\n".join(f"用户：{conv.user_message}\n助手：{conv.assistant_message}" for conv in fold)
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"【已有摘要】\n{summary.summary if summary else '（无）'}\n\n【新增对话】\n{dialogue}"},
+        ]
+        meta: Dict[str, Any] = {}
+        response = await aigc_client.chat(messages, profile=self.profile, priority=Priority.BATCH, meta=meta)
+        text = (response["choices"][0]["message"].get("content") or "").strip()
+        if not text:
+            return summary
+        await UsageService.record(self.usage_endpoint, resolve_usage(meta, messages, text), meta, user_id=user_id)
+
+        values = {
+            "summary": text,
+            "covered_until": fold[-1].id,
+            "covered_turns": (summary.covered_turns if summary else 0) + len(fold),
+            "summary_tokens": estimate_tokens(text),
+        }
+        if summary is None:
+            summary = await PromptAssistantSummary.create(session_id=session_id, user_id=user_id, **values)
+        else:
+            await summary.update_from_dict(values).save()
+        logger.info(f"提示词助手会话 {session_id} 摘要已更新，累计折叠 {values['covered_turns']} 轮")
+        return summary
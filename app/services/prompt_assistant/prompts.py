@@ -133,3 +133,11 @@ SOFTWARE_ENGINEERING_IDEOLOGICAL_PROMPT = """你是一个专业的软件工程
 ```
 
 现在，请根据教师提供的知识点生成案例。"""
+
+
+SUMMARY_PROMPT = """你负责压缩提示词助手与教师的对话记录，供后续轮次作为上下文使用。
+请把【已有摘要】与【新增对话】合并为一份新的摘要，要求：
+1. 保留已确认的课程要素：章节、知识点、思政主题、教学场景、受众、产出物、格式要求、变量
+2. 保留用户明确提出的约束、偏好与否定意见，以及已给出的草稿提示词要点
+3. 删除寒暄与重复内容，不编造对话中没有的信息
+4. 使用简洁的中文条目输出，不超过 400 字，只输出摘要本身"""
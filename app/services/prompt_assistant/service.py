@@ -1,13 +1,21 @@
 """提示词助手服务"""
+import asyncio
+import time
 import uuid
 import re
 from typing import List, Dict, Any
-from app.models.ideological import PromptAssistantConversation as PromptAssistantConversationModel
-from app.models.enums import PromptAssistantSession
+from app.models.enums import GenerationStatus, PromptAssistantSession
 from app.schemas.ideological import PromptAssistantRequest, PromptAssistantResponse
-from app.core.aigc.deepseek_client import DeepseekClient
+from app.core.aigc.aigc_client import aigc_client
+from app.core.aigc.providers import PROFILE_FAST
+from app.core.aigc.scheduler import Priority
+from app.core.aigc.tokens import Usage, resolve_usage
+from app.log import logger
+from app.services.usage_service import UsageService
+from .context import ContextManager, ContextWindow
 from .prompts import SYSTEM_PROMPT
-from .utils import extract_requirements, extract_prompt_from_response
+from .session_store import SessionState, session_store
+from .utils import extract_requirements, extract_prompt_from_response, merge_requirements
 
 
 class PromptAssistantService:
@@ -15,7 +23,11 @@ class PromptAssistantService:
     
     def __init__(self):
         self.system_prompt = SYSTEM_PROMPT
-        self.deepseek_client = DeepseekClient()
+        self.client = aigc_client
+        self.profile = PROFILE_FAST
+        self.priority = Priority.ASSISTANT
+        self.usage_endpoint = "prompt_assistant"
+        self.context = ContextManager(self.system_prompt, profile=self.profile)
     
     async def process_message(
         self,
@@ -28,42 +40,38 @@ class PromptAssistantService:
         # 如果没有会话ID，创建新会话
         if not session_id:
             session_id = str(uuid.uuid4())
+            state = session_store.create(session_id, user_id)
+        else:
+            state = await session_store.get(session_id, user_id)
 
-        # 获取会话历史
-        conversation_history = await self._get_conversation_history(session_id, user_id)
-
-        # 构建对话消息
-        messages = [{"role": "system", "content": self.system_prompt}]
-        
-        # 添加历史对话
-        for conv in conversation_history:
-            messages.append({"role": "user", "content": conv.user_message})
-            messages.append({"role": "assistant", "content": conv.assistant_message})
-        
-        # 添加当前用户消息
-        messages.append({"role": "user", "content": request.message})
+        # 按 Token 预算构建对话消息：摘要 + 最近的对话原文 + 当前消息
+        window = self._build_context(state, request.message)
+        messages = window.messages
         
         # 调用AI模型生成回复
-        response = await self.deepseek_client.chat(messages)
+        start_time = time.time()
+        meta = {}
+        response = await self.client.chat(messages, profile=self.profile, priority=self.priority, meta=meta)
         assistant_message = response['choices'][0]['message']['content']
+        generation_time = int((time.time() - start_time) * 1000)
+        usage = resolve_usage(meta, messages, assistant_message)
         
-        # 提取需求信息
-        extracted_requirements = extract_requirements(
-            request.message,
-            conversation_history,
-            assistant_message
+        # 提取需求信息：只扫描本轮内容，再合并进会话已累计的需求
+        extracted_requirements = merge_requirements(
+            state.requirements,
+            extract_requirements(request.message, None, assistant_message)
         )
         
         # 智能提取提示词
         suggested_prompt, final_prompt, next_stage = extract_prompt_from_response(
             assistant_message, 
             request.message,
-            conversation_history
+            state.turns
         )
         
         # 保存对话
         await self._save_conversation(
-            session_id=session_id,
+            state,
             user_message=request.message,
             assistant_message=assistant_message,
             session_stage=next_stage,
@@ -71,8 +79,11 @@ class PromptAssistantService:
             suggested_prompt=suggested_prompt,
             final_prompt=final_prompt,
             is_final_prompt_generated=bool(final_prompt),
-            user_id=user_id
+            usage=usage,
+            generation_time=generation_time
         )
+        await UsageService.record(self.usage_endpoint, usage, meta, user_id=user_id)
+        self.context.schedule_refresh(session_id, user_id)
 
         return PromptAssistantResponse(
             session_id=session_id,
@@ -81,7 +92,10 @@ class PromptAssistantService:
             extracted_requirements=extracted_requirements,
             suggested_prompt=suggested_prompt,
             final_prompt=final_prompt,
-            is_final_prompt_ready=bool(final_prompt)
+            is_final_prompt_ready=bool(final_prompt),
+            token_count=usage.total_tokens,
+            generation_time=generation_time,
+            context=window.to_dict()
         )
     
     async def process_message_stream(
@@ -95,6 +109,9 @@ class PromptAssistantService:
         # 如果没有会话ID，创建新会话
         if not session_id:
             session_id = str(uuid.uuid4())
+            state = session_store.create(session_id, user_id)
+        else:
+            state = await session_store.get(session_id, user_id)
         
         # 先发送会话ID
         yield {
@@ -102,24 +119,18 @@ class PromptAssistantService:
             "session_id": session_id
         }
 
-        # 获取会话历史
-        conversation_history = await self._get_conversation_history(session_id, user_id)
-
-        # 构建对话消息
-        messages = [{"role": "system", "content": self.system_prompt}]
-        
-        # 添加历史对话
-        for conv in conversation_history:
-            messages.append({"role": "user", "content": conv.user_message})
-            messages.append({"role": "assistant", "content": conv.assistant_message})
-        
-        # 添加当前用户消息
-        messages.append({"role": "user", "content": request.message})
+        # 按 Token 预算构建对话消息：摘要 + 最近的对话原文 + 当前消息
+        window = self._build_context(state, request.message)
+        messages = window.messages
         
         # 流式生成回复
         full_response = ""
+        start_time = time.time()
+        meta = {}
         try:
-            async for content in self.deepseek_client.chat_stream(messages):
+            async for content in self.client.chat_stream(
+                messages, profile=self.profile, priority=self.priority, meta=meta
+            ):
                 # content 现在是纯文本内容，不再是JSON
                 if content:
                     full_response += content
@@ -127,29 +138,40 @@ class PromptAssistantService:
                         "type": "content",
                         "content": content
                     }
+        except asyncio.CancelledError:
+            # 客户端断开：上游流已随取消关闭，保存已生成的部分
+            await self._save_interrupted(
+                state, request.message, full_response, messages, meta, start_time, GenerationStatus.CANCELLED
+            )
+            raise
         except Exception as e:
             print(f"流式生成错误: {e}")
             import traceback
             traceback.print_exc()
+            if full_response:
+                await self._save_interrupted(
+                    state, request.message, full_response, messages, meta, start_time, GenerationStatus.FAILED
+                )
             raise
+        generation_time = int((time.time() - start_time) * 1000)
+        usage = resolve_usage(meta, messages, full_response)
         
-        # 提取需求信息
-        extracted_requirements = extract_requirements(
-            request.message,
-            conversation_history,
-            full_response
+        # 提取需求信息：只扫描本轮内容，再合并进会话已累计的需求
+        extracted_requirements = merge_requirements(
+            state.requirements,
+            extract_requirements(request.message, None, full_response)
         )
         
         # 智能提取提示词
         suggested_prompt, final_prompt, next_stage = extract_prompt_from_response(
             full_response, 
             request.message,
-            conversation_history
+            state.turns
         )
         
         # 保存对话
         await self._save_conversation(
-            session_id=session_id,
+            state,
             user_message=request.message,
             assistant_message=full_response,
             session_stage=next_stage,
@@ -157,43 +179,77 @@ class PromptAssistantService:
             suggested_prompt=suggested_prompt,
             final_prompt=final_prompt,
             is_final_prompt_generated=bool(final_prompt),
-            user_id=user_id
+            usage=usage,
+            generation_time=generation_time
         )
+        await UsageService.record(self.usage_endpoint, usage, meta, user_id=user_id)
+        self.context.schedule_refresh(session_id, user_id)
         
         # 发送完成信息
         yield {
             "type": "done",
             "session_stage": next_stage.value if next_stage else None,
             "suggested_prompt": suggested_prompt,
-            "final_prompt": final_prompt
+            "final_prompt": final_prompt,
+            "usage": usage.to_dict(),
+            "context": window.to_dict()
         }
     
-    async def _get_conversation_history(
-        self, 
-        session_id: str, 
-        user_id: int
-    ) -> List[PromptAssistantConversationModel]:
-        """获取对话历史"""
-        return await PromptAssistantConversationModel.filter(
-            session_id=session_id,
-            user_id=user_id
-        ).order_by('created_at')
-    
+    def _build_context(self, state: SessionState, message: str) -> ContextWindow:
+        """构建本轮上下文，并记录相对完整回放节省的 Token"""
+        model_profile, _ = self.client.resolve(self.profile)
+        window = self.context.build(state.session_id, state.turns, message, model_profile.model, state.summary)
+        if window.tokens_saved:
+            logger.info(
+                f"提示词助手会话 {state.session_id} 上下文 {window.context_tokens} tokens，"
+                f"节省 {window.tokens_saved} tokens（摘要 {window.summarized_turns} 轮）"
+            )
+        return window
+
+    async def _save_interrupted(
+        self,
+        state: SessionState,
+        user_message: str,
+        partial_response: str,
+        messages: List[Dict[str, Any]],
+        meta: Dict[str, Any],
+        start_time: float,
+        status: GenerationStatus
+    ):
+        """流式回复被取消或中途失败时，保存已生成的部分及其用量"""
+        usage = resolve_usage(meta, messages, partial_response)
+        await self._save_conversation(
+            state,
+            user_message=user_message,
+            assistant_message=partial_response,
+            session_stage=state.stage or PromptAssistantSession.REQUIREMENT_GATHERING,
+            extracted_requirements=state.requirements,
+            usage=usage,
+            generation_time=int((time.time() - start_time) * 1000),
+            status=status
+        )
+        await UsageService.record(
+            self.usage_endpoint, usage, meta, user_id=state.user_id, cancelled=status == GenerationStatus.CANCELLED
+        )
+
     async def _save_conversation(
         self,
-        session_id: str,
+        state: SessionState,
         user_message: str,
         assistant_message: str,
         session_stage: PromptAssistantSession,
-        user_id: int,
         extracted_requirements: Dict[str, Any] = None,
         suggested_prompt: str = None,
         final_prompt: str = None,
-        is_final_prompt_generated: bool = False
+        is_final_prompt_generated: bool = False,
+        usage: Usage = None,
+        generation_time: int = None,
+        status: GenerationStatus = GenerationStatus.COMPLETED
     ):
-        """保存对话记录"""
-        await PromptAssistantConversationModel.create(
-            session_id=session_id,
+        """保存对话记录（写穿会话缓存）"""
+        usage = usage or Usage()
+        await session_store.append(
+            state,
             user_message=user_message,
             assistant_message=assistant_message,
             session_stage=session_stage,
@@ -201,5 +257,10 @@ class PromptAssistantService:
             suggested_prompt=suggested_prompt,
             final_prompt=final_prompt,
             is_final_prompt_generated=is_final_prompt_generated,
-            user_id=user_id
+            token_count=usage.total_tokens,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_tokens=usage.cached_tokens,
+            generation_time=generation_time,
+            status=status
         )
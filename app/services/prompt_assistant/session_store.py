@@ -0,0 +1,114 @@
+"""
+提示词助手会话状态缓存
+每个会话的对话轮次、累计提取的需求、当前阶段与滚动摘要保存在进程内 LRU 中（空闲超过 TTL 失效），
+写入时先落库再更新缓存（write-through）。常规的一轮对话只有一次 INSERT，不需要 SELECT；
+缓存未命中（首次访问、已淘汰、或请求落到另一个 worker）时从数据库重新加载。
+多 worker 部署且会话未做粘性路由时，某个 worker 的缓存可能缺少其他 worker 写入的轮次，
+空闲 TTL 限定了这种不一致的持续时间。
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.enums import PromptAssistantSession
+from app.models.ideological import PromptAssistantConversation, PromptAssistantSummary
+from app.settings.config import settings
+
+
+@dataclass
+class SessionTurn:
+    """一轮对话，只保留组装上下文需要的字段"""
+    id: int
+    user_message: str
+    assistant_message: str
+
+
+@dataclass
+class SessionState:
+    session_id: str
+    user_id: int
+    turns: List[SessionTurn] = field(default_factory=list)
+    requirements: Dict[str, Any] = field(default_factory=dict)
+    stage: Optional[PromptAssistantSession] = None
+    summary: Optional[PromptAssistantSummary] = None
+    touched_at: float = field(default_factory=time.monotonic)
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int, idle_ttl: float):
+        self.max_sessions = max(1, max_sessions)
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[Tuple[str, int], SessionState]" = OrderedDict()
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _put(self, state: SessionState) -> SessionState:
+        key = (state.session_id, state.user_id)
+        self._sessions[key] = state
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.counters["evictions"] += 1
+        return state
+
+    def peek(self, session_id: str, user_id: int) -> Optional[SessionState]:
+        state = self._sessions.get((session_id, user_id))
+        if state is None:
+            return None
+        if time.monotonic() - state.touched_at > self.idle_ttl:
+            del self._sessions[(session_id, user_id)]
+            return None
+        return state
+
+    def create(self, session_id: str, user_id: int) -> SessionState:
+        """新建会话：数据库中还没有记录，无需加载"""
+        return self._put(SessionState(session_id=session_id, user_id=user_id))
+
+    async def get(self, session_id: str, user_id: int) -> SessionState:
+        state = self.peek(session_id, user_id)
+        if state is not None:
+            self.counters["hits"] += 1
+        else:
+            self.counters["misses"] += 1
+            state = await self._load(session_id, user_id)
+        state.touched_at = time.monotonic()
+        return self._put(state)
+
+    @staticmethod
+    async def _load(session_id: str, user_id: int) -> SessionState:
+        rows = await PromptAssistantConversation.filter(session_id=session_id, user_id=user_id).order_by("id").values(
+            "id", "user_message", "assistant_message", "session_stage", "extracted_requirements"
+        )
+        state = SessionState(session_id=session_id, user_id=user_id)
+        if not rows:
+            return state
+        state.turns = [SessionTurn(row["id"], row["user_message"], row["assistant_message"]) for row in rows]
+        # 每轮保存的 extracted_requirements 已是截至该轮的累计结果
+        state.requirements = rows[-1]["extracted_requirements"] or {}
+        state.stage = rows[-1]["session_stage"]
+        state.summary = await PromptAssistantSummary.get_or_none(session_id=session_id)
+        return state
+
+    async def append(self, state: SessionState, **values) -> PromptAssistantConversation:
+        """写入一轮对话（先落库，成功后再更新缓存）"""
+        conv = await PromptAssistantConversation.create(session_id=state.session_id, user_id=state.user_id, **values)
+        state.turns.append(SessionTurn(conv.id, conv.user_message, conv.assistant_message))
+        state.requirements = conv.extracted_requirements or {}
+        state.stage = conv.session_stage
+        state.touched_at = time.monotonic()
+        self._put(state)
+        return conv
+
+    def set_summary(self, session_id: str, user_id: int, summary: Optional[PromptAssistantSummary]) -> None:
+        state = self.peek(session_id, user_id)
+        if state is not None:
+            state.summary = summary
+
+    def invalidate(self, session_id: str, user_id: int) -> None:
+        self._sessions.pop((session_id, user_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, **self.counters}
+
+
+session_store = SessionStore(settings.PROMPT_ASSISTANT_SESSION_CACHE_SIZE, settings.PROMPT_ASSISTANT_SESSION_TTL)
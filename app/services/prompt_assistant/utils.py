@@ -92,6 +92,35 @@ def extract_requirements(
     return requirements
 
 
+# 关键词类字段：整段对话中出现任一关键词即命中，多个取值同时出现时按此优先级
+KEYWORD_PRIORITY = {
+    'task_type': ['writing', 'analysis', 'coding', 'creative', 'explanation', 'teaching'],
+    'style': ['正式', '随意'],
+    'length': ['简短', '详细'],
+}
+
+
+def merge_requirements(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把本轮提取的需求合并进会话已累计的需求，与对全部历史重新执行 extract_requirements 的结果等价（列表去重）：
+    关键词类字段按优先级取值，正则类字段以最新一轮为准，列表字段按新到旧去重合并
+    """
+    if not previous:
+        return current
+    merged = dict(previous)
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, list):
+            items = value + [item for item in (old or []) if item not in value]
+            merged[key] = list(dict.fromkeys(items))
+        elif key in KEYWORD_PRIORITY and value is not None and old is not None:
+            order = KEYWORD_PRIORITY[key]
+            merged[key] = min(value, old, key=lambda v: order.index(v) if v in order else len(order))
+        elif value is not None:
+            merged[key] = value
+    return merged
+
+
 def extract_prompt_from_response(
     assistant_message: str,
     user_message: str,
@@ -0,0 +1,225 @@
+"""
+教学资源文件存储
+表单上传不经过 UploadFile：直接解析 request.stream() 中的 multipart 请求体，文件部分边接收边写入临时文件并计算 SHA-256，
+只落盘一次；Content-Length 超过 RESOURCE_UPLOAD_MAX_BYTES 时不读取请求体直接返回 413，
+未声明长度（chunked）时累计超过上限即中止。
+写完后按内容寻址：blobs/<hash 前两位>/<hash><扩展名>。同一内容已存在时丢弃临时文件、引用计数加一，
+否则原子 rename 到最终位置。资源删除时引用计数减一，归零后删除文件。
+引用计数的增减与文件移动/删除在进程内串行执行；多 worker 同时上传与删除同一内容仍有极小的竞争窗口。
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException, Request
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+
+from app.log import logger
+from app.models.ideological import StoredBlob, TeachingResource, UploadSession
+from app.settings.config import settings
+
+UPLOAD_DIR = Path("uploads/teaching_resources")
+BLOB_DIR = UPLOAD_DIR / "blobs"
+STAGING_DIR = UPLOAD_DIR / "staging"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+FORM_OVERHEAD_BYTES = 1024 * 1024  # multipart 边界与普通表单字段允许占用的额外字节
+FORM_FIELD_MAX_BYTES = 64 * 1024  # 单个普通表单字段的上限
+
+
+@dataclass
+class StoredFile:
+    file_path: str
+    file_url: str  # 静态访问地址（/uploads 挂载）
+    content_hash: str
+    size: int
+    deduplicated: bool  # 是否复用了已存在的相同文件
+
+
+def _too_large() -> HTTPException:
+    limit_mb = settings.RESOURCE_UPLOAD_MAX_BYTES / 1024 / 1024
+    return HTTPException(status_code=413, detail=f"文件过大，超过上传上限 {limit_mb:.0f}MB")
+
+
+class BlobStore:
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.counters: Dict[str, int] = {"stored": 0, "deduplicated": 0, "released": 0, "rejected": 0}
+
+    @staticmethod
+    def staging_path() -> Path:
+        STAGING_DIR.mkdir(parents=True, exist_ok=True)
+        return STAGING_DIR / f"{uuid.uuid4().hex}.part"
+
+    async def save_form(
+        self, request: Request, file_field: str = "file"
+    ) -> Tuple[Dict[str, str], Optional[StoredFile], Optional[str]]:
+        """
+        流式解析 multipart/form-data 请求，返回 (普通字段, 文件存储结果, 原始文件名)；没有上传文件时后两项为 None。
+        超过大小上限时删除已写入的部分并返回 413。
+        """
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > settings.RESOURCE_UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES:
+            self.counters["rejected"] += 1
+            raise _too_large()
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status_code=415, detail="请使用 multipart/form-data 上传")
+
+        # 解析器回调是同步的，先记录事件，每读入一块请求体后再异步处理
+        events = []
+        parser = MultipartParser(
+            params[b"boundary"],
+            {
+                "on_part_begin": lambda: events.append(("begin", b"")),
+                "on_header_field": lambda data, start, end: events.append(("header_field", data[start:end])),
+                "on_header_value": lambda data, start, end: events.append(("header_value", data[start:end])),
+                "on_header_end": lambda: events.append(("header_end", b"")),
+                "on_headers_finished": lambda: events.append(("headers_finished", b"")),
+                "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+                "on_part_end": lambda: events.append(("end", b"")),
+            },
+        )
+
+        fields: Dict[str, str] = {}
+        staging: Optional[Path] = None
+        file = None
+        file_complete = False
+        filename: Optional[str] = None
+        digest = hashlib.sha256()
+        size = 0
+        header_field = header_value = b""
+        disposition = b""
+        part_name: Optional[str] = None
+        part_kind: Optional[str] = None  # "file" / "field" / None（忽略）
+        buffer = bytearray()
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                for event, data in events:
+                    if event == "begin":
+                        disposition, part_name, part_kind = b"", None, None
+                        buffer.clear()
+                    elif event == "header_field":
+                        header_field += data
+                    elif event == "header_value":
+                        header_value += data
+                    elif event == "header_end":
+                        if header_field.lower() == b"content-disposition":
+                            disposition = header_value
+                        header_field = header_value = b""
+                    elif event == "headers_finished":
+                        _, options = parse_options_header(disposition)
+                        part_name = options.get(b"name", b"").decode("utf-8", "replace")
+                        part_filename = options.get(b"filename")
+                        if part_filename is None:
+                            part_kind = "field"
+                        elif part_name == file_field and part_filename and file is None:
+                            # 未选择文件时浏览器也会提交一个 filename 为空的文件部分，忽略即可
+                            part_kind = "file"
+                            filename = part_filename.decode("utf-8", "replace")
+                            staging = self.staging_path()
+                            file = await aiofiles.open(staging, "wb")
+                    elif event == "data":
+                        if part_kind == "file":
+                            size += len(data)
+                            if size > settings.RESOURCE_UPLOAD_MAX_BYTES:
+                                self.counters["rejected"] += 1
+                                raise _too_large()
+                            digest.update(data)
+                            await file.write(data)
+                        elif part_kind == "field":
+                            buffer.extend(data)
+                            if len(buffer) > FORM_FIELD_MAX_BYTES:
+                                raise HTTPException(status_code=413, detail=f"表单字段 {part_name} 过长")
+                    elif event == "end":
+                        if part_kind == "file":
+                            await file.close()
+                            file_complete = True
+                        elif part_kind == "field":
+                            fields[part_name] = buffer.decode("utf-8", "replace")
+                events.clear()
+            parser.finalize()
+            if file is not None and not file_complete:
+                raise HTTPException(status_code=400, detail="上传的请求体不完整")
+        except BaseException as exc:
+            if file is not None and not file_complete:
+                await file.close()
+            if staging is not None:
+                staging.unlink(missing_ok=True)
+            if isinstance(exc, MultipartParseError):
+                raise HTTPException(status_code=400, detail="multipart 请求体格式错误") from exc
+            raise
+
+        if staging is None:
+            return fields, None, None
+        stored = await self.commit(staging, digest.hexdigest(), size, Path(filename).suffix)
+        return fields, stored, filename
+
+    async def commit(self, staging: Path, content_hash: str, size: int, extension: str) -> StoredFile:
+        """把写完的临时文件登记为内容寻址的文件，并增加一次引用"""
+        async with self._lock:
+            blob = await StoredBlob.get_or_none(content_hash=content_hash)
+            if blob is not None and os.path.exists(blob.file_path):
+                staging.unlink(missing_ok=True)
+                await StoredBlob.filter(id=blob.id).update(ref_count=F("ref_count") + 1)
+                self.counters["deduplicated"] += 1
+                return self.stored_file(blob.file_path, content_hash, size, True)
+
+            target = BLOB_DIR / content_hash[:2] / f"{content_hash}{extension.lower()}"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staging, target)
+            if blob is not None:
+                # 记录还在但文件已丢失：用本次上传的内容恢复
+                await StoredBlob.filter(id=blob.id).update(file_path=str(target), ref_count=F("ref_count") + 1)
+                if blob.file_path != str(target):
+                    await self._relocate(blob, str(target))
+            else:
+                try:
+                    await StoredBlob.create(content_hash=content_hash, file_path=str(target), size=size, ref_count=1)
+                except IntegrityError:
+                    # 另一个 worker 同时登记了同一内容，文件内容相同，直接共享
+                    await StoredBlob.filter(content_hash=content_hash).update(ref_count=F("ref_count") + 1)
+            self.counters["stored"] += 1
+            return self.stored_file(str(target), content_hash, size, False)
+
+    async def _relocate(self, blob: StoredBlob, file_path: str) -> None:
+        """恢复的文件扩展名不同、路径变化时，把仍指向旧路径的资源与上传会话改到新路径，释放时才能按路径对上引用"""
+        old_url = self.stored_file(blob.file_path, blob.content_hash, blob.size).file_url
+        new_url = self.stored_file(file_path, blob.content_hash, blob.size).file_url
+        resources = TeachingResource.filter(content_hash=blob.content_hash, file_path=blob.file_path)
+        await resources.filter(preview_url=old_url).update(preview_url=new_url)
+        await resources.update(file_path=file_path)
+        await UploadSession.filter(content_hash=blob.content_hash, file_path=blob.file_path).update(file_path=file_path)
+
+    async def release(self, content_hash: Optional[str], file_path: Optional[str]) -> None:
+        """资源删除后调用；不是内容寻址存储的历史文件直接删除"""
+        async with self._lock:
+            blob = await StoredBlob.get_or_none(content_hash=content_hash) if content_hash else None
+            if blob is None or blob.file_path != file_path:
+                if file_path and os.path.exists(file_path):
+                    os.remove(file_path)
+                return
+            await StoredBlob.filter(id=blob.id).update(ref_count=F("ref_count") - 1)
+            if await StoredBlob.filter(id=blob.id, ref_count__lte=0).delete():
+                Path(blob.file_path).unlink(missing_ok=True)
+                self.counters["released"] += 1
+                logger.info(f"文件 {blob.file_path} 已无资源引用，已删除")
+
+    @staticmethod
+    def stored_file(file_path: str, content_hash: str, size: int, deduplicated: bool = False) -> StoredFile:
+        file_url = "/" + Path(file_path).as_posix()
+        return StoredFile(file_path, file_url, content_hash, size, deduplicated)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counters)
+
+
+blob_store = BlobStore()
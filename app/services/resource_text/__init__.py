@@ -0,0 +1,15 @@
+"""教学资源文本提取服务模块"""
+from .cache import text_cache
+from .engine import ExtractionEngine, extraction_engine
+from .pipeline import ResourceExtractionService, resource_extraction_service
+from .service import ResourceTextService, resource_text_service
+
+__all__ = [
+    'ExtractionEngine',
+    'ResourceExtractionService',
+    'ResourceTextService',
+    'extraction_engine',
+    'resource_extraction_service',
+    'resource_text_service',
+    'text_cache',
+]
@@ -0,0 +1,81 @@
+"""
+资源文本提取结果缓存（按内容寻址）
+键为 (文件内容 SHA-256, 提取器, 提取器版本)，值为规范化后的完整文本；截断在读取时按请求的 max_chars 进行。
+不同教师上传的同一份文件共享一条记录；最后一个引用该内容的资源删除后记录随之清理。
+提取器升级（EXTRACTOR_VERSIONS 递增）后旧版本记录不再命中。
+"""
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+
+from app.log import logger
+from app.models.ideological import ResourceTextCache, TeachingResource
+
+from .extractors import EXTRACTOR_VERSIONS, ExtractedText
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def hash_file(file_path: Path) -> str:
+    return await run_in_threadpool(file_sha256, file_path)
+
+
+class TextCache:
+    def __init__(self):
+        self.counters: Dict[str, int] = {"hits": 0, "misses": 0, "stored": 0, "released": 0}
+
+    async def get(self, content_hash: str, extractor: str) -> Optional[ExtractedText]:
+        entry = await ResourceTextCache.get_or_none(
+            content_hash=content_hash, extractor=extractor, extractor_version=EXTRACTOR_VERSIONS[extractor]
+        )
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        await ResourceTextCache.filter(id=entry.id).update(hit_count=F("hit_count") + 1)
+        return ExtractedText(entry.text, entry.page_count, entry.page_offsets)
+
+    async def put(self, content_hash: str, extractor: str, extracted: ExtractedText) -> None:
+        try:
+            await ResourceTextCache.create(
+                content_hash=content_hash,
+                extractor=extractor,
+                extractor_version=EXTRACTOR_VERSIONS[extractor],
+                text=extracted.text,
+                total_chars=len(extracted.text),
+                page_count=extracted.page_count,
+                page_offsets=extracted.page_offsets,
+            )
+            self.counters["stored"] += 1
+        except IntegrityError:
+            # 另一个 worker 已写入同一内容的结果
+            pass
+        except Exception as e:
+            logger.warning(f"资源文本缓存写入失败: {e}")
+
+    async def release(self, content_hash: Optional[str]) -> None:
+        """资源删除后调用：已没有资源引用该内容时清理其全部提取结果"""
+        if not content_hash:
+            return
+        if await TeachingResource.filter(content_hash=content_hash).exists():
+            return
+        deleted = await ResourceTextCache.filter(content_hash=content_hash).delete()
+        self.counters["released"] += deleted
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counters)
+
+
+text_cache = TextCache()
@@ -0,0 +1,361 @@
+"""
+本地文档解析引擎
+pdfplumber / python-docx / python-pptx / pytesseract 都是 CPU 密集且持有 GIL 的，放在线程池里会拖慢同一进程的所有请求，
+这里改为在独立的进程池中执行：
+- 每个子进程启动时设置地址空间上限（RESOURCE_EXTRACT_MEMORY_MB，仅 Unix），超出时该任务抛 MemoryError；
+- 每个任务用 SIGALRM 限时（RESOURCE_EXTRACT_TIMEOUT）；子进程未能自行中断时只让该任务超时，
+  后续任务改用新的进程池，卡住的子进程等同池其他任务完成后再终止，不影响其他用户的提取；
+- 子进程异常退出（如超出内存）会使同池的其他任务一起失败，这些任务在单独的子进程中重试一次；
+- 按页 / 幻灯片分批提交（RESOURCE_EXTRACT_PAGE_BATCH 页一批），大文档不会长时间独占某个子进程，
+  调用方只需要前 max_chars 个字符时，攒够即停止，不再解析后续页面；
+- 图片 OCR 前按 RESOURCE_OCR_DPI 与像素上限缩放并转灰度。
+子进程中执行的函数只依赖标准库与解析库，不访问数据库与配置。
+"""
+import asyncio
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from app.log import logger
+from app.settings.config import settings
+
+from .extractors import ExtractedText, normalize_text
+
+try:
+    import resource as _rlimit
+except ImportError:  # Windows
+    _rlimit = None
+
+KILL_GRACE = 5.0  # 子进程超时后未自行中断，父进程再等待的秒数
+PAGE_SEPARATORS = {"pdf": "\n", "pptx": "\n\n"}
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+@dataclass
+class PageBatch:
+    pages: List[str]
+    page_count: Optional[int]  # 文档总页数，无分页概念的格式为 None
+    next_page: Optional[int]  # 下一批的起始页（从 0 开始），已到末尾或达到字符预算时为 None
+
+
+def _init_worker(memory_mb: int) -> None:
+    if _rlimit is not None and memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        _rlimit.setrlimit(_rlimit.RLIMIT_AS, (limit, limit))
+    if hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _on_alarm)
+
+
+def _on_alarm(signum, frame):
+    raise ExtractionTimeout("文档解析超时")
+
+
+def _read_text_file(file_path: Path) -> str:
+    for encoding in ['utf-8', 'utf-16', 'gbk', 'latin-1']:
+        try:
+            return file_path.read_text(encoding=encoding)
+        except Exception:
+            continue
+    return file_path.read_text(errors='ignore')
+
+
+def _pdf_batch(file_path: Path, start: int, max_pages: int, char_budget: Optional[int]) -> PageBatch:
+    try:
+        import pdfplumber
+    except Exception as exc:
+        raise ValueError("缺少依赖 pdfplumber，请安装后重试") from exc
+    pages: List[str] = []
+    used = 0
+    with pdfplumber.open(str(file_path)) as pdf:
+        total = len(pdf.pages)
+        index = start
+        while index < min(total, start + max_pages):
+            page = pdf.pages[index]
+            text = page.extract_text() or ''
+            if hasattr(page, "close"):
+                # 释放已解析页面的对象缓存，避免长文档内存持续增长
+                page.close()
+            pages.append(text)
+            used += len(text)
+            index += 1
+            if char_budget is not None and used >= char_budget:
+                break
+    next_page = index if index < total and (char_budget is None or used < char_budget) else None
+    return PageBatch(pages, total, next_page)
+
+
+def _pptx_batch(file_path: Path, start: int, max_pages: int, char_budget: Optional[int]) -> PageBatch:
+    try:
+        from pptx import Presentation
+    except Exception as exc:
+        raise ValueError("缺少依赖 python-pptx，请安装: pip install python-pptx") from exc
+    prs = Presentation(str(file_path))
+    slides = list(prs.slides)
+    pages: List[str] = []
+    used = 0
+    index = start
+    while index < min(len(slides), start + max_pages):
+        # 提取幻灯片中的所有文本
+        slide_texts = [shape.text for shape in slides[index].shapes if hasattr(shape, "text") and shape.text]
+        index += 1
+        text = f"--- 幻灯片 {index} ---\n" + '\n'.join(slide_texts) if slide_texts else ''
+        pages.append(text)
+        used += len(text)
+        if char_budget is not None and used >= char_budget:
+            break
+    next_page = index if index < len(slides) and (char_budget is None or used < char_budget) else None
+    return PageBatch(pages, len(slides), next_page)
+
+
+def _docx_text(file_path: Path, char_budget: Optional[int]) -> str:
+    try:
+        import docx
+    except Exception as exc:
+        raise ValueError("缺少依赖 python-docx，请安装后重试") from exc
+    doc = docx.Document(str(file_path))
+    parts: List[str] = []
+    used = 0
+    for paragraph in doc.paragraphs:
+        if not paragraph.text:
+            continue
+        parts.append(paragraph.text)
+        used += len(paragraph.text) + 1
+        if char_budget is not None and used >= char_budget:
+            break
+    return '\n'.join(parts)
+
+
+def _ocr_image(file_path: Path, dpi: int, max_pixels: int, timeout: float) -> str:
+    try:
+        from PIL import Image
+    except Exception as exc:
+        raise ValueError("缺少依赖 pillow，请安装后重试") from exc
+    try:
+        import pytesseract
+    except Exception as exc:
+        raise ValueError("缺少依赖 pytesseract，请安装后重试") from exc
+    try:
+        image = Image.open(str(file_path))
+        # 按 DPI 与像素上限缩放：高分辨率扫描件对识别率没有帮助，只会拖慢 tesseract
+        scale = 1.0
+        source_dpi = (image.info.get("dpi") or (0, 0))[0]
+        if source_dpi and dpi and source_dpi > dpi:
+            scale = dpi / source_dpi
+        pixels = image.width * image.height * scale * scale
+        if max_pixels and pixels > max_pixels:
+            scale *= (max_pixels / pixels) ** 0.5
+        if scale < 1.0:
+            size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+            image.draft("L", size)  # JPEG 直接按缩小后的尺寸解码
+            image = image.convert("L").resize(size, Image.LANCZOS)
+        else:
+            image = image.convert("L")
+        return pytesseract.image_to_string(image, timeout=timeout)
+    except ExtractionTimeout:
+        raise
+    except Exception as exc:
+        raise ValueError(f'图片识别失败: {exc}') from exc
+
+
+def extract_batch(
+    file_path: str,
+    suffix: str,
+    resource_type: str,
+    start: int,
+    max_pages: int,
+    char_budget: Optional[int],
+    timeout: float,
+    ocr_dpi: int,
+    ocr_max_pixels: int,
+) -> PageBatch:
+    """在子进程中执行：从第 start 页起最多解析 max_pages 页，累计达到 char_budget 个字符即停止"""
+    path = Path(file_path)
+    alarm = hasattr(signal, "SIGALRM") and timeout > 0
+    if alarm:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        if suffix in ['txt', 'rtf']:
+            return PageBatch([_read_text_file(path)], None, None)
+        if suffix == 'pdf':
+            return _pdf_batch(path, start, max_pages, char_budget)
+        if suffix in ['docx', 'doc']:
+            if suffix == 'doc':
+                raise ValueError('暂不支持 .doc 格式，请转换为 .docx')
+            return PageBatch([_docx_text(path, char_budget)], None, None)
+        if suffix in ['pptx', 'ppt']:
+            if suffix == 'ppt':
+                raise ValueError('暂不支持 .ppt 格式，请转换为 .pptx')
+            return _pptx_batch(path, start, max_pages, char_budget)
+        if resource_type == 'image' or suffix in ['png', 'jpg', 'jpeg', 'bmp', 'gif', 'tiff']:
+            return PageBatch([_ocr_image(path, ocr_dpi, ocr_max_pixels, timeout)], 1, None)
+        raise ValueError('该资源类型不支持文本提取')
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def resolve_suffix(file_path: Path, file_format: Optional[str]) -> str:
+    suffix = (file_format or '').lower().lstrip('.')
+    return suffix or file_path.suffix.lower().lstrip('.')
+
+
+class ExtractionEngine:
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 每个进程池上提交且尚未返回的任务数；退役的进程池在任务数归零后才终止子进程
+        self._active: Dict[ProcessPoolExecutor, int] = {}
+        self._retired: Set[ProcessPoolExecutor] = set()
+        self.counters: Dict[str, int] = {
+            "batches": 0, "pages": 0, "early_stops": 0, "timeouts": 0, "restarts": 0, "retries": 0
+        }
+
+    @staticmethod
+    def _new_pool(max_workers: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(settings.RESOURCE_EXTRACT_MEMORY_MB,),
+        )
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = self._new_pool(max(1, settings.RESOURCE_EXTRACT_PROCESSES))
+        return self._executor
+
+    def _retire(self, executor: ProcessPoolExecutor) -> None:
+        """
+        停止向该进程池提交新任务，新任务改用新的进程池。
+        ProcessPoolExecutor 中任一子进程被终止都会使整个池失效，池内其他用户的任务会一起失败，
+        所以卡住的子进程要等同一个池中其他任务都返回后再终止。
+        """
+        if self._executor is executor:
+            self._executor = None
+            self.counters["restarts"] += 1
+        self._retired.add(executor)
+        self._reap(executor)
+
+    def _reap(self, executor: ProcessPoolExecutor) -> None:
+        if executor not in self._retired or self._active.get(executor):
+            return
+        self._retired.discard(executor)
+        self._active.pop(executor, None)
+        # 卡住的子进程不会响应 shutdown，直接终止（_processes 为 ProcessPoolExecutor 内部属性）
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(
+        self,
+        file_path: Path,
+        suffix: str,
+        resource_type: str,
+        start: int,
+        char_budget: Optional[int],
+        isolated: bool = False,
+    ) -> PageBatch:
+        """isolated=True 时在单独的一次性子进程中执行，崩溃不会波及其他任务"""
+        timeout = settings.RESOURCE_EXTRACT_TIMEOUT
+        if isolated:
+            executor = self._new_pool(1)
+            self._retired.add(executor)  # 任务返回后即终止
+        else:
+            executor = self._pool()
+        self._active[executor] = self._active.get(executor, 0) + 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                executor,
+                extract_batch,
+                str(file_path),
+                suffix,
+                resource_type,
+                start,
+                max(1, settings.RESOURCE_EXTRACT_PAGE_BATCH),
+                char_budget,
+                timeout,
+                settings.RESOURCE_OCR_DPI,
+                settings.RESOURCE_OCR_MAX_PIXELS,
+            )
+            try:
+                return await asyncio.wait_for(future, timeout + KILL_GRACE if timeout > 0 else None)
+            except asyncio.TimeoutError:
+                # 子进程没有响应 SIGALRM（卡在 C 扩展中）：只让本任务超时，进程池退役
+                logger.warning(f"文档 {file_path.name} 解析超时且子进程未响应，后续任务改用新的解析进程池")
+                self._retire(executor)
+                raise ExtractionTimeout("文档解析超时")
+            except BrokenProcessPool:
+                self._retire(executor)
+                raise
+        finally:
+            self._active[executor] -= 1
+            self._reap(executor)
+
+    async def _run_batch(
+        self, file_path: Path, suffix: str, resource_type: str, start: int, char_budget: Optional[int]
+    ) -> PageBatch:
+        try:
+            try:
+                batch = await self._submit(file_path, suffix, resource_type, start, char_budget)
+            except BrokenProcessPool:
+                # 同一进程池中其他任务的子进程崩溃也会导致本任务失败，在单独的子进程中重试一次；
+                # 再次崩溃时才认为是本文档导致的
+                self.counters["retries"] += 1
+                batch = await self._submit(file_path, suffix, resource_type, start, char_budget, isolated=True)
+        except ExtractionTimeout:
+            self.counters["timeouts"] += 1
+            raise
+        except BrokenProcessPool as exc:
+            raise MemoryError("文档解析进程异常退出，可能超出内存限制") from exc
+        self.counters["batches"] += 1
+        self.counters["pages"] += len(batch.pages)
+        return batch
+
+    async def iter_pages(
+        self, file_path: Path, file_format: Optional[str], resource_type: str, max_chars: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, str, Optional[int]]]:
+        """逐页产出 (页码(从 1 开始), 规范化后的文本, 总页数)；累计达到 max_chars 后停止解析"""
+        suffix = resolve_suffix(file_path, file_format)
+        start, used = 0, 0
+        while True:
+            budget = None if max_chars is None else max_chars - used
+            batch = await self._run_batch(file_path, suffix, resource_type, start, budget)
+            for offset, raw in enumerate(batch.pages):
+                text = normalize_text(raw)
+                used += len(text)
+                yield start + offset + 1, text, batch.page_count
+            if batch.next_page is None:
+                if batch.page_count and start + len(batch.pages) < batch.page_count:
+                    self.counters["early_stops"] += 1
+                return
+            start = batch.next_page
+
+    async def extract(
+        self, file_path: Path, file_format: Optional[str], resource_type: str, max_chars: Optional[int] = None
+    ) -> ExtractedText:
+        separator = PAGE_SEPARATORS.get(resolve_suffix(file_path, file_format), "\n")
+        text, offsets, page_count = "", [], None
+        async for _, page_text, page_count in self.iter_pages(file_path, file_format, resource_type, max_chars):
+            if page_text and text:
+                text += separator
+            offsets.append(len(text))
+            text += page_text
+        return ExtractedText(text, page_count, offsets if page_count else None)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for executor in list(self._retired):
+            self._active.pop(executor, None)
+            self._reap(executor)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "processes": settings.RESOURCE_EXTRACT_PROCESSES}
+
+
+extraction_engine = ExtractionEngine()
@@ -0,0 +1,142 @@
+"""
+资源文本提取器
+- local：在本地解析 TXT / PDF / DOCX / PPTX，图片走 OCR（在独立进程池中执行，见 engine.py）；
+- kimi：上传到 Kimi /files 接口抽取文本，扫描版 DOCX 回退为并发识别嵌入图片。
+"""
+import asyncio
+import hashlib
+import json
+import re
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.aigc.aigc_client import AIGCClient
+from app.log import logger
+from app.settings.config import settings
+
+EXTRACTOR_LOCAL = "local"
+EXTRACTOR_KIMI = "kimi"
+# 提取或规范化逻辑变化时递增，旧版本的缓存结果自动失效
+EXTRACTOR_VERSIONS = {EXTRACTOR_LOCAL: "2", EXTRACTOR_KIMI: "2"}
+IMAGE_ONLY_PLACEHOLDER = "（该文件主要为图片或扫描件，未抽取到可用文本）"
+
+
+@dataclass
+class ExtractedText:
+    text: str
+    page_count: Optional[int] = None  # PDF 页数 / PPTX 幻灯片数，其他格式或 Kimi 提取时未知
+    page_offsets: Optional[List[int]] = None  # 每页在 text 中的起始位置，有分页时才有
+
+
+def normalize_text(text: str) -> str:
+    if not text:
+        return ''
+    return '\n'.join(line.rstrip() for line in text.splitlines()).strip()
+
+
+def normalize_kimi_content(raw_text: str) -> str:
+    text = raw_text or ''
+    image_pattern = r'!\[[^\]]*]\([^)]+\)(\{[^}]+\})?'
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            content = (
+                data.get("content")
+                or data.get("text")
+                or (data.get("data", {}) or {}).get("content")
+                or (data.get("data", {}) or {}).get("text")
+            )
+            if isinstance(content, str):
+                text = content
+    except Exception:
+        pass
+
+    if re.search(image_pattern, text):
+        text = re.sub(image_pattern, '', text)
+
+    text = normalize_text(text)
+    if not text and raw_text and re.search(image_pattern, raw_text):
+        return IMAGE_ONLY_PLACEHOLDER
+    return text
+
+
+def needs_image_fallback(text: str) -> bool:
+    if not text:
+        return True
+    if text.strip() == IMAGE_ONLY_PLACEHOLDER:
+        return True
+    return False
+
+
+def _docx_images_in_order(file_path: Path, min_bytes: int) -> List[Tuple[str, bytes]]:
+    """按图片在正文中出现的顺序读取 word/media 下的图片，跳过小于 min_bytes 的装饰性小图"""
+    with zipfile.ZipFile(str(file_path)) as zf:
+        media = [n for n in zf.namelist() if n.startswith("word/media/")]
+        order: List[str] = []
+        try:
+            rels = zf.read("word/_rels/document.xml.rels").decode("utf-8", errors="ignore")
+            targets = {
+                rel_id: "word/" + target.lstrip("/").removeprefix("word/")
+                for rel_id, target in re.findall(r'Id="([^"]+)"[^>]*?Target="([^"]+)"', rels)
+            }
+            document = zf.read("word/document.xml").decode("utf-8", errors="ignore")
+            for rel_id in re.findall(r'r:(?:embed|id)="([^"]+)"', document):
+                name = targets.get(rel_id)
+                if name in media and name not in order:
+                    order.append(name)
+        except KeyError:
+            pass
+        order += [n for n in media if n not in order]
+
+        images = []
+        for name in order:
+            if zf.getinfo(name).file_size < min_bytes:
+                continue
+            data = zf.read(name)
+            if data:
+                images.append((name, data))
+        return images
+
+
+async def extract_docx_images_text(file_path: Path, client: AIGCClient) -> str:
+    """
+    扫描版 DOCX 回退：逐张识别嵌入图片的文字后按正文顺序拼接。
+    图片在内存中直接上传；内容相同的图片（如重复的校徽、页眉 logo）只识别一次、只输出一次；
+    并发数受 RESOURCE_OCR_CONCURRENCY 限制，每个请求仍经过 AIGC 调度器排队。
+    """
+    if not file_path.exists():
+        return ''
+    if file_path.suffix.lower() != '.docx':
+        return ''
+
+    try:
+        images = await run_in_threadpool(_docx_images_in_order, file_path, settings.RESOURCE_OCR_MIN_IMAGE_BYTES)
+    except Exception:
+        return ''
+
+    unique: Dict[str, Tuple[str, bytes]] = {}
+    for name, data in images:
+        unique.setdefault(hashlib.sha256(data).hexdigest(), (name, data))
+    if len(unique) < len(images):
+        logger.info(f"{file_path.name} 含 {len(images)} 张图片，去重后识别 {len(unique)} 张")
+
+    semaphore = asyncio.Semaphore(max(1, settings.RESOURCE_OCR_CONCURRENCY))
+
+    async def recognize(name: str, data: bytes) -> str:
+        async with semaphore:
+            try:
+                raw_text = await client.extract_file_text(None, content=data, filename=Path(name).name)
+            except Exception as exc:
+                # 单张图片失败不影响其余图片
+                logger.warning(f"{file_path.name} 图片 {name} 识别失败: {exc}")
+                return ''
+        normalized = normalize_kimi_content(raw_text)
+        return '' if needs_image_fallback(normalized) else normalized
+
+    texts = await asyncio.gather(*(recognize(name, data) for name, data in unique.values()))
+    # dict 保持插入顺序，即每个内容首次出现的位置
+    return normalize_text('\n'.join(text for text in texts if text))
@@ -0,0 +1,111 @@
+"""
+教学资源文本预提取
+上传文件后资源标记为 pending 并提交到进程内工作池，后台完成提取、写入内容寻址缓存，
+并在资源上记录状态、页数与字符数。读取接口只查缓存，提取未完成时返回 202，不再在请求内等待上游。
+服务重启时 pending / running 的资源重新入队；历史资源用 backfill_resource_text.py 补提取。
+多 worker 部署时同一资源可能被多个进程提交，领取时用条件更新保证只执行一次。
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.core.worker_pool import AsyncWorkerPool
+from app.log import logger
+from app.models.enums import TextExtractionStatus
+from app.models.ideological import TeachingResource
+from app.settings.config import settings
+
+from .service import resource_text_service
+
+IN_PROGRESS = (TextExtractionStatus.PENDING, TextExtractionStatus.RUNNING)
+
+
+class ResourceExtractionService:
+    """资源文本预提取服务类"""
+
+    def __init__(self):
+        self.pool = AsyncWorkerPool("resource-extract", settings.RESOURCE_EXTRACT_CONCURRENCY, self._run)
+        self._stopping = False
+
+    async def startup(self, recover: bool = True) -> None:
+        """recover=False 用于离线脚本：不接管其他进程正在提取的资源，只执行显式提交的任务"""
+        self._stopping = False
+        if recover:
+            await self.recover()
+        await self.pool.start()
+
+    async def shutdown(self) -> None:
+        # 停止时执行中的资源保持 running 状态，下次启动由 recover() 重新入队
+        self._stopping = True
+        await self.pool.stop()
+
+    async def recover(self) -> int:
+        ids = await TeachingResource.filter(extraction_status__in=IN_PROGRESS).order_by("id").values_list("id", flat=True)
+        if ids:
+            await TeachingResource.filter(id__in=ids, extraction_status=TextExtractionStatus.RUNNING).update(
+                extraction_status=TextExtractionStatus.PENDING
+            )
+            for resource_id in ids:
+                self.pool.submit(resource_id, resource_id)
+            logger.info(f"恢复了 {len(ids)} 个未完成的资源文本提取任务")
+        return len(ids)
+
+    async def enqueue(self, resource: TeachingResource) -> None:
+        """把资源标记为 pending 并提交；已在排队或提取中的资源只重新提交（进程内按 id 去重）"""
+        if resource.extraction_status not in IN_PROGRESS:
+            resource.extraction_status = TextExtractionStatus.PENDING
+            await TeachingResource.filter(id=resource.id).update(
+                extraction_status=TextExtractionStatus.PENDING, extraction_error=None
+            )
+        self.pool.submit(resource.id, resource.id)
+
+    def cancel(self, resource_id: int) -> None:
+        self.pool.cancel(resource_id)
+
+    async def read(self, resource: TeachingResource, max_chars: int) -> Optional[Dict[str, Any]]:
+        """提取完成时从缓存返回文本；否则确保已入队并返回 None（由接口返回 202）"""
+        if resource.extraction_status == TextExtractionStatus.DONE:
+            result = await resource_text_service.cached(resource, max_chars)
+            if result is not None:
+                return result
+        elif resource.extraction_status == TextExtractionStatus.FAILED:
+            raise HTTPException(status_code=422, detail=f"文本提取失败: {resource.extraction_error}")
+        await self.enqueue(resource)
+        return None
+
+    async def _run(self, resource_id: int) -> None:
+        claimed = await TeachingResource.filter(
+            id=resource_id, extraction_status=TextExtractionStatus.PENDING
+        ).update(extraction_status=TextExtractionStatus.RUNNING)
+        if not claimed:
+            return
+        resource = await TeachingResource.get(id=resource_id)
+        try:
+            extracted, _ = await resource_text_service.extract_file(resource)
+        except asyncio.CancelledError:
+            if not self._stopping:
+                # 被单独取消（如资源删除）时放回 pending，资源仍存在时下次读取会重新入队
+                await TeachingResource.filter(id=resource_id).update(extraction_status=TextExtractionStatus.PENDING)
+            raise
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e) or e.__class__.__name__
+            await TeachingResource.filter(id=resource_id).update(
+                extraction_status=TextExtractionStatus.FAILED, extraction_error=error
+            )
+            logger.warning(f"资源 {resource_id} 文本提取失败: {error}")
+            return
+        await TeachingResource.filter(id=resource_id).update(
+            extraction_status=TextExtractionStatus.DONE,
+            extraction_error=None,
+            page_count=extracted.page_count,
+            extracted_chars=len(extracted.text),
+            extracted_at=datetime.now(),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return self.pool.stats()
+
+
+resource_extraction_service = ResourceExtractionService()
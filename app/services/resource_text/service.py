@@ -0,0 +1,271 @@
+"""
+教学资源文本提取服务
+外部链接走联网读取（结果由 AIGC 响应缓存复用）；文件先按内容哈希查提取结果缓存，
+未命中时按当前 provider 能力选择 Kimi /files 或本地解析，同一内容的并发提取只执行一次。
+"""
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from app.core.aigc.aigc_client import aigc_client
+from app.core.aigc.providers import PROFILE_LONG_CONTEXT, provider_registry
+from app.core.aigc.scheduler import QueueTimeout
+from app.core.aigc.singleflight import SingleFlight
+from app.models.ideological import TeachingResource
+
+from .cache import hash_file, text_cache
+from .engine import ExtractionTimeout, extraction_engine
+from .extractors import (
+    EXTRACTOR_KIMI,
+    EXTRACTOR_LOCAL,
+    ExtractedText,
+    extract_docx_images_text,
+    needs_image_fallback,
+    normalize_kimi_content,
+    normalize_text,
+)
+
+MAX_EXTRACT_FILE_SIZE = 50 * 1024 * 1024
+
+
+def _truncate(
+    resource_id: int, extracted: ExtractedText, max_chars: int, source: str, cached: bool
+) -> Dict[str, Any]:
+    normalized = extracted.text
+    total_chars = len(normalized)
+    truncated = total_chars > max_chars
+    return {
+        "resource_id": resource_id,
+        "text": normalized[:max_chars] if truncated else normalized,
+        "total_chars": total_chars,
+        "truncated": truncated,
+        "page_count": extracted.page_count,
+        "source": source,
+        "cached": cached,
+    }
+
+
+def current_extractor() -> str:
+    return EXTRACTOR_KIMI if provider_registry.supports("files", PROFILE_LONG_CONTEXT) else EXTRACTOR_LOCAL
+
+
+class ResourceTextService:
+    """资源文本提取服务类"""
+
+    def __init__(self):
+        self._flight = SingleFlight()
+
+    async def extract(self, resource: TeachingResource, max_chars: int) -> Dict[str, Any]:
+        # 如果资源有外部链接，使用联网功能提取
+        if resource.external_url:
+            return await self._extract_url(resource, max_chars)
+        extracted, cached = await self.extract_file(resource)
+        return _truncate(resource.id, extracted, max_chars, "file", cached)
+
+    async def cached(self, resource: TeachingResource, max_chars: int) -> Optional[Dict[str, Any]]:
+        """只查缓存，不触发提取；未命中（如切换了提取器或提取器升级）时返回 None"""
+        if not resource.content_hash:
+            return None
+        extracted = await text_cache.get(resource.content_hash, current_extractor())
+        if extracted is None:
+            return None
+        return _truncate(resource.id, extracted, max_chars, "file", True)
+
+    async def preview(self, resource: TeachingResource, max_chars: int) -> Optional[Dict[str, Any]]:
+        """
+        完整提取尚未完成时的快速预览：本地解析只读到前 max_chars 个字符即停止，不写缓存。
+        使用 Kimi 提取时无法提前停止，返回 None。
+        """
+        if current_extractor() != EXTRACTOR_LOCAL or not resource.file_path:
+            return None
+        file_path = Path(resource.file_path)
+        if not file_path.exists():
+            return None
+        extracted = await self._extract_local(resource, file_path, max_chars)
+        result = _truncate(resource.id, extracted, max_chars, "file", False)
+        if len(extracted.text) >= max_chars:
+            # 提前停止时不知道全文长度
+            result.update(total_chars=None, truncated=True)
+        return result
+
+    async def iter_pages(self, resource: TeachingResource, max_chars: int) -> AsyncIterator[Dict[str, Any]]:
+        """
+        逐页产出提取记录 {"type": "page", "page", "text", "chars_so_far", "page_count"}，最后一条为 {"type": "done", ...}。
+        已缓存时按页切分缓存文本；本地解析时边解析边输出；Kimi 与外部链接无法分页，整体作为第 1 页输出。
+        累计达到 max_chars 个字符后停止（最后一页截断）。
+        """
+        cached, truncated = False, False
+        if resource.external_url:
+            result = await self._extract_url(resource, max_chars)
+            pages, truncated = self._single_page(result), result["truncated"]
+        else:
+            pages = None
+            if resource.content_hash:
+                extracted = await text_cache.get(resource.content_hash, current_extractor())
+                if extracted is not None:
+                    cached = True
+                    pages = self._cached_pages(extracted)
+            if pages is None and current_extractor() == EXTRACTOR_LOCAL and resource.file_path:
+                pages = self._local_pages(resource, max_chars)
+            if pages is None:
+                result = await self.extract(resource, max_chars)
+                pages, cached, truncated = self._single_page(result), result["cached"], result["truncated"]
+
+        used, count = 0, 0
+        async for page, text, page_count in pages:
+            if used + len(text) > max_chars:
+                text, truncated = text[: max_chars - used], True
+            used += len(text)
+            count += 1
+            yield {"type": "page", "page": page, "text": text, "chars_so_far": used, "page_count": page_count}
+            if used >= max_chars:
+                truncated = truncated or (page_count is not None and page < page_count)
+                break
+        await pages.aclose()
+        yield {
+            "type": "done",
+            "resource_id": resource.id,
+            "pages": count,
+            "chars_so_far": used,
+            "truncated": truncated,
+            "cached": cached,
+        }
+
+    @staticmethod
+    async def _cached_pages(extracted: ExtractedText) -> AsyncIterator[Tuple[int, str, Optional[int]]]:
+        offsets = extracted.page_offsets or [0]
+        for index, start in enumerate(offsets):
+            end = offsets[index + 1] if index + 1 < len(offsets) else len(extracted.text)
+            yield index + 1, extracted.text[start:end].strip(), extracted.page_count
+
+    async def _local_pages(
+        self, resource: TeachingResource, max_chars: int
+    ) -> AsyncIterator[Tuple[int, str, Optional[int]]]:
+        file_path = Path(resource.file_path)
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail="资源文件不存在")
+        try:
+            async for page in extraction_engine.iter_pages(
+                file_path, resource.file_format, resource.resource_type, max_chars
+            ):
+                yield page
+        except ExtractionTimeout as exc:
+            raise HTTPException(status_code=504, detail=f"{exc}，请尝试较小的文件") from exc
+        except MemoryError as exc:
+            raise HTTPException(status_code=400, detail=f"文件过大或过于复杂，解析超出内存限制: {exc}") from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    @staticmethod
+    async def _single_page(result: Dict[str, Any]) -> AsyncIterator[Tuple[int, str, Optional[int]]]:
+        yield 1, result["text"], None
+
+    async def extract_file(self, resource: TeachingResource) -> Tuple[ExtractedText, bool]:
+        """返回 (完整文本, 是否复用了缓存或他人的在途提取)"""
+        # 如果没有文件路径，返回错误
+        if not resource.file_path:
+            raise HTTPException(status_code=400, detail="该资源没有可读取的文件或外部链接")
+
+        file_path = Path(resource.file_path)
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail="资源文件不存在")
+
+        # 检查文件大小，如果太大给出警告
+        if file_path.stat().st_size > MAX_EXTRACT_FILE_SIZE:
+            raise HTTPException(status_code=400, detail="文件过大（超过50MB），无法提取文本")
+
+        content_hash = await self.ensure_hash(resource, file_path)
+        extractor = current_extractor()
+        extracted = await text_cache.get(content_hash, extractor)
+        if extracted is not None:
+            return extracted, True
+        return await self._flight.do(
+            f"{content_hash}:{extractor}",
+            lambda: self._extract_and_store(resource, file_path, content_hash, extractor),
+        )
+
+    @staticmethod
+    async def ensure_hash(resource: TeachingResource, file_path: Path) -> str:
+        """历史资源上传时没有记录内容哈希，首次提取时补算并回写"""
+        if resource.content_hash:
+            return resource.content_hash
+        resource.content_hash = await hash_file(file_path)
+        await TeachingResource.filter(id=resource.id).update(content_hash=resource.content_hash)
+        return resource.content_hash
+
+    async def _extract_and_store(
+        self, resource: TeachingResource, file_path: Path, content_hash: str, extractor: str
+    ) -> ExtractedText:
+        if extractor == EXTRACTOR_KIMI:
+            extracted = ExtractedText(normalize_text(await self._extract_kimi(file_path)))
+        else:
+            extracted = await self._extract_local(resource, file_path)
+        await text_cache.put(content_hash, extractor, extracted)
+        return extracted
+
+    @staticmethod
+    async def _extract_url(resource: TeachingResource, max_chars: int) -> Dict[str, Any]:
+        if not provider_registry.supports("web_search"):
+            raise HTTPException(status_code=400, detail="外部链接内容提取仅支持 Kimi 提供商")
+        try:
+            raw_text = await aigc_client.extract_url_content(
+                resource.external_url, max_chars=max_chars, profile=PROFILE_LONG_CONTEXT
+            )
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=f"外部链接内容提取失败: {exc}") from exc
+        return _truncate(resource.id, ExtractedText(normalize_text(raw_text)), max_chars, "external_url", False)
+
+    @staticmethod
+    async def _extract_kimi(file_path: Path) -> str:
+        try:
+            raw_text = await aigc_client.extract_file_text(str(file_path), profile=PROFILE_LONG_CONTEXT)
+            raw_text = normalize_kimi_content(raw_text)
+            if needs_image_fallback(raw_text) and file_path.suffix.lower() == ".docx":
+                fallback_text = await extract_docx_images_text(file_path, aigc_client)
+                if fallback_text:
+                    raw_text = fallback_text
+            return raw_text
+        except httpx.TimeoutException:
+            raise HTTPException(status_code=504, detail="文件处理超时，请稍后重试或尝试较小的文件")
+        except httpx.HTTPStatusError as exc:
+            # 处理 HTTP 状态错误
+            status_code = exc.response.status_code
+            if status_code in [502, 503, 504]:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Kimi API 服务暂时不可用（{status_code}），请稍后重试。这是 Kimi 服务端的问题，已自动重试3次仍然失败。"
+                )
+            elif status_code == 429:
+                raise HTTPException(status_code=429, detail="Kimi API 请求频率超限，已按 Retry-After 重新排队仍未成功，请稍后重试")
+            else:
+                raise HTTPException(status_code=500, detail=f"Kimi API 返回错误 {status_code}: {exc}")
+        except QueueTimeout as exc:
+            raise HTTPException(status_code=503, detail=f"AI 服务繁忙，排队超时，请稍后重试: {exc}") from exc
+        except Exception as exc:
+            error_msg = str(exc)
+            if "timeout" in error_msg.lower():
+                raise HTTPException(status_code=504, detail="文件处理超时，请稍后重试")
+            raise HTTPException(status_code=500, detail=f"Kimi 文件解析失败: {exc}") from exc
+
+    @staticmethod
+    async def _extract_local(
+        resource: TeachingResource, file_path: Path, max_chars: Optional[int] = None
+    ) -> ExtractedText:
+        try:
+            return await extraction_engine.extract(file_path, resource.file_format, resource.resource_type, max_chars)
+        except ExtractionTimeout as exc:
+            raise HTTPException(status_code=504, detail=f"{exc}，请尝试较小的文件") from exc
+        except MemoryError as exc:
+            raise HTTPException(status_code=400, detail=f"文件过大或过于复杂，解析超出内存限制: {exc}") from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=f"文本提取失败: {exc}") from exc
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cache": text_cache.stats(), "inflight": self._flight.stats(), "engine": extraction_engine.stats()}
+
+
+resource_text_service = ResourceTextService()
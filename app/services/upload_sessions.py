@@ -0,0 +1,273 @@
+"""
+分块续传上传会话
+1. 创建会话：校验资源字段（不合法时在上传任何字节之前返回 422），登记文件名、总大小，
+   预先创建同样大小的暂存文件（稀疏文件，不占实际空间）；
+2. PUT 分块：请求体按 offset 直接流式写入暂存文件对应位置，不在内存中缓冲；
+   连接中途断开时已写入的部分同样记为已接收，客户端查询已接收区间后只补传缺失部分；
+3. 完成：校验区间覆盖整个文件，计算 SHA-256 后交给内容寻址存储（会话进入 stored），再走正常的资源创建流程；
+   资源创建失败时会话与已登记的文件都保留，可重复调用完成接口重试。资源以会话派生的下载 UUID 作为幂等键，
+   资源已创建但会话未来得及标记完成时，重试不会重复创建。
+超过 UPLOAD_SESSION_TTL 没有写入的会话由后台任务清理。
+同一会话的区间合并在进程内串行；正在写入分块时完成接口返回 409，避免哈希与移动文件时分块仍在写入。
+多 worker 部署时同一会话的分块应路由到同一进程，或由客户端串行上传。
+"""
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import aiofiles
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from app.log import logger
+from app.models.chapter import Chapter
+from app.models.course import Course
+from app.models.enums import ResourceType, UploadSessionStatus
+from app.models.ideological import TeachingResource, UploadSession
+from app.schemas.ideological import TeachingResourceCreate
+from app.services.resource_storage import STAGING_DIR, StoredFile, blob_store
+from app.services.resource_text.cache import hash_file
+from app.settings.config import settings
+
+Range = List[int]
+
+
+def merge_ranges(ranges: List[Range], start: int, end: int) -> List[Range]:
+    """把 [start, end) 并入已排序的区间列表，相邻或重叠的区间合并"""
+    merged: List[Range] = []
+    for lo, hi in sorted([*ranges, [start, end]]):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def missing_ranges(ranges: List[Range], total_size: int) -> List[Range]:
+    missing: List[Range] = []
+    position = 0
+    for lo, hi in ranges:
+        if lo > position:
+            missing.append([position, lo])
+        position = max(position, hi)
+    if position < total_size:
+        missing.append([position, total_size])
+    return missing
+
+
+class UploadSessionService:
+    """分块续传服务类"""
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._writers: Dict[str, int] = {}  # 每个会话正在写入的分块请求数
+        self._gc_task: Optional[asyncio.Task] = None
+
+    async def startup(self) -> None:
+        if self._gc_task is None:
+            self._gc_task = asyncio.create_task(self._gc_loop())
+
+    async def shutdown(self) -> None:
+        if self._gc_task is not None:
+            self._gc_task.cancel()
+            await asyncio.gather(self._gc_task, return_exceptions=True)
+            self._gc_task = None
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    @staticmethod
+    def _expires_at() -> datetime:
+        return datetime.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+
+    @staticmethod
+    async def _validate_resource_data(resource_data: Dict[str, Any]) -> None:
+        """在接收分块之前校验资源字段，避免上传完几个 GB 后才因字段错误无法创建资源"""
+        try:
+            TeachingResourceCreate(**resource_data)
+        except ValidationError as exc:
+            raise RequestValidationError(exc.errors()) from exc
+        if resource_data.get("resource_type") not in {t.value for t in ResourceType}:
+            raise HTTPException(status_code=422, detail=f"不支持的资源类型: {resource_data.get('resource_type')}")
+        if resource_data.get("course_id") and not await Course.exists(id=resource_data["course_id"]):
+            raise HTTPException(status_code=422, detail="课程不存在")
+        if resource_data.get("chapter_id") and not await Chapter.exists(id=resource_data["chapter_id"]):
+            raise HTTPException(status_code=422, detail="章节不存在")
+
+    async def create(self, user_id: int, filename: str, total_size: int, resource_data: Dict[str, Any]) -> UploadSession:
+        await self._validate_resource_data(resource_data)
+        if total_size > settings.RESOURCE_UPLOAD_MAX_BYTES:
+            limit_mb = settings.RESOURCE_UPLOAD_MAX_BYTES / 1024 / 1024
+            raise HTTPException(status_code=413, detail=f"文件过大，超过上传上限 {limit_mb:.0f}MB")
+        upload_id = uuid.uuid4().hex
+        STAGING_DIR.mkdir(parents=True, exist_ok=True)
+        staging = STAGING_DIR / f"{upload_id}.upload"
+        with open(staging, "wb") as f:
+            f.truncate(total_size)
+        return await UploadSession.create(
+            upload_id=upload_id,
+            user_id=user_id,
+            filename=filename,
+            total_size=total_size,
+            staging_path=str(staging),
+            resource_data=resource_data,
+            expires_at=self._expires_at(),
+        )
+
+    @staticmethod
+    async def get(upload_id: str, user_id: int) -> UploadSession:
+        session = await UploadSession.get_or_none(upload_id=upload_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="上传会话不存在或已过期")
+        if session.user_id != user_id:
+            raise HTTPException(status_code=403, detail="无权访问该上传会话")
+        return session
+
+    async def write_chunk(self, session: UploadSession, offset: int, body: AsyncIterator[bytes]) -> UploadSession:
+        if session.status != UploadSessionStatus.UPLOADING:
+            raise HTTPException(status_code=409, detail="文件已收齐，不再接收分块")
+        if offset >= session.total_size:
+            raise HTTPException(status_code=416, detail="偏移超出文件总大小")
+        upload_id = session.upload_id
+        written = 0
+        async with aiofiles.open(session.staging_path, "r+b") as f:
+            # 打开文件后在锁内重新确认状态并登记写入：完成接口持锁期间不会有新的写入开始
+            async with self._lock(upload_id):
+                await session.refresh_from_db(fields=["status"])
+                if session.status != UploadSessionStatus.UPLOADING:
+                    raise HTTPException(status_code=409, detail="文件已收齐，不再接收分块")
+                self._writers[upload_id] = self._writers.get(upload_id, 0) + 1
+            try:
+                await f.seek(offset)
+                async for chunk in body:
+                    if offset + written + len(chunk) > session.total_size:
+                        raise HTTPException(status_code=416, detail="分块超出文件总大小")
+                    await f.write(chunk)
+                    written += len(chunk)
+                await f.flush()
+            finally:
+                # 连接中途断开时，已写入的部分同样记为已接收
+                async with self._lock(upload_id):
+                    try:
+                        if written:
+                            await self._mark_received(session, offset, offset + written)
+                    finally:
+                        self._writers[upload_id] -= 1
+                        if not self._writers[upload_id]:
+                            del self._writers[upload_id]
+        return session
+
+    async def _mark_received(self, session: UploadSession, start: int, end: int) -> None:
+        """调用方需持有会话锁"""
+        await session.refresh_from_db(fields=["received"])
+        session.received = merge_ranges(session.received or [], start, end)
+        session.received_bytes = sum(hi - lo for lo, hi in session.received)
+        session.expires_at = self._expires_at()
+        await session.save(update_fields=["received", "received_bytes", "expires_at", "updated_at"])
+
+    @staticmethod
+    def file_uuid(session: UploadSession) -> str:
+        """由会话派生的下载 UUID，同时作为资源创建的幂等键"""
+        return str(uuid.UUID(session.upload_id))
+
+    async def complete(
+        self,
+        session: UploadSession,
+        create_resource: Callable[[StoredFile, str, str], Awaitable[TeachingResource]],
+    ) -> TeachingResource:
+        """
+        校验分块完整并登记到内容寻址存储，再调用 create_resource(存储结果, 扩展名, 下载UUID) 创建资源。
+        可重复调用：创建失败时保留会话与已登记的文件，重试时跳过校验与哈希；已完成时返回已创建的资源。
+        """
+        async with self._lock(session.upload_id):
+            await session.refresh_from_db()
+            file_uuid = self.file_uuid(session)
+            if session.status == UploadSessionStatus.COMPLETED:
+                resource = await TeachingResource.get_or_none(id=session.resource_id)
+                if resource is None:
+                    raise HTTPException(status_code=410, detail="上传已完成，但创建的资源已被删除")
+                return resource
+
+            if session.status == UploadSessionStatus.UPLOADING:
+                if self._writers.get(session.upload_id):
+                    raise HTTPException(status_code=409, detail="仍有分块正在写入，请稍后重试")
+                missing = missing_ranges(session.received or [], session.total_size)
+                if missing:
+                    raise HTTPException(status_code=409, detail={"message": "文件尚未上传完整", "missing": missing})
+                staging = Path(session.staging_path)
+                content_hash = await hash_file(staging)
+                stored = await blob_store.commit(staging, content_hash, session.total_size, Path(session.filename).suffix)
+                # 暂存文件已移入存储：先记下登记结果，之后的失败都可以直接重试资源创建
+                session.status = UploadSessionStatus.STORED
+                session.content_hash = stored.content_hash
+                session.file_path = stored.file_path
+                session.expires_at = self._expires_at()
+                await session.save(update_fields=["status", "content_hash", "file_path", "expires_at", "updated_at"])
+
+            # 资源已创建但上次没来得及标记完成时，不重复创建
+            resource = await TeachingResource.get_or_none(file_uuid=file_uuid)
+            if resource is None:
+                stored = blob_store.stored_file(session.file_path, session.content_hash, session.total_size)
+                resource = await create_resource(stored, Path(session.filename).suffix.lower(), file_uuid)
+
+            session.status = UploadSessionStatus.COMPLETED
+            session.resource_id = resource.id
+            await session.save(update_fields=["status", "resource_id", "updated_at"])
+        self._locks.pop(session.upload_id, None)
+        return resource
+
+    async def _discard(self, session: UploadSession) -> None:
+        """删除会话；文件已登记但还没有资源引用时撤销这次引用"""
+        if session.status == UploadSessionStatus.UPLOADING and os.path.exists(session.staging_path):
+            os.remove(session.staging_path)
+        elif session.status == UploadSessionStatus.STORED:
+            if not await TeachingResource.exists(file_uuid=self.file_uuid(session)):
+                await blob_store.release(session.content_hash, session.file_path)
+        await session.delete()
+        self._locks.pop(session.upload_id, None)
+
+    async def abort(self, session: UploadSession) -> None:
+        async with self._lock(session.upload_id):
+            await session.refresh_from_db()
+            await self._discard(session)
+
+    async def gc(self) -> int:
+        expired = await UploadSession.filter(expires_at__lt=datetime.now())
+        for session in expired:
+            if self._writers.get(session.upload_id):
+                continue  # 长时间的分块写入还没结束，写完后会刷新过期时间
+            async with self._lock(session.upload_id):
+                await self._discard(session)
+        if expired:
+            logger.info(f"清理了 {len(expired)} 个过期的上传会话")
+        return len(expired)
+
+    async def _gc_loop(self) -> None:
+        while True:
+            try:
+                await self.gc()
+            except Exception as e:
+                logger.warning(f"清理上传会话失败: {e}")
+            await asyncio.sleep(settings.UPLOAD_SESSION_GC_INTERVAL)
+
+    @staticmethod
+    def snapshot(session: UploadSession) -> Dict[str, Any]:
+        received = session.received or []
+        return {
+            "upload_id": session.upload_id,
+            "filename": session.filename,
+            "status": session.status,
+            "total_size": session.total_size,
+            "received_bytes": session.received_bytes,
+            "received": received,
+            "missing": missing_ranges(received, session.total_size),
+            "resource_id": session.resource_id,
+            "expires_at": session.expires_at,
+        }
+
+
+upload_session_service = UploadSessionService()
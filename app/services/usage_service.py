@@ -0,0 +1,153 @@
+"""
+AIGC 用量服务层
+把每次生成的 Token 用量累加到按 用户 / 日期 / 接口 / provider / 模型 / 模板 汇总的日账表，并提供查询
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.functions import Sum
+
+from app.core.aigc.tokens import Usage
+from app.log import logger
+from app.models.aigc import AIGCUsageDaily
+
+GROUP_FIELDS = {
+    "user": "user_id",
+    "day": "day",
+    "endpoint": "endpoint",
+    "provider": "provider",
+    "model": "model",
+    "template": "prompt_template_id",
+}
+
+SUM_FIELDS = (
+    "request_count",
+    "cache_hit_count",
+    "estimated_count",
+    "prompt_tokens",
+    "completion_tokens",
+    "cached_tokens",
+    "cancelled_count",
+    "saved_tokens",
+)
+COMPLETION_EWMA_ALPHA = 0.1
+
+
+class UsageService:
+    """AIGC 用量服务类"""
+
+    # 各接口完整回复的输出 Token 数滑动平均，用于估算提前取消节省的 Token
+    _completion_avg: Dict[str, float] = {}
+
+    @classmethod
+    def saved_tokens(cls, endpoint: str, completion_tokens: int) -> int:
+        """提前取消节省的输出 Token：该接口完整回复的平均长度减去已生成部分；尚无统计时记 0"""
+        return max(0, round(cls._completion_avg.get(endpoint, 0) - completion_tokens))
+
+    @classmethod
+    def _observe_completion(cls, endpoint: str, completion_tokens: int) -> None:
+        avg = cls._completion_avg.get(endpoint)
+        cls._completion_avg[endpoint] = (
+            completion_tokens if avg is None else avg + COMPLETION_EWMA_ALPHA * (completion_tokens - avg)
+        )
+
+    @classmethod
+    async def record(
+        cls,
+        endpoint: str,
+        usage: Usage,
+        meta: Dict[str, Any],
+        user_id: Optional[int] = None,
+        prompt_template_id: Optional[int] = None,
+        cancelled: bool = False,
+    ) -> None:
+        """
+        记录一次调用。命中响应缓存或复用他人在途请求时只计次数，不计 Token。
+        cancelled 表示客户端断开后提前取消，usage 为已生成部分，并累计估算节省的 Token。
+        记账失败只记日志，不影响生成结果返回。
+        """
+        free = bool(meta.get("cache_hit") or meta.get("shared"))
+        saved = 0
+        if cancelled and not free:
+            saved = cls.saved_tokens(endpoint, usage.completion_tokens)
+        elif not free:
+            cls._observe_completion(endpoint, usage.completion_tokens)
+        increments = {
+            "request_count": 1,
+            "cache_hit_count": 1 if free else 0,
+            "estimated_count": 1 if usage.estimated and not free else 0,
+            "prompt_tokens": 0 if free else usage.prompt_tokens,
+            "completion_tokens": 0 if free else usage.completion_tokens,
+            "cached_tokens": 0 if free else usage.cached_tokens,
+            "cancelled_count": 1 if cancelled else 0,
+            "saved_tokens": saved,
+        }
+        keys = {
+            "user_id": user_id or 0,
+            "day": date.today(),
+            "endpoint": endpoint,
+            "provider": meta.get("provider") or "",
+            "model": meta.get("model") or "",
+            "prompt_template_id": prompt_template_id or 0,
+        }
+        try:
+            if await cls._increment(keys, increments):
+                return
+            try:
+                await AIGCUsageDaily.create(**keys, **increments)
+            except IntegrityError:
+                # 并发下另一个请求先创建了当天的行
+                await cls._increment(keys, increments)
+        except Exception as e:
+            logger.warning(f"AIGC 用量记账失败: {e}")
+
+    @staticmethod
+    async def _increment(keys: Dict[str, Any], increments: Dict[str, int]) -> int:
+        return await AIGCUsageDaily.filter(**keys).update(
+            **{name: F(name) + value for name, value in increments.items()}
+        )
+
+    @staticmethod
+    def hit_ratio(cached_tokens: int, prompt_tokens: int) -> float:
+        """provider 报告的前缀缓存命中 Token 占输入 Token 的比例"""
+        return round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.0
+
+    @classmethod
+    async def summary(
+        cls,
+        group_by: List[str],
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        user_id: Optional[int] = None,
+        endpoint: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """按维度汇总用量，按总 Token 降序"""
+        columns = [GROUP_FIELDS[name] for name in group_by]
+        query = AIGCUsageDaily.all()
+        if start:
+            query = query.filter(day__gte=start)
+        if end:
+            query = query.filter(day__lte=end)
+        if user_id is not None:
+            query = query.filter(user_id=user_id)
+        if endpoint:
+            query = query.filter(endpoint=endpoint)
+
+        rows = (
+            await query.annotate(**{f"sum_{name}": Sum(name) for name in SUM_FIELDS})
+            .group_by(*columns)
+            .values(*columns, *[f"sum_{name}" for name in SUM_FIELDS])
+        )
+        items = []
+        for row in rows:
+            item = {column: row[column] for column in columns}
+            for name in SUM_FIELDS:
+                item[name] = int(row[f"sum_{name}"] or 0)
+            item["total_tokens"] = item["prompt_tokens"] + item["completion_tokens"]
+            item["prefix_cache_hit_ratio"] = cls.hit_ratio(item["cached_tokens"], item["prompt_tokens"])
+            items.append(item)
+        items.sort(key=lambda item: item["total_tokens"], reverse=True)
+        return items[:limit]
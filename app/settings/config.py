@@ -59,6 +59,83 @@ class Settings(BaseSettings):
     AIGC_PROVIDER: str = "deepseek"
     AIGC_MODEL: str = "deepseek-chat"
     AIGC_TIMEOUT: str | int = 60000
+    # 各 provider 的默认模型（profile 未指定模型或跨 provider 回退时使用）
+    DEEPSEEK_MODEL: str = "deepseek-chat"
+    MOONSHOT_MODEL: str = "moonshot-v1-8k"
+    # 具名模型配置，JSON 格式，例如：
+    # {"fast": {"provider": "deepseek", "model": "deepseek-chat"},
+    #  "long_context": {"provider": "kimi", "model": "moonshot-v1-128k", "timeout": 120000},
+    #  "batch": {"provider": "deepseek", "model": "deepseek-chat", "temperature": 0.7}}
+    AIGC_PROFILES: dict = {}
+    # 精确匹配响应缓存：仅对 AIGC_CACHE_SCOPES 中列出的调用范围生效（按接口显式开启）
+    # 可选范围：resource.extract_url（网页正文提取）、enhanced.generate（内容生成）、aigc.chat（对话）；
+    # 生成与对话默认不缓存，否则重复点击生成或联网搜索会返回同一份旧结果
+    AIGC_CACHE_ENABLED: bool = True
+    AIGC_CACHE_TTL: float = 3600.0  # 秒
+    AIGC_CACHE_MAX_ENTRIES: int = 2000
+    AIGC_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    AIGC_CACHE_SQLITE_PATH: str | None = None  # 例如 app/logs/aigc_cache.sqlite3，为空则只用内存
+    AIGC_CACHE_SCOPES: typing.List[str] = ["resource.extract_url"]
+    # 相同载荷的在途请求合并 / 流式多播（对所有指定了调用范围的请求生效）
+    AIGC_SINGLEFLIGHT_ENABLED: bool = True
+    # 上游准入控制：每个 provider 的最大并发与 RPM/TPM 配额（0 表示不限制），可按 provider 在 AIGC_LIMITS 中覆盖
+    AIGC_MAX_CONCURRENCY: int = 8
+    AIGC_RPM: int = 0
+    AIGC_TPM: int = 0
+    AIGC_LIMITS: dict = {}  # 例如 {"kimi": {"max_concurrency": 4, "rpm": 60, "tpm": 120000}}
+    AIGC_QUEUE_TIMEOUT: float = 120.0  # 排队超时（秒），0 表示不限制
+    AIGC_RATE_LIMIT_RETRIES: int = 2  # 收到 429 后重新排队的次数
+    AIGC_RATE_LIMIT_BACKOFF: float = 5.0  # 429 未返回 Retry-After 时的暂停秒数
+    # 健康度选路与熔断：普通对话可在已配置密钥的 provider 间故障转移
+    AIGC_FAILOVER_ENABLED: bool = True
+    AIGC_ROUTING_BIAS: float = 2.0  # 配置的 provider 评分不差于其他 provider 的 2 倍时优先使用
+    AIGC_BREAKER_FAILURES: int = 5  # 连续失败次数阈值
+    AIGC_BREAKER_ERROR_RATE: float = 0.5  # EWMA 错误率阈值
+    AIGC_BREAKER_COOLDOWN: float = 30.0  # 熔断冷却时间（秒）
+    # 批量生成
+    AIGC_BATCH_CONCURRENCY: int = 4
+    AIGC_BATCH_MAX_ITEMS: int = 200
+    # 后台生成任务
+    AIGC_JOB_CONCURRENCY: int = 4
+    AIGC_JOB_MAX_ATTEMPTS: int = 3  # 服务重启导致中断后的最多执行次数
+    # SSE 断线续传：每个流最多缓存的事件数，以及流结束后缓冲保留的秒数
+    SSE_REPLAY_MAX_EVENTS: int = 5000
+    SSE_REPLAY_TTL: float = 300.0
+    SSE_DISCONNECT_GRACE: float = 10.0  # 客户端全部断开后等待重连的秒数，超时取消上游生成；0 表示立即取消
+    # 教学资源上传大小上限（字节），在流式写入过程中检查，超过返回 413
+    RESOURCE_UPLOAD_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    # 分块续传：会话最后一次写入后保留的秒数，以及清理过期会话的间隔（秒）
+    UPLOAD_SESSION_TTL: float = 24 * 3600.0
+    UPLOAD_SESSION_GC_INTERVAL: float = 600.0
+    # 资源下载交给 nginx 发送的内部路径前缀（对应 uploads 目录，见 deploy/web.conf），为空时由应用自身发送文件
+    RESOURCE_DOWNLOAD_ACCEL_PREFIX: str = ""
+    # 教学资源上传后的后台文本预提取
+    RESOURCE_EXTRACT_CONCURRENCY: int = 2
+    # 本地文档解析进程池：子进程数、单批解析的限时（秒）与内存上限（MB，0 不限制），每批解析的页数
+    RESOURCE_EXTRACT_PROCESSES: int = 2
+    RESOURCE_EXTRACT_TIMEOUT: float = 120.0
+    RESOURCE_EXTRACT_MEMORY_MB: int = 1024
+    RESOURCE_EXTRACT_PAGE_BATCH: int = 20
+    # 图片 OCR 前缩放到的 DPI 与像素上限
+    RESOURCE_OCR_DPI: int = 300
+    RESOURCE_OCR_MAX_PIXELS: int = 12_000_000
+    # 扫描版 DOCX 回退识别嵌入图片：单个文档的并发识别数，小于该字节数的图片视为装饰性小图跳过
+    RESOURCE_OCR_CONCURRENCY: int = 4
+    RESOURCE_OCR_MIN_IMAGE_BYTES: int = 4096
+    # 提示词助手上下文窗口：按模型的 Token 预算（未配置的模型使用默认值），保留最近 N 轮原文，更早的轮次折叠为滚动摘要
+    AIGC_CONTEXT_BUDGET: int = 6000
+    AIGC_CONTEXT_BUDGETS: dict = {}  # 例如 {"deepseek-chat": 12000, "moonshot-v1-8k": 6000}
+    PROMPT_ASSISTANT_KEEP_TURNS: int = 4
+    PROMPT_ASSISTANT_SUMMARY_MIN_TURNS: int = 2  # 待折叠轮次达到该数量才重新生成摘要
+    # 提示词助手会话状态缓存（LRU，空闲超过 TTL 秒后从数据库重新加载）
+    PROMPT_ASSISTANT_SESSION_CACHE_SIZE: int = 1000
+    PROMPT_ASSISTANT_SESSION_TTL: float = 1800.0
+    # 上游连接池：每个 provider 一个进程级 httpx.AsyncClient
+    AIGC_HTTP2: bool = False  # 需要安装 h2（pip install "httpx[http2]"）
+    AIGC_POOL_MAX_CONNECTIONS: int = 50
+    AIGC_POOL_MAX_KEEPALIVE: int = 20
+    AIGC_POOL_KEEPALIVE_EXPIRY: float = 60.0
+    AIGC_POOL_CONNECT_TIMEOUT: float = 10.0
 
     # Ensure pydantic reads the project's .env file (project root)
     # BASE_DIR was defined above as the project root directory
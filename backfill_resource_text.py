@@ -0,0 +1,71 @@
+"""
+教学资源文本补提取脚本
+为上线预提取之前上传的资源（extraction_status 为空）提取文本并写入缓存，之后读取接口直接命中缓存。
+
+用法:
+    python backfill_resource_text.py                 # 提取所有未提取的资源
+    python backfill_resource_text.py --retry-failed  # 同时重试提取失败的资源
+    python backfill_resource_text.py --mark-only     # 只标记为 pending，由运行中的服务在读取或重启时处理
+
+脚本只提取本次选中的资源，不会改动运行中服务正在提取（running）的资源。
+"""
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+from tortoise.expressions import Q
+
+from app.core.aigc.http_pool import upstream_pool
+from app.models.enums import TextExtractionStatus
+from app.models.ideological import TeachingResource
+from app.services.resource_text import resource_extraction_service
+from app.services.resource_text.engine import extraction_engine
+from app.settings.config import settings
+
+
+async def backfill(concurrency: int, retry_failed: bool, mark_only: bool, limit: int):
+    await Tortoise.init(config=settings.TORTOISE_ORM)
+
+    condition = Q(extraction_status__isnull=True)
+    if retry_failed:
+        condition |= Q(extraction_status=TextExtractionStatus.FAILED)
+    query = TeachingResource.filter(condition, file_path__isnull=False, external_url__isnull=True).order_by("id")
+    if limit:
+        query = query.limit(limit)
+    ids = await query.values_list("id", flat=True)
+    if ids:
+        # 条件更新：选中之后被其他进程接手的资源保持原状态
+        await TeachingResource.filter(condition, id__in=ids).update(
+            extraction_status=TextExtractionStatus.PENDING, extraction_error=None
+        )
+    print(f"📋 标记 {len(ids)} 个资源待提取")
+
+    if not mark_only:
+        await upstream_pool.startup()
+        resource_extraction_service.pool.concurrency = max(1, concurrency)
+        try:
+            # 不执行 recover()：其他 pending / running 的资源由运行中的服务负责，这里只提交本次选中的资源
+            await resource_extraction_service.startup(recover=False)
+            for resource_id in ids:
+                resource_extraction_service.pool.submit(resource_id, resource_id)
+            await resource_extraction_service.pool.join()
+        finally:
+            await resource_extraction_service.shutdown()
+            extraction_engine.shutdown()
+            await upstream_pool.shutdown()
+
+        done = await TeachingResource.filter(id__in=ids, extraction_status=TextExtractionStatus.DONE).count()
+        failed = await TeachingResource.filter(id__in=ids, extraction_status=TextExtractionStatus.FAILED).count()
+        print(f"✅ 提取完成 {done} 个，失败 {failed} 个")
+
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="教学资源文本补提取")
+    parser.add_argument("--concurrency", type=int, default=settings.RESOURCE_EXTRACT_CONCURRENCY)
+    parser.add_argument("--retry-failed", action="store_true", help="同时重试提取失败的资源")
+    parser.add_argument("--mark-only", action="store_true", help="只标记为 pending，不在本进程提取")
+    parser.add_argument("--limit", type=int, default=0, help="最多处理的资源数，0 表示不限")
+    args = parser.parse_args()
+    asyncio.run(backfill(args.concurrency, args.retry_failed, args.mark_only, args.limit))
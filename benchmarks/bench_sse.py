@@ -0,0 +1,83 @@
+"""
+SSE 解析吞吐量基准测试
+用录制的 DeepSeek / Kimi 流式响应（benchmarks/fixtures/*.sse）测量 SSEDecoder 的解析速度（MB/s）。
+
+用法:
+    python benchmarks/bench_sse.py [--size-mb 32] [--chunk 1024] [fixture.sse ...]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.aigc.sse import SSEDecoder, iter_delta_contents  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures"
+
+
+def _split_chunks(data: bytes, chunk_size: int, seed: int = 42):
+    """模拟 TCP 分片：分片大小在 [chunk_size/2, chunk_size*1.5] 之间随机，会切断行和多字节字符"""
+    rng = random.Random(seed)
+    chunks = []
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(max(1, chunk_size // 2), chunk_size + chunk_size // 2)
+        chunks.append(data[pos : pos + size])
+        pos += size
+    return chunks
+
+
+def bench(path: Path, size_mb: float, chunk_size: int, rounds: int) -> None:
+    recorded = path.read_bytes()
+    # 去掉结尾的 [DONE]，重复拼接到目标大小，最后再补上
+    body = recorded.replace(b"data: [DONE]\n\n", b"")
+    repeat = max(1, int(size_mb * 1024 * 1024 / len(body)))
+    data = body * repeat + b"data: [DONE]\n\n"
+    chunks = _split_chunks(data, chunk_size)
+
+    best = float("inf")
+    events = chars = 0
+    for _ in range(rounds):
+        decoder = SSEDecoder()
+        events = chars = 0
+        start = time.perf_counter()
+        for chunk in chunks:
+            for event in decoder.feed(chunk):
+                events += 1
+                if not event.done:
+                    for content in iter_delta_contents(event.data):
+                        chars += len(content)
+        best = min(best, time.perf_counter() - start)
+
+    mb = len(data) / (1024 * 1024)
+    print(
+        f"{path.name:<24} {mb:8.1f} MB  chunk≈{chunk_size:<6} "
+        f"{mb / best:8.1f} MB/s  {events / best / 1000:8.1f} k events/s  ({chars} chars)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSEDecoder 吞吐量基准测试")
+    parser.add_argument("fixtures", nargs="*", help="录制的 SSE 流文件，默认使用 benchmarks/fixtures/*.sse")
+    parser.add_argument("--size-mb", type=float, default=32.0, help="每个样本放大后的数据量（MB）")
+    parser.add_argument("--chunk", type=int, nargs="+", default=[256, 1024, 16384], help="模拟的 TCP 分片大小（字节）")
+    parser.add_argument("--rounds", type=int, default=3, help="重复次数，取最快一次")
+    args = parser.parse_args()
+
+    paths = [Path(p) for p in args.fixtures] or sorted(FIXTURE_DIR.glob("*.sse"))
+    if not paths:
+        print(f"未找到录制样本: {FIXTURE_DIR}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"python {sys.version.split()[0]}  pid={os.getpid()}")
+    for path in paths:
+        for chunk_size in args.chunk:
+            bench(path, args.size_mb, chunk_size, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
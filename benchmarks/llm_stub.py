@@ -0,0 +1,283 @@
+"""
+本地 OpenAI 兼容 LLM 桩服务
+实现 AIGCClient 用到的接口：/v1/chat/completions（流式与非流式）、/v1/files、/v1/files/{id}/content、
+DELETE /v1/files/{id}，用于压测时不消耗真实 provider 配额。
+
+可配置首 token 延迟、输出速度、输出长度、错误注入（5xx / 429 / 流中断）与联网搜索 tool_calls 场景；
+运行中可通过 GET/POST /_stub/config 查看或修改配置，/_stub/stats 查看请求统计。
+
+用法:
+    python benchmarks/llm_stub.py --port 8300 --ttft 0.4 --tps 40 --tokens 300
+    # 让应用指向桩服务（.env）：
+    DEEPSEEK_API_BASE=http://127.0.0.1:8300
+    MOONSHOT_API_BASE=http://127.0.0.1:8300/v1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass, fields
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+SAMPLE_TEXT = (
+    "【案例背景】某团队在开发校园一卡通系统时，为赶工期跳过了需求评审与单元测试，上线后出现资金对账错误。"
+    "【思政融入点】引导学生认识软件工程师的职业责任与工匠精神，理解质量意识对社会公共利益的影响。"
+    "【讨论问题】1. 工期压力下如何坚持工程规范？2. 测试不足带来的后果由谁承担？"
+    "Software quality is a shared responsibility of every engineer on the team. "
+)
+
+
+@dataclass
+class StubConfig:
+    ttft: float = 0.3  # 首 token 延迟（秒）
+    tps: float = 50.0  # 每秒输出 token 数，0 表示不限速
+    tokens: int = 200  # 每次回复的 token 数
+    chars_per_token: int = 2
+    jitter: float = 0.1  # 延迟的随机抖动比例
+    error_rate: float = 0.0  # 直接返回错误状态码的比例
+    error_status: int = 500
+    rate_limit_rate: float = 0.0  # 返回 429 的比例
+    retry_after: float = 1.0
+    stream_abort_rate: float = 0.0  # 流输出到一半断开的比例
+    tool_call_rate: float = 1.0  # 带 tools 的请求中返回 $web_search tool_calls 的比例
+    cached_prefix_ratio: float = 0.0  # usage 中报告为前缀缓存命中的输入比例
+    file_extract_delay: float = 0.5  # /files 上传后提取文本的耗时（秒）
+
+
+config = StubConfig()
+stats: Dict[str, int] = {"requests": 0, "streams": 0, "active_streams": 0, "errors": 0, "rate_limited": 0, "tool_calls": 0}
+files: Dict[str, Dict[str, Any]] = {}
+app = FastAPI(title="LLM stub")
+
+
+def _jittered(seconds: float) -> float:
+    if seconds <= 0:
+        return 0.0
+    return max(0.0, seconds * (1 + random.uniform(-config.jitter, config.jitter)))
+
+
+def _estimate_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(4 + len(str(message.get("content") or "")) // 2 for message in messages)
+
+
+def _usage(messages: List[Dict[str, Any]], completion_tokens: int) -> Dict[str, Any]:
+    prompt_tokens = _estimate_prompt_tokens(messages)
+    cached = int(prompt_tokens * config.cached_prefix_ratio)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_cache_hit_tokens": cached,
+        "prompt_cache_miss_tokens": prompt_tokens - cached,
+    }
+
+
+def _pieces() -> List[str]:
+    size = config.chars_per_token
+    text = (SAMPLE_TEXT * (config.tokens * size // len(SAMPLE_TEXT) + 1))[: config.tokens * size]
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def _wants_tool_call(body: Dict[str, Any]) -> bool:
+    messages = body.get("messages") or []
+    if not body.get("tools") or any(message.get("role") == "tool" for message in messages):
+        return False
+    return random.random() < config.tool_call_rate
+
+
+def _tool_call(body: Dict[str, Any]) -> Dict[str, Any]:
+    query = str((body.get("messages") or [{}])[-1].get("content") or "")[:50]
+    arguments = json.dumps({"search_result": {"search_id": uuid.uuid4().hex, "query": query}}, ensure_ascii=False)
+    return {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "builtin_function", "function": {"name": "$web_search", "arguments": arguments}}
+
+
+def _inject_error() -> Optional[JSONResponse]:
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": "rate limit exceeded", "type": "rate_limit_error"}},
+            status_code=429,
+            headers={"Retry-After": str(config.retry_after)},
+        )
+    if roll < config.rate_limit_rate + config.error_rate:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"message": "injected error", "type": "server_error"}}, status_code=config.error_status)
+    return None
+
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> bytes:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        **extra,
+    }
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def _stream(body: Dict[str, Any]) -> AsyncIterator[bytes]:
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    model = body.get("model") or "stub"
+    messages = body.get("messages") or []
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+    stats["streams"] += 1
+    stats["active_streams"] += 1
+    try:
+        await asyncio.sleep(_jittered(config.ttft))
+        yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+
+        if _wants_tool_call(body):
+            stats["tool_calls"] += 1
+            call = _tool_call(body)
+            arguments = call["function"]["arguments"]
+            head = dict(call, index=0, function={"name": "$web_search", "arguments": ""})
+            yield _chunk(completion_id, model, {"tool_calls": [head]})
+            for i in range(0, len(arguments), 16):
+                yield _chunk(completion_id, model, {"tool_calls": [{"index": 0, "function": {"arguments": arguments[i : i + 16]}}]})
+            yield _chunk(completion_id, model, {}, "tool_calls", usage=_usage(messages, 20) if include_usage else None)
+            yield b"data: [DONE]\n\n"
+            return
+
+        pieces = _pieces()
+        abort_at = len(pieces) // 2 if random.random() < config.stream_abort_rate else None
+        started = time.monotonic()
+        for index, piece in enumerate(pieces):
+            if abort_at is not None and index == abort_at:
+                stats["errors"] += 1
+                raise RuntimeError("injected stream abort")
+            if config.tps > 0:
+                # 按绝对时间表发送，避免 sleep 误差累积
+                delay = started + index / config.tps - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield _chunk(completion_id, model, {"content": piece})
+        yield _chunk(completion_id, model, {}, "stop")
+        if include_usage:
+            usage_chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [],
+                "usage": _usage(messages, len(pieces)),
+            }
+            yield f"data: {json.dumps(usage_chunk)}\n\n".encode("utf-8")
+        yield b"data: [DONE]\n\n"
+    finally:
+        stats["active_streams"] -= 1
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    stats["requests"] += 1
+    body = await request.json()
+    error = _inject_error()
+    if error is not None:
+        return error
+    if body.get("stream"):
+        return StreamingResponse(_stream(body), media_type="text/event-stream")
+
+    messages = body.get("messages") or []
+    await asyncio.sleep(_jittered(config.ttft))
+    if _wants_tool_call(body):
+        stats["tool_calls"] += 1
+        message = {"role": "assistant", "content": "", "tool_calls": [_tool_call(body)]}
+        finish_reason, completion_tokens = "tool_calls", 20
+    else:
+        pieces = _pieces()
+        if config.tps > 0:
+            await asyncio.sleep(len(pieces) / config.tps)
+        message = {"role": "assistant", "content": "".join(pieces)}
+        finish_reason, completion_tokens = "stop", len(pieces)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model") or "stub",
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": _usage(messages, completion_tokens),
+    }
+
+
+@app.post("/v1/files")
+async def upload_file(file: UploadFile = File(...), purpose: str = Form("file-extract")):
+    stats["requests"] += 1
+    error = _inject_error()
+    if error is not None:
+        return error
+    data = await file.read()
+    file_id = f"file-{uuid.uuid4().hex[:20]}"
+    files[file_id] = {"filename": file.filename, "bytes": len(data), "purpose": purpose}
+    await asyncio.sleep(_jittered(config.file_extract_delay))
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(data),
+        "created_at": int(time.time()),
+        "filename": file.filename,
+        "purpose": purpose,
+        "status": "ok",
+    }
+
+
+@app.get("/v1/files/{file_id}/content")
+async def file_content(file_id: str):
+    stats["requests"] += 1
+    meta = files.get(file_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="file not found")
+    content = {"content": SAMPLE_TEXT * 4, "file_type": "application/octet-stream", "filename": meta["filename"], "title": "", "type": "file"}
+    return PlainTextResponse(json.dumps(content, ensure_ascii=False), media_type="application/json")
+
+
+@app.delete("/v1/files/{file_id}")
+async def delete_file(file_id: str):
+    files.pop(file_id, None)
+    return {"id": file_id, "object": "file", "deleted": True}
+
+
+@app.get("/_stub/config")
+async def get_config():
+    return asdict(config)
+
+
+@app.post("/_stub/config")
+async def set_config(request: Request):
+    """部分更新配置，例如 {"ttft": 1.0, "error_rate": 0.05}"""
+    updates = await request.json()
+    known = {f.name: f.type for f in fields(StubConfig)}
+    for name, value in updates.items():
+        if name not in known:
+            raise HTTPException(status_code=400, detail=f"未知配置项: {name}")
+        setattr(config, name, type(getattr(config, name))(value))
+    return asdict(config)
+
+
+@app.get("/_stub/stats")
+async def get_stats():
+    return {**stats, "files": len(files)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容 LLM 桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8300)
+    for f in fields(StubConfig):
+        default = getattr(config, f.name)
+        parser.add_argument(f"--{f.name.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args()
+    for f in fields(StubConfig):
+        setattr(config, f.name, getattr(args, f.name))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
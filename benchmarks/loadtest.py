@@ -0,0 +1,214 @@
+"""
+SSE 接口压测
+对运行中的应用（建议上游指向 benchmarks/llm_stub.py）按并发阶梯发起流式请求，统计每个接口的：
+- TTFT：请求发出到收到第一个内容事件
+- 片段间隔（inter-token latency）
+- 端到端耗时 p50 / p95 / p99
+- 最大可持续并发：错误率不超过 --max-error-rate 且 TTFT p95 不超过 --ttft-slo 的最高并发档
+
+每个请求的提示词带随机后缀，避免命中响应缓存或合并到在途请求，测到的是真实上游路径。
+
+用法:
+    python benchmarks/llm_stub.py --ttft 0.3 --tps 50 &
+    python run.py   # .env 中 DEEPSEEK_API_BASE / MOONSHOT_API_BASE 指向桩服务
+    python benchmarks/loadtest.py --base-url http://127.0.0.1:9999/api/v1 --token dev \\
+        --endpoints chat,enhanced,assistant --levels 1,4,16,64 --requests 64
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ENDPOINTS: Dict[str, Dict[str, Any]] = {
+    "chat": {
+        "path": "/aigc/chat/stream",
+        "body": lambda nonce: {"messages": [{"role": "user", "content": f"介绍一下软件工程中的需求分析。#{nonce}"}]},
+    },
+    "enhanced": {
+        "path": "/aigc/enhanced/generate",
+        "body": lambda nonce: {
+            "prompt": f"围绕软件测试生成一个课程思政案例。#{nonce}",
+            "generation_type": "case",
+            "software_engineering_chapter": "软件测试",
+            "use_stream": True,
+        },
+    },
+    "assistant": {
+        "path": "/ideological/prompt-assistant/chat/stream",
+        "body": lambda nonce: {"message": f"帮我写一个软件工程课程思政的案例提示词。#{nonce}"},
+    },
+}
+
+
+@dataclass
+class Sample:
+    ok: bool
+    ttft: Optional[float] = None
+    e2e: Optional[float] = None
+    gaps: List[float] = field(default_factory=list)
+    chunks: int = 0
+    error: Optional[str] = None
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _is_content(data: Dict[str, Any]) -> bool:
+    return data.get("type") == "content" or ("content" in data and data.get("type") in (None, "chunk"))
+
+
+async def run_one(client: httpx.AsyncClient, endpoint: str, headers: Dict[str, str]) -> Sample:
+    spec = ENDPOINTS[endpoint]
+    started = time.perf_counter()
+    last = None
+    sample = Sample(ok=False)
+    try:
+        async with client.stream("POST", spec["path"], json=spec["body"](uuid.uuid4().hex[:8]), headers=headers) as resp:
+            if resp.status_code >= 400:
+                await resp.aread()
+                sample.error = f"HTTP {resp.status_code}"
+                return sample
+            async for line in resp.aiter_lines():
+                if line.startswith("event:") and line[6:].strip() == "error":
+                    sample.error = "error event"
+                    return sample
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    data = json.loads(line[5:].strip())
+                except ValueError:
+                    continue
+                if data.get("type") == "error":
+                    sample.error = str(data.get("error") or data.get("message") or "error event")
+                    return sample
+                if not _is_content(data):
+                    continue
+                now = time.perf_counter()
+                if last is None:
+                    sample.ttft = now - started
+                else:
+                    sample.gaps.append(now - last)
+                last = now
+                sample.chunks += 1
+    except httpx.HTTPError as e:
+        sample.error = f"{e.__class__.__name__}: {e}"
+        return sample
+    sample.e2e = time.perf_counter() - started
+    sample.ok = sample.ttft is not None
+    if not sample.ok:
+        sample.error = "no content"
+    return sample
+
+
+async def run_level(
+    client: httpx.AsyncClient, endpoint: str, headers: Dict[str, str], concurrency: int, total: int
+) -> List[Sample]:
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+    samples: List[Sample] = []
+
+    async def worker() -> None:
+        while not queue.empty():
+            queue.get_nowait()
+            samples.append(await run_one(client, endpoint, headers))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    ok = [s for s in samples if s.ok]
+    ttft = [s.ttft for s in ok]
+    e2e = [s.e2e for s in ok]
+    gaps = [gap for s in ok for gap in s.gaps]
+    errors: Dict[str, int] = {}
+    for s in samples:
+        if not s.ok:
+            errors[s.error] = errors.get(s.error, 0) + 1
+    row: Dict[str, Any] = {
+        "requests": len(samples),
+        "error_rate": 1 - len(ok) / len(samples) if samples else 0.0,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "itl_mean": statistics.fmean(gaps) if gaps else None,
+        "itl_p99": percentile(gaps, 99),
+        "errors": errors,
+    }
+    for pct in (50, 95, 99):
+        row[f"ttft_p{pct}"] = percentile(ttft, pct)
+        row[f"e2e_p{pct}"] = percentile(e2e, pct)
+    return row
+
+
+def _ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:8.0f}"
+
+
+def print_row(endpoint: str, concurrency: int, row: Dict[str, Any]) -> None:
+    print(
+        f"{endpoint:<10} c={concurrency:<4} n={row['requests']:<5} err={row['error_rate']:6.1%} "
+        f"rps={row['throughput_rps']:6.2f}  ttft p50/p95/p99={_ms(row['ttft_p50'])}/{_ms(row['ttft_p95'])}/{_ms(row['ttft_p99'])} ms  "
+        f"itl mean/p99={_ms(row['itl_mean'])}/{_ms(row['itl_p99'])} ms  "
+        f"e2e p50/p95/p99={_ms(row['e2e_p50'])}/{_ms(row['e2e_p95'])}/{_ms(row['e2e_p99'])} ms"
+    )
+    if row["errors"]:
+        print(f"{'':<10} errors: {row['errors']}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="SSE 接口压测")
+    parser.add_argument("--base-url", default="http://127.0.0.1:9999/api/v1")
+    parser.add_argument("--token", default="dev", help="请求头 token（应用支持 dev 作为开发令牌）")
+    parser.add_argument("--endpoints", default="chat,enhanced,assistant")
+    parser.add_argument("--levels", default="1,4,16,64", help="并发阶梯，逗号分隔")
+    parser.add_argument("--requests", type=int, default=0, help="每档请求数，默认为并发数的 4 倍")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--ttft-slo", type=float, default=2.0, help="判定可持续并发的 TTFT p95 上限（秒）")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--json", dest="json_path", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in endpoints if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"未知接口: {', '.join(unknown)}，可选 {', '.join(ENDPOINTS)}")
+    levels = [int(level) for level in args.levels.split(",")]
+    headers = {"token": args.token, "Accept": "text/event-stream"}
+    limits = httpx.Limits(max_connections=max(levels) * 2, max_keepalive_connections=max(levels))
+
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        for endpoint in endpoints:
+            sustainable = 0
+            results[endpoint] = {"levels": {}}
+            for concurrency in levels:
+                started = time.perf_counter()
+                samples = await run_level(client, endpoint, headers, concurrency, args.requests or concurrency * 4)
+                row = summarize(samples, time.perf_counter() - started)
+                results[endpoint]["levels"][concurrency] = row
+                print_row(endpoint, concurrency, row)
+                if row["error_rate"] <= args.max_error_rate and (row["ttft_p95"] or float("inf")) <= args.ttft_slo:
+                    sustainable = concurrency
+                else:
+                    break
+            results[endpoint]["max_sustainable_concurrency"] = sustainable
+            print(f"{endpoint:<10} 最大可持续并发: {sustainable}\n")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())